@@ -1,68 +1,86 @@
 import logging
-import time
 
 from hlt import Game
+from hlt.entity import ACTIONS
+from hlt.instrumentation import metrics
+from hlt.scheduler import TurnScheduler
 
-game = Game("rv-x")
-# Then we print our start message to the logs
-logging.info("Starting my Settler bot!")
 
-
-SHIPS_CONTROL_TIMOUT = 10
 DELTA_TIME = 1.6
 
 
-try:
-    me = None
-    turn = -1
-    while True:
-        last_time = time.time()
-        # Update the map for the new turn and get the latest version
-        game_map = game.update_map()
-        turn += 1
-
-        command_queue = {}
-
-        ships = game_map.undocked_ship
-        nb_ships = SHIPS_CONTROL_TIMOUT
-
-        players = game_map.all_players()
-
-
-        logging.info('Number of undocked ship %s'% len(ships))
-        for ship in ships:
-            nb_ships -= 1
-            cmd = None
-
-            if turn < 10 and len(players) == 2:
-                game_map.assign_ship_short(ship, game_map)
-                cmd = game_map.ship_assignment[ship.id]['action'](ship, game_map)
-            else:
-                game_map.assign_ship(ship, game_map)
-                cmd = game_map.ship_assignment[ship.id]['action'](ship, game_map)
-
-            if cmd is not None:
-                command_queue[ship.id] = cmd
-
-            if nb_ships <= 0:
-                current_time = time.time()
-                if current_time - last_time > DELTA_TIME:
-                    break
-                last_time = current_time
-                nb_ships = SHIPS_CONTROL_TIMOUT
-
-        if len(players) > 2:
-            for planet in game_map.all_planets():
-                undock = game_map.defend_planet(planet, game_map)
-                for k, v in undock.items():
-                    command_queue[k] = v
-
-        for ship in game_map.undocking_ship:
-            command_queue[ship.id] = ship.undock()
-
-        # Send our set of commands to the Halite engine for this turn
-        game.send_command_queue(list(command_queue.values()))
-    # TURN END
-except:
-    logging.exception('GAME CRASHED')
-# GAME END
\ No newline at end of file
+def play(ship, game_map, turn):
+    """
+    Assign a role to the ship if needed, and run it
+    """
+    if turn < 10 and len(game_map.all_players()) == 2:
+        game_map.assign_ship_short(ship, game_map)
+    else:
+        game_map.assign_ship(ship, game_map)
+    action = ACTIONS[game_map.roles.role(ship.id)]
+    start = metrics.start()
+    command = action(ship, game_map)
+    metrics.stop_behavior(action.__name__, start)
+    return command
+
+
+def play_turn(game_map, turn, turn_start, scheduler):
+    """
+    Compute the commands of a turn
+
+    :param Map game_map: The map of the turn
+    :param int turn: Number of the turn, starting at 0
+    :param float turn_start: Time (time.time()) at which the map was received
+    :param TurnScheduler scheduler: The scheduler of the game
+    :return: The commands to send
+    :rtype: list[str]
+    """
+    command_queue = {}
+
+    players = game_map.all_players()
+
+    logging.info('Number of undocked ship %s', len(game_map.undocked_ship))
+    # Docking slots and fighter targets are solved for all the ships at once, before any ship is played
+    game_map.plan_assignments()
+    # The most urgent ships are played first, the ones which don't fit in the turn get a cheap command
+    commands = scheduler.run(game_map, game_map.undocked_ship, lambda ship, game_map: play(ship, game_map, turn),
+                             turn_start)
+    # With the batched navigation, the moves recorded by the behaviors are computed now
+    command_queue.update(game_map.resolve_navigation(commands))
+
+    # The planet defense counts against the hard budget, the undock commands below are free
+    if len(players) > 2 and not scheduler.expired(turn_start):
+        for planet in game_map.all_planets():
+            undock = game_map.defend_planet(planet, game_map)
+            for k, v in undock.items():
+                command_queue[k] = v
+
+    for ship in game_map.undocking_ship:
+        command_queue[ship.id] = ship.undock()
+
+    return list(command_queue.values())
+
+
+def main():
+    game = Game("rv-x")
+    # Then we print our start message to the logs
+    logging.info("Starting my Settler bot!")
+
+    try:
+        turn = -1
+        scheduler = TurnScheduler(budget=DELTA_TIME)
+        while True:
+            # Update the map for the new turn and get the latest version
+            game_map = game.update_map()
+            turn += 1
+
+            # Send our set of commands to the Halite engine for this turn
+            game.send_command_queue(play_turn(game_map, turn, game.turn_start, scheduler))
+        # TURN END
+    except:
+        logging.exception('GAME CRASHED')
+    # GAME END
+
+
+if __name__ == '__main__':
+    main()
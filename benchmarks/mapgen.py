@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+"""
+Generate valid map descriptions in the engine format (see Player._parse / Planet._parse), far beyond the size of
+a real game: thousands of ships if needed.
+
+The planets don't overlap and stay PLANET_MARGIN away from each other and from the borders. The undocked ships
+don't overlap the planets nor each other. The docked ships touch the surface of their planet, a planet is owned
+by the player of its docked ships and never holds more ships than its docking spots. The same arguments always
+give the same map.
+
+From the repository root, write a trace replay.py and selfplay.py can read (the map is the first and only turn):
+    python benchmarks/mapgen.py OUTPUT [--players N] [--planets N] [--ships N] [--docked F] [--size WxH] [--seed N]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hlt import constants
+
+#: Size of the maps of run_game.sh, the default size is scaled from it
+BASE_SIZE = (360, 240)
+#: Number of ships of a crowded real game on BASE_SIZE, larger maps keep the same density
+BASE_SHIPS = 400
+#: Free distance kept around the planets
+PLANET_MARGIN = 6.0
+#: Radius range of the planets
+PLANET_RADIUS = (3.0, 16.0)
+#: Minimum distance between two ship centers
+SHIP_SPACING = 2 * constants.SHIP_RADIUS + 0.1
+#: Number of random positions tried for an entity before giving up
+MAX_TRIES = 1000
+
+
+def default_size(num_ships):
+    """
+    :param int num_ships: Total number of ships
+    :return: BASE_SIZE scaled so that the density of ships does not grow past BASE_SHIPS on BASE_SIZE
+    :rtype: (int, int)
+    """
+    scale = max(1.0, math.sqrt(num_ships / BASE_SHIPS))
+    return int(BASE_SIZE[0] * scale), int(BASE_SIZE[1] * scale)
+
+
+class _ShipGrid:
+    """
+    Positions of the placed ships, hashed by cells of SHIP_SPACING, to check the spacing in constant time
+    """
+
+    def __init__(self):
+        self._cells = {}
+
+    def free(self, x, y):
+        col, row = int(x // SHIP_SPACING), int(y // SHIP_SPACING)
+        for c in (col - 1, col, col + 1):
+            for r in (row - 1, row, row + 1):
+                for other_x, other_y in self._cells.get((c, r), ()):
+                    if (x - other_x) ** 2 + (y - other_y) ** 2 < SHIP_SPACING ** 2:
+                        return False
+        return True
+
+    def add(self, x, y):
+        self._cells.setdefault((int(x // SHIP_SPACING), int(y // SHIP_SPACING)), []).append((x, y))
+
+
+def _place_planets(rnd, num_planets, width, height):
+    planets = []
+    for _ in range(num_planets):
+        for _ in range(MAX_TRIES):
+            radius = rnd.uniform(*PLANET_RADIUS)
+            radius = min(radius, (min(width, height) - 2 * PLANET_MARGIN) / 4)
+            x = rnd.uniform(radius + PLANET_MARGIN, width - radius - PLANET_MARGIN)
+            y = rnd.uniform(radius + PLANET_MARGIN, height - radius - PLANET_MARGIN)
+            if all((x - px) ** 2 + (y - py) ** 2 > (radius + pr + PLANET_MARGIN) ** 2 for px, py, pr in planets):
+                planets.append((x, y, radius))
+                break
+        else:
+            raise ValueError("No room for {} planets on a {}x{} map".format(num_planets, width, height))
+    return planets
+
+
+def _docked_position(rnd, planet, grid):
+    x, y, radius = planet
+    for _ in range(MAX_TRIES):
+        angle = rnd.uniform(0, 2 * math.pi)
+        distance = radius + constants.SHIP_RADIUS + 0.05
+        ship_x, ship_y = x + distance * math.cos(angle), y + distance * math.sin(angle)
+        if grid.free(ship_x, ship_y):
+            return ship_x, ship_y
+    return None
+
+
+def _undocked_position(rnd, planets, grid, width, height):
+    margin = constants.SHIP_RADIUS
+    for _ in range(MAX_TRIES):
+        x, y = rnd.uniform(margin, width - margin), rnd.uniform(margin, height - margin)
+        if grid.free(x, y) and all((x - px) ** 2 + (y - py) ** 2 > (pr + margin) ** 2 for px, py, pr in planets):
+            return x, y
+    raise ValueError("No room for the ships on a {}x{} map".format(width, height))
+
+
+def generate_map(num_players=4, num_planets=28, num_ships=400, docked=0.3, size=None, seed=0):
+    """
+    Build a map description in the engine format
+
+    :param int num_players: Number of players
+    :param int num_planets: Number of planets
+    :param int num_ships: Total number of ships, spread evenly over the players
+    :param float docked: Fraction of the ships docked, as long as the planets have free docking spots
+    :param (int, int) size: Size of the map, default_size(num_ships) if None
+    :param int seed: Seed of the generator
+    :return: The map description
+    :rtype: bytes
+    """
+    width, height = size or default_size(num_ships)
+    rnd = random.Random(seed)
+    planets = _place_planets(rnd, num_planets, width, height)
+    spots = [max(2, min(6, int(radius / 2.5))) for _, _, radius in planets]
+    owners = [None] * num_planets
+    docked_ships = [[] for _ in range(num_planets)]
+    grid = _ShipGrid()
+
+    players = []
+    ship_id = 0
+    for player_id in range(num_players):
+        count = num_ships // num_players + (1 if player_id < num_ships % num_players else 0)
+        ships = []
+        for _ in range(count):
+            position = None
+            if rnd.random() < docked:
+                planet_id = rnd.randrange(num_planets) if num_planets else None
+                if planet_id is not None and owners[planet_id] in (None, player_id) \
+                        and len(docked_ships[planet_id]) < spots[planet_id]:
+                    position = _docked_position(rnd, planets[planet_id], grid)
+            if position is not None:
+                owners[planet_id] = player_id
+                docked_ships[planet_id].append(ship_id)
+                status, planet = 2, planet_id
+            else:
+                position = _undocked_position(rnd, planets, grid, width, height)
+                status, planet = 0, 0
+            grid.add(*position)
+            ships.append("%d %.4f %.4f %d 0.0 0.0 %d %d 0 0" % (
+                ship_id, position[0], position[1], rnd.randint(1, constants.MAX_SHIP_HEALTH), status, planet))
+            ship_id += 1
+        players.append("%d %d %s" % (player_id, len(ships), " ".join(ships)) if ships else "%d 0" % player_id)
+
+    tokens = [str(num_players)] + players + [str(num_planets)]
+    for planet_id, (x, y, radius) in enumerate(planets):
+        owner = owners[planet_id]
+        tokens.append("%d %.4f %.4f %d %.4f %d 0 %d %d %d %d%s" % (
+            planet_id, x, y, int(radius * 255), radius, spots[planet_id], int(radius * 150),
+            owner is not None, owner or 0, len(docked_ships[planet_id]),
+            "".join(" %d" % docked_id for docked_id in docked_ships[planet_id])))
+    return " ".join(tokens).encode('ascii')
+
+
+def write_trace(path, map_bytes, size, player_id=0):
+    """
+    Write a map as a trace, in the format of the HALITE_RECORD files (see replay.read_trace)
+
+    :param str path: Output file
+    :param bytes map_bytes: The map description
+    :param (int, int) size: Size of the map
+    :param int player_id: Id of the player of the trace
+    """
+    with open(path, 'wb') as trace:
+        trace.write(b"%d\n%d %d\n%s\n" % (player_id, size[0], size[1], map_bytes))
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output', help='Trace file to write')
+    parser.add_argument('--players', type=int, default=4, help='Number of players')
+    parser.add_argument('--planets', type=int, default=28, help='Number of planets')
+    parser.add_argument('--ships', type=int, default=BASE_SHIPS, help='Total number of ships')
+    parser.add_argument('--docked', type=float, default=0.3, help='Fraction of docked ships')
+    parser.add_argument('--size', type=parse_size, help='Size of the map, WxH (default: scaled with the ships)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generator')
+    args = parser.parse_args()
+
+    size = args.size or default_size(args.ships)
+    map_bytes = generate_map(args.players, args.planets, args.ships, args.docked, size, args.seed)
+    write_trace(args.output, map_bytes, size)
+    print("{}: {} players, {} planets, {} ships, map {}x{}".format(
+        args.output, args.players, args.planets, args.ships, size[0], size[1]))
+
+
+if __name__ == '__main__':
+    main()
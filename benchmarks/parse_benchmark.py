@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Benchmark of the map parsing: the token based parser of the starter kit against the single pass cursor parser.
+
+Build the extensions first (python setup.py build_ext --inplace), then run from the repository root:
+    python benchmarks/parse_benchmark.py [--repeat N] [--sizes 100,1000,...]
+
+The time per ship of the cursor parser should stay flat while the number of ships grows.
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hlt import entity, game_map
+from hlt.parsing import parse_map
+
+DEFAULT_SIZES = (100, 250, 500, 1000, 2000, 4000, 8000)
+
+
+def synthetic_map(num_ships, num_players=4, num_planets=28, width=384, height=256, seed=42):
+    """
+    Build a map description in the engine format, with the ships spread over the players
+
+    :param int num_ships: Total number of ships
+    :param int num_players: Number of players
+    :param int num_planets: Number of planets
+    :return: The map description
+    :rtype: str
+    """
+    rnd = random.Random(seed)
+    tokens = [str(num_players)]
+    ship_id = 0
+    for player_id in range(num_players):
+        count = num_ships // num_players + (1 if player_id < num_ships % num_players else 0)
+        tokens += [str(player_id), str(count)]
+        for _ in range(count):
+            tokens.append("%d %.4f %.4f %d 0.0000 0.0000 0 0 0 0" % (
+                ship_id, rnd.uniform(0, width), rnd.uniform(0, height), rnd.randint(1, 255)))
+            ship_id += 1
+    tokens.append(str(num_planets))
+    for planet_id in range(num_planets):
+        tokens.append("%d %.4f %.4f 2000 %.4f 3 0 1000 0 0 0" % (
+            planet_id, rnd.uniform(0, width), rnd.uniform(0, height), rnd.uniform(3, 16)))
+    return " ".join(tokens)
+
+
+def token_parse(map_string):
+    """
+    The starter kit parser, kept as the reference
+    """
+    tokens = map_string.split()
+    players, tokens = game_map.Player._parse(tokens)
+    planets, tokens = entity.Planet._parse(tokens)
+    assert len(tokens) == 0
+    return players, planets
+
+
+def cursor_parse(map_bytes):
+    return parse_map(map_bytes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs (the best one is kept)')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='Comma separated number of ships')
+    args = parser.parse_args()
+
+    print("{:>8} {:>14} {:>14} {:>14} {:>14}".format(
+        'ships', 'token (ms)', 'token (us/s)', 'cursor (ms)', 'cursor (us/s)'))
+    for size in (int(size) for size in args.sizes.split(',')):
+        map_string = synthetic_map(size)
+        map_bytes = map_string.encode('ascii')
+        token = min(timeit.repeat(lambda: token_parse(map_string), number=1, repeat=args.repeat))
+        cursor = min(timeit.repeat(lambda: cursor_parse(map_bytes), number=1, repeat=args.repeat))
+        print("{:>8} {:>14.3f} {:>14.3f} {:>14.3f} {:>14.3f}".format(
+            size, token * 1e3, token * 1e6 / size, cursor * 1e3, cursor * 1e6 / size))
+
+
+if __name__ == '__main__':
+    main()
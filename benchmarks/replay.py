@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+"""
+Replay a recorded game through the parser and MyBot's strategy, without the Halite engine.
+
+Record a game first, by running the bot with the HALITE_RECORD variable set:
+    HALITE_RECORD=game.trace ./halite -d "360 240" "python3 MyBot.py" "python3 EricTrainingBot.py"
+Each bot using hlt.Game records its own trace, suffixed with its player id: game_0.trace, game_1.trace.
+
+Then, from the repository root (extensions built with python setup.py build_ext --inplace):
+    python benchmarks/replay.py game.trace [--seed N] [--repeat N] [--budget S] [--log FILE] [--log-profile P]
+                                           [--metrics FILE] [--nav-cache] [--nav-batch] [--flow-fields] [--turns]
+
+The latency of each turn (parse + strategy) is reported as percentiles, along with the time spent in each phase:
+parse, assign (assign_ship / assign_ship_short), navigate (navigate calls, and the resolution of the batch with
+--nav-batch), and the rest of the strategy (behaviors, scheduling, defense). With --metrics, the records of
+hlt.instrumentation are written as well.
+The same trace and seed always replay the same game, so runs before and after a change are comparable.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hlt import entity, game_map, logs
+from hlt.instrumentation import metrics
+from hlt.scheduler import TurnScheduler
+
+import MyBot
+
+PERCENTILES = (50, 90, 99, 100)
+PHASES = ('parse', 'assign', 'navigate', 'other')
+
+
+def read_trace(path):
+    """
+    :param str path: A trace recorded by Game in record mode
+    :return: The id of the player, the map size, and the map lines (the initialisation map, then one per turn)
+    :rtype: (int, (int, int), list[bytes])
+    """
+    with open(path, 'rb') as trace:
+        lines = trace.read().split(b'\n')
+    # The last read of a game hits the end of the input
+    while lines and not lines[-1].strip():
+        lines.pop()
+    if len(lines) < 3:
+        raise ValueError("{} is not a trace: expected an id, a map size and at least one map".format(path))
+    width, height = [int(x) for x in lines[1].split()]
+    return int(lines[0]), (width, height), lines[2:]
+
+
+def percentile(values, p):
+    """
+    :param list[float] values: Sorted values
+    :param float p: Percentile, between 0 and 100
+    :return: The nearest rank percentile
+    :rtype: float
+    """
+    if not values:
+        return math.nan
+    rank = max(int(math.ceil(p / 100.0 * len(values))), 1)
+    return values[rank - 1]
+
+
+class PhaseTimer:
+    """
+    Accumulate the time spent in a function, nested calls (assign_ship from assign_ship_short) being counted once
+
+    :ivar total: Time accumulated since the last reset (seconds)
+    :ivar calls: Number of outermost calls since the last reset
+    """
+
+    def __init__(self):
+        self.total = 0.0
+        self.calls = 0
+        self._depth = 0
+
+    def reset(self):
+        self.total = 0.0
+        self.calls = 0
+
+    def wrap(self, function):
+        def timed(*args, **kwargs):
+            if self._depth:
+                return function(*args, **kwargs)
+            self._depth += 1
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.total += time.perf_counter() - start
+                self.calls += 1
+                self._depth -= 1
+        return timed
+
+
+def install_timers():
+    """
+    Wrap the assignment and navigation entry points with timers
+
+    :return: The timers by phase
+    :rtype: dict[str, PhaseTimer]
+    """
+    timers = {'assign': PhaseTimer(), 'navigate': PhaseTimer()}
+    game_map.Map.assign_ship = timers['assign'].wrap(game_map.Map.assign_ship)
+    game_map.Map.assign_ship_short = timers['assign'].wrap(game_map.Map.assign_ship_short)
+    entity.navigate = timers['navigate'].wrap(entity.navigate)
+    game_map.Map.resolve_navigation = timers['navigate'].wrap(game_map.Map.resolve_navigation)
+    return timers
+
+
+def replay(player_id, size, maps, seed, budget, timers, cache_navigation=False, batch_navigation=False,
+           flow_fields=False):
+    """
+    Play the recorded turns. As in a game, the first map is only parsed (Game initialisation).
+
+    :return: The timings of each played turn, by phase (seconds), plus the total and the number of commands
+    :rtype: list[dict]
+    """
+    random.seed(seed)
+    width, height = size
+    current_map = game_map.Map(player_id, width, height, cache_navigation=cache_navigation,
+                               batch_navigation=batch_navigation, flow_fields=flow_fields)
+    metrics.start_turn(0)
+    current_map._parse(maps[0])
+    scheduler = TurnScheduler(budget=budget)
+    turns = []
+    for turn, map_bytes in enumerate(maps[1:]):
+        for timer in timers.values():
+            timer.reset()
+        turn_start = time.time()
+        # Game counts the initialisation map as turn 0
+        metrics.start_turn(turn + 1)
+        start = time.perf_counter()
+        current_map._parse(map_bytes)
+        parsed = time.perf_counter()
+        commands = MyBot.play_turn(current_map, turn, turn_start, scheduler)
+        end = time.perf_counter()
+        metrics.end_turn(len(commands))
+
+        record = {phase: timer.total for phase, timer in timers.items()}
+        record['parse'] = parsed - start
+        record['other'] = end - parsed - record['assign'] - record['navigate']
+        record['total'] = end - start
+        record['commands'] = len(commands)
+        turns.append(record)
+    return turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('trace', help='Trace file recorded with HALITE_RECORD')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random module')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of replays (the fastest one is kept)')
+    parser.add_argument('--budget', type=float, default=MyBot.DELTA_TIME,
+                        help='Turn budget of the scheduler (seconds), use a large value to always play every ship')
+    parser.add_argument('--log', default=os.devnull, help='Log file of the bot (default: discarded)')
+    parser.add_argument('--log-profile', default=logs.DEFAULT_PROFILE, choices=sorted(logs.PROFILES),
+                        help='Logging profile of the bot (default: %(default)s)')
+    parser.add_argument('--metrics', help='Write the per-turn records of hlt.instrumentation to this file')
+    parser.add_argument('--nav-cache', action='store_true', help='Enable the navigation cache')
+    parser.add_argument('--nav-batch', action='store_true',
+                        help='Plan the moves of each turn in parallel (threads: OMP_NUM_THREADS)')
+    parser.add_argument('--flow-fields', action='store_true', help='Head for the planets along their flow fields')
+    parser.add_argument('--turns', action='store_true', help='Print the timings of every turn')
+    args = parser.parse_args()
+
+    logs.set_up(args.log, args.log_profile)
+    player_id, size, maps = read_trace(args.trace)
+    timers = install_timers()
+    if args.metrics:
+        metrics.enable(open(args.metrics, 'w'))
+
+    best = None
+    for _ in range(args.repeat):
+        turns = replay(player_id, size, maps, args.seed, args.budget, timers, args.nav_cache, args.nav_batch,
+                       args.flow_fields)
+        if best is None or sum(t['total'] for t in turns) < sum(t['total'] for t in best):
+            best = turns
+
+    if args.turns:
+        print("{:>5} {:>9}".format('turn', 'commands') + "".join(
+            " {:>10}".format(name + ' ms') for name in PHASES + ('total',)))
+        for turn, record in enumerate(best):
+            print("{:>5} {:>9}".format(turn, record['commands']) + "".join(
+                " {:>10.3f}".format(record[name] * 1e3) for name in PHASES + ('total',)))
+        print()
+
+    print("{} turns, player {}, map {}x{}, seed {}".format(len(best), player_id, size[0], size[1], args.seed))
+    print("{:>10}".format('ms') + "".join(" {:>9}".format('p%d' % p if p < 100 else 'max') for p in PERCENTILES) +
+          " {:>10}".format('sum'))
+    for name in PHASES + ('total',):
+        values = sorted(record[name] for record in best)
+        print("{:>10}".format(name) + "".join(" {:>9.3f}".format(percentile(values, p) * 1e3) for p in PERCENTILES) +
+              " {:>10.1f}".format(sum(values) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+Scaling of the bot with the number of ships, on maps from mapgen.py: the time of each phase of a turn (parse,
+assign, navigate and the rest of the strategy, as in replay.py) and the memory allocated by the turn.
+
+Build the extensions first (python setup.py build_ext --inplace), then run from the repository root:
+    python benchmarks/scaling.py [--sizes 100,200,...] [--players N] [--planets N] [--repeat N] [--csv FILE]
+                                 [--plot FILE]
+
+Every turn is played on a fresh map, after one parse as the initialisation of a game; the fastest of --repeat turns
+is kept. The exponent column is the slope of the total time between a size and the previous one on a
+log-log scale: 1 while the turn scales linearly, above as soon as a phase goes quadratic.
+The memory is the peak of the Python allocations (tracemalloc) during a turn, measured in a separate run.
+--plot needs matplotlib.
+"""
+import argparse
+import csv
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hlt import game_map, logs
+from hlt.scheduler import TurnScheduler
+
+from mapgen import generate_map, default_size
+from replay import install_timers, PHASES
+
+import MyBot
+
+DEFAULT_SIZES = (100, 200, 400, 800, 1600, 3200)
+#: Turn number given to the strategy, past the opening rules
+TURN = 50
+#: Turn budget of the scheduler: every ship is played
+BUDGET = 1e9
+
+
+def initialised_map(map_bytes, size, player_id):
+    """
+    :return: A map which parsed the description once, as the initialisation of a game (static geometry)
+    :rtype: Map
+    """
+    current_map = game_map.Map(player_id, size[0], size[1])
+    current_map._parse(map_bytes)
+    return current_map
+
+
+def play(current_map, map_bytes, timers):
+    """
+    Parse a map and play a turn on it
+
+    :return: The time of each phase (seconds), plus the total
+    :rtype: dict
+    """
+    for timer in timers.values():
+        timer.reset()
+    start = time.perf_counter()
+    current_map._parse(map_bytes)
+    parsed = time.perf_counter()
+    MyBot.play_turn(current_map, TURN, time.time(), TurnScheduler(budget=BUDGET))
+    end = time.perf_counter()
+    record = {phase: timer.total for phase, timer in timers.items()}
+    record['parse'] = parsed - start
+    record['other'] = end - parsed - record['assign'] - record['navigate']
+    record['total'] = end - start
+    return record
+
+
+def measure(num_ships, num_players, num_planets, repeat, seed, timers):
+    """
+    :return: The best timings of a turn (seconds) and the peak memory of a turn (bytes) for this number of ships
+    :rtype: dict
+    """
+    size = default_size(num_ships)
+    map_bytes = generate_map(num_players, num_planets, num_ships, size=size, seed=seed)
+
+    best = None
+    for _ in range(repeat):
+        current_map = initialised_map(map_bytes, size, 0)
+        random.seed(seed)
+        record = play(current_map, map_bytes, timers)
+        if best is None or record['total'] < best['total']:
+            best = record
+
+    current_map = initialised_map(map_bytes, size, 0)
+    random.seed(seed)
+    tracemalloc.start()
+    play(current_map, map_bytes, timers)
+    _, best['memory'] = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best['ships'] = num_ships
+    return best
+
+
+def exponent(previous, record):
+    """
+    :return: The slope of the total time against the number of ships on a log-log scale, nan for the first size
+    :rtype: float
+    """
+    if previous is None:
+        return math.nan
+    return math.log(record['total'] / previous['total']) / math.log(record['ships'] / previous['ships'])
+
+
+def plot(records, path):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    ships = [record['ships'] for record in records]
+    figure, (times, memory) = plt.subplots(1, 2, figsize=(12, 5))
+    for name in PHASES + ('total',):
+        times.plot(ships, [record[name] * 1e3 for record in records], marker='o', label=name)
+    # Linear reference through the first total
+    times.plot(ships, [records[0]['total'] * 1e3 * n / ships[0] for n in ships], 'k--', label='linear')
+    times.set(xscale='log', yscale='log', xlabel='ships', ylabel='ms per turn', title='Time')
+    times.legend()
+    memory.plot(ships, [record['memory'] / 2 ** 20 for record in records], marker='o')
+    memory.set(xscale='log', yscale='log', xlabel='ships', ylabel='MiB', title='Peak memory of a turn')
+    figure.tight_layout()
+    figure.savefig(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='Comma separated total number of ships')
+    parser.add_argument('--players', type=int, default=4, help='Number of players')
+    parser.add_argument('--planets', type=int, default=28, help='Number of planets')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed turns per size (the best one is kept)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the maps and of the random module')
+    parser.add_argument('--csv', help='Write the results to this file')
+    parser.add_argument('--plot', help='Plot the results to this image file (needs matplotlib)')
+    args = parser.parse_args()
+    if args.plot:
+        try:
+            import matplotlib
+        except ImportError:
+            parser.error("--plot needs matplotlib")
+
+    logs.set_up(os.devnull)
+    timers = install_timers()
+    columns = PHASES + ('total',)
+    print("{:>7}".format('ships') + "".join(" {:>11}".format(name + ' ms') for name in columns) +
+          " {:>9} {:>9} {:>9}".format('us/ship', 'exponent', 'MiB'))
+    records = []
+    for num_ships in (int(size) for size in args.sizes.split(',')):
+        record = measure(num_ships, args.players, args.planets, args.repeat, args.seed, timers)
+        record['exponent'] = exponent(records[-1] if records else None, record)
+        records.append(record)
+        print("{:>7}".format(num_ships) + "".join(" {:>11.3f}".format(record[name] * 1e3) for name in columns) +
+              " {:>9.2f} {:>9.2f} {:>9.2f}".format(record['total'] * 1e6 / num_ships, record['exponent'],
+                                                   record['memory'] / 2 ** 20))
+        sys.stdout.flush()
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as output:
+            writer = csv.DictWriter(output, fieldnames=('ships',) + columns + ('exponent', 'memory'))
+            writer.writeheader()
+            for record in records:
+                writer.writerow({name: record[name] for name in writer.fieldnames})
+    if args.plot:
+        plot(records, args.plot)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Play MyBot against itself in-process with hlt.simulator, without the Halite engine.
+
+The game starts from the first map of a trace recorded with HALITE_RECORD (see replay.py), every player of the map
+being played by MyBot. From the repository root (extensions built with python setup.py build_ext --inplace):
+    python benchmarks/selfplay.py game.trace [--turns N] [--seed N] [--budget S] [--log FILE] [--nav-batch]
+                                             [--flow-fields]
+
+The time per turn of the simulator and of the bots is reported, with the number of ships of each player at the end.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hlt import game_map, logs
+from hlt.scheduler import TurnScheduler
+from hlt.simulator import Simulator
+
+from replay import read_trace, percentile, PERCENTILES
+
+import MyBot
+
+DEFAULT_TURNS = 300
+
+
+def play_game(size, start, turns, budget, batch_navigation=False, flow_fields=False):
+    """
+    :param (int, int) size: Size of the map
+    :param bytes start: The map the game starts from
+    :param int turns: Maximum number of turns
+    :param float budget: Turn budget of the schedulers (seconds)
+    :return: The final map, and the time of each turn in the simulator and in the bots (seconds)
+    :rtype: (Map, list[float], list[float])
+    """
+    width, height = size
+    reference = game_map.Map(0, width, height)
+    reference._parse(start)
+    simulator = Simulator(reference)
+    bots = {}
+    for player_id in simulator.players:
+        bot_map = game_map.Map(player_id, width, height, batch_navigation=batch_navigation, flow_fields=flow_fields)
+        bot_map._parse(start)
+        bots[player_id] = (bot_map, TurnScheduler(budget=budget))
+
+    map_bytes = start
+    simulator_times = []
+    bot_times = []
+    for turn in range(turns):
+        start_time = time.perf_counter()
+        commands = {}
+        for player_id, (bot_map, scheduler) in bots.items():
+            bot_map._parse(map_bytes)
+            if bot_map.get_me().all_ships():
+                commands[player_id] = MyBot.play_turn(bot_map, turn, time.time(), scheduler)
+        bot_end = time.perf_counter()
+        map_bytes = simulator.step(commands)
+        end = time.perf_counter()
+        bot_times.append(bot_end - start_time)
+        simulator_times.append(end - bot_end)
+        if len(commands) < 2:
+            break
+    reference._parse(map_bytes)
+    return reference, simulator_times, bot_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('trace', help='Trace file recorded with HALITE_RECORD, its first map starts the game')
+    parser.add_argument('--turns', type=int, default=DEFAULT_TURNS, help='Maximum number of turns')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random module')
+    parser.add_argument('--budget', type=float, default=MyBot.DELTA_TIME, help='Turn budget of the bots (seconds)')
+    parser.add_argument('--log', default=os.devnull, help='Log file of the bots (default: discarded)')
+    parser.add_argument('--nav-batch', action='store_true', help='Plan the moves of each turn in parallel')
+    parser.add_argument('--flow-fields', action='store_true', help='Head for the planets along their flow fields')
+    args = parser.parse_args()
+
+    logs.set_up(args.log)
+    random.seed(args.seed)
+    _, size, maps = read_trace(args.trace)
+    final_map, simulator_times, bot_times = play_game(size, maps[0], args.turns, args.budget, args.nav_batch,
+                                                      args.flow_fields)
+
+    print("{} turns, {} players, map {}x{}, seed {}".format(len(simulator_times), len(final_map.all_players()),
+                                                            size[0], size[1], args.seed))
+    print("{:>10}".format('ms') + "".join(" {:>9}".format('p%d' % p if p < 100 else 'max') for p in PERCENTILES) +
+          " {:>10}".format('sum'))
+    for name, times in (('simulator', simulator_times), ('bots', bot_times)):
+        values = sorted(times)
+        print("{:>10}".format(name) + "".join(" {:>9.3f}".format(percentile(values, p) * 1e3) for p in PERCENTILES) +
+              " {:>10.1f}".format(sum(values) * 1e3))
+    print("simulator: {:.0f} turns/s".format(len(simulator_times) / max(sum(simulator_times), 1e-9)))
+    for player in sorted(final_map.all_players(), key=lambda p: p.id):
+        print("player {}: {} ships".format(player.id, len(player.all_ships())))
+
+
+if __name__ == '__main__':
+    main()
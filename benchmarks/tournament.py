@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+"""
+Play many local games in parallel with the Halite environment, and report per bot: win rate, timeout rate and
+the distribution of the turn latencies.
+
+Build the extensions first (python setup.py build_ext --inplace), then run from the repository root:
+    python benchmarks/tournament.py --halite ./halite --games 200 [--bot MyBot.py --bot EricTrainingBot.py]
+                                    [--players 2,4] [--sizes 240x160,360x240,384x256] [--jobs N] [--seed N]
+
+Game i uses the seed seed + i, cycles over the player counts and the map sizes, and rotates the seats of the bots.
+Every game runs in its own directory under --workdir (logs, replay, metrics). The latencies come from the
+per-turn records of hlt.instrumentation (HALITE_METRICS), so the bots must use hlt.Game.
+A bot counts as timed out when the environment reports an error log for it (timeout or crash).
+"""
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from replay import percentile
+
+DEFAULT_BOTS = ('MyBot.py', 'EricTrainingBot.py')
+DEFAULT_SIZES = '240x160,312x208,360x240,384x256'
+PERCENTILES = (50, 90, 99, 100)
+
+
+def seat_bots(bots, game, num_players):
+    """
+    :param list[str] bots: The bots of the tournament
+    :param int game: Index of the game
+    :param int num_players: Number of players of the game
+    :return: The bot of each seat: the bots are repeated to fill the seats, and rotated from one game to the next
+    :rtype: list[str]
+    """
+    seats = list(itertools.islice(itertools.cycle(bots), num_players))
+    shift = game % num_players
+    return seats[shift:] + seats[:shift]
+
+
+def play_game(halite, game, seed, size, seats, workdir, timeout):
+    """
+    Play one game, in its own directory. Runs in a worker process.
+
+    :return: The game summary: seats, ranks, failed seats and the per-turn latencies of each seat (ms)
+    :rtype: dict
+    """
+    game_dir = os.path.join(workdir, 'game-{:05d}'.format(game))
+    os.makedirs(game_dir, exist_ok=True)
+    commands = []
+    for bot in seats:
+        # Each bot writes metrics_<player id>.jsonl, the player id being its seat
+        commands.append('HALITE_METRICS=metrics.jsonl {} {}'.format(
+            sys.executable, os.path.abspath(bot)))
+    args = [os.path.abspath(halite), '-q', '-s', str(seed), '-d', '{} {}'.format(*size)]
+    if not timeout:
+        args.append('-t')
+    process = subprocess.run(args + commands, cwd=game_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             universal_newlines=True)
+
+    summary = {'game': game, 'seed': seed, 'size': size, 'seats': seats, 'ranks': {}, 'failed': [],
+               'latencies': {}, 'error': None}
+    results = None
+    for line in reversed(process.stdout.splitlines()):
+        if line.startswith('{'):
+            results = json.loads(line)
+            break
+    if results is None:
+        summary['error'] = 'exit code {}: {}'.format(process.returncode, process.stderr.strip()[-500:])
+        return summary
+
+    for player_id, stats in results.get('stats', {}).items():
+        summary['ranks'][int(player_id)] = stats['rank']
+    summary['failed'] = [int(player_id) for player_id in results.get('error_logs', {})]
+
+    for seat in range(len(seats)):
+        latencies = []
+        metrics_file = os.path.join(game_dir, 'metrics_{}.jsonl'.format(seat))
+        if os.path.exists(metrics_file):
+            with open(metrics_file) as records:
+                for line in records:
+                    try:
+                        latencies.append(json.loads(line)['ms'])
+                    except ValueError:
+                        # The last record may be cut by the end of the game
+                        continue
+        summary['latencies'][seat] = latencies
+    return summary
+
+
+def report(bots, summaries):
+    """
+    Print the aggregate statistics of each bot
+
+    :param list[str] bots: The bots of the tournament
+    :param list[dict] summaries: The game summaries
+    """
+    played = collections.Counter()
+    wins = collections.Counter()
+    failures = collections.Counter()
+    latencies = collections.defaultdict(list)
+    errors = [summary for summary in summaries if summary['error'] is not None]
+    for summary in summaries:
+        if summary['error'] is not None:
+            continue
+        for seat, bot in enumerate(summary['seats']):
+            played[bot] += 1
+            wins[bot] += summary['ranks'].get(seat) == 1
+            failures[bot] += seat in summary['failed']
+            latencies[bot].extend(summary['latencies'].get(seat, ()))
+
+    print("{} games played, {} failed to run".format(len(summaries) - len(errors), len(errors)))
+    for summary in errors[:5]:
+        print("  game {} (seed {}): {}".format(summary['game'], summary['seed'], summary['error']))
+    print()
+    print("{:>24} {:>7} {:>8} {:>9}".format('bot', 'seats', 'win %', 'timeout %') +
+          "".join(" {:>9}".format('p%d ms' % p if p < 100 else 'max ms') for p in PERCENTILES) +
+          " {:>9}".format('turns'))
+    for bot in bots:
+        if not played[bot]:
+            continue
+        values = sorted(latencies[bot])
+        print("{:>24} {:>7} {:>8.1f} {:>9.1f}".format(
+            os.path.basename(bot), played[bot], 100.0 * wins[bot] / played[bot], 100.0 * failures[bot] / played[bot]) +
+              "".join(" {:>9.1f}".format(percentile(values, p)) for p in PERCENTILES) +
+              " {:>9}".format(len(values)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--halite', default='./halite', help='The Halite environment binary')
+    parser.add_argument('--bot', action='append', help='Bot script, repeat for each bot (default: {})'.format(
+        ', '.join(DEFAULT_BOTS)))
+    parser.add_argument('--games', type=int, default=100, help='Number of games')
+    parser.add_argument('--players', default='2,4', help='Comma separated player counts, cycled over the games')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Comma separated map sizes (WxH), cycled over the games')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the first game')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='Number of games played at the same time')
+    parser.add_argument('--workdir', help='Directory of the games (default: a new temporary directory)')
+    parser.add_argument('--no-timeout', action='store_true', help='Disable the timeouts of the environment')
+    args = parser.parse_args()
+
+    bots = args.bot or list(DEFAULT_BOTS)
+    player_counts = [int(count) for count in args.players.split(',')]
+    sizes = [tuple(int(x) for x in size.split('x')) for size in args.sizes.split(',')]
+    workdir = args.workdir or tempfile.mkdtemp(prefix='halite-tournament-')
+    print("Playing {} games with {} jobs in {}".format(args.games, args.jobs, workdir))
+
+    summaries = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = []
+        for game in range(args.games):
+            num_players = player_counts[game % len(player_counts)]
+            size = sizes[(game // len(player_counts)) % len(sizes)]
+            futures.append(pool.submit(play_game, args.halite, game, args.seed + game, size,
+                                       seat_bots(bots, game, num_players), workdir, not args.no_timeout))
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            summaries.append(future.result())
+            sys.stderr.write("\r{}/{} games".format(done, args.games))
+    sys.stderr.write("\n")
+
+    summaries.sort(key=lambda summary: summary['game'])
+    with open(os.path.join(workdir, 'results.jsonl'), 'w') as results:
+        for summary in summaries:
+            results.write(json.dumps(summary) + '\n')
+    report(bots, summaries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Batched assignment of the ships, solved once per turn instead of ship by ship: the new / idle ships against the
+docking slots of the planets, and the idle fighters against the foe ships. Each problem is a rectangular linear
+assignment, solved with the Hungarian algorithm (shortest augmenting paths), vectorized over the columns.
+
+Unlike the first-come claims, the result doesn't depend on the order the ships are played in.
+"""
+import numpy as np
+
+
+def linear_sum_assignment(cost):
+    """
+    Minimum cost assignment of the rows to the columns: every row gets a distinct column if there are at least as
+    many columns as rows, otherwise every column gets a distinct row.
+    Ties are broken towards the lowest indexes, so the result is deterministic.
+
+    :param cost: Cost matrix (rows x columns), finite values
+    :return: The assigned rows and their columns, sorted by row
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    rows, columns = cost.shape
+    if rows == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    # Potentials and matching, 1-based: column 0 is the virtual start of each augmenting path
+    u = np.zeros(rows + 1)
+    v = np.zeros(columns + 1)
+    match = np.zeros(columns + 1, dtype=np.int64)
+    way = np.zeros(columns + 1, dtype=np.int64)
+    for row in range(1, rows + 1):
+        match[0] = row
+        column = 0
+        min_reduced = np.full(columns + 1, np.inf)
+        used = np.zeros(columns + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current = match[column]
+            free = ~used[1:]
+            reduced = cost[current - 1] - u[current] - v[1:]
+            better = free & (reduced < min_reduced[1:])
+            min_reduced[1:][better] = reduced[better]
+            way[1:][better] = column
+            candidates = np.where(free, min_reduced[1:], np.inf)
+            next_column = int(np.argmin(candidates)) + 1
+            delta = candidates[next_column - 1]
+            visited = np.flatnonzero(used)
+            u[match[visited]] += delta
+            v[visited] -= delta
+            min_reduced[1:][free] -= delta
+            column = next_column
+            if match[column] == 0:
+                break
+        # Flip the augmenting path
+        while column:
+            previous = way[column]
+            match[column] = match[previous]
+            column = previous
+
+    assigned = np.flatnonzero(match[1:]) + 1
+    row_index = match[assigned] - 1
+    column_index = assigned - 1
+    if transposed:
+        row_index, column_index = column_index, row_index
+    order = np.argsort(row_index, kind='stable')
+    return row_index[order], column_index[order]
+
+
+def plan_settlers(game_map, ships):
+    """
+    Assign the ships to the free docking slots of the planets the user can settle (free or owned planets with
+    anticipating_remaining_resources > 0). The cost of a slot is the score of Map.assign_ship: the distance to
+    the planet divided by its number of docking spots.
+
+    :param Map game_map: The map of the turn
+    :param list[Ship] ships: The ships to assign
+    :return: The planet id of each assigned ship
+    :rtype: dict[int, int]
+    """
+    if not ships:
+        return {}
+    snapshot = game_map.snapshot()
+    my_id = game_map.get_me().id
+    slots = np.array([max(planet.anticipating_remaining_resources, 0)
+                      if planet.owner is None or planet.owner.id == my_id else 0
+                      for planet in snapshot.planets], dtype=np.int64)
+    if not slots.any():
+        return {}
+
+    # One column per slot, the slots of a planet are interchangeable
+    slot_planets = np.repeat(np.arange(len(snapshot.planets)), slots)
+    scores = np.array([snapshot.planet_distances(ship) for ship in ships]) / snapshot.planet_docking_spots
+    ship_index, slot_index = linear_sum_assignment(scores[:, slot_planets])
+    return {ships[i].id: snapshot.planets[slot_planets[j]].id
+            for i, j in zip(ship_index.tolist(), slot_index.tolist())}
+
+
+def plan_targets(game_map, fighters, claimed):
+    """
+    Assign the fighters to distinct foe ships, minimizing the total distance.
+
+    :param Map game_map: The map of the turn
+    :param list[Ship] fighters: The user's ships to assign
+    :param set[int] claimed: Ids of the foe ships already targeted
+    :return: The foe ship of each assigned fighter
+    :rtype: dict[int, Ship]
+    """
+    if not fighters:
+        return {}
+    snapshot = game_map.snapshot()
+    foes = [row for row, foe in enumerate(game_map.get_foe_ships()) if foe.id not in claimed]
+    if not foes:
+        return {}
+    distances = np.array([snapshot.foe_distances(ship) for ship in fighters])[:, foes]
+    fighter_index, foe_index = linear_sum_assignment(distances)
+    foe_ships = game_map.get_foe_ships()
+    return {fighters[i].id: foe_ships[foes[j]] for i, j in zip(fighter_index.tolist(), foe_index.tolist())}
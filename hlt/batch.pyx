@@ -0,0 +1,382 @@
+# distutils: extra_compile_args = -fopenmp
+# distutils: extra_link_args = -fopenmp
+"""
+Batched navigation: the moves of a turn are recorded by Ship.navigate, then planned all at once, in parallel and
+without the GIL, over a C snapshot of the world (planets and ships as flat structs).
+
+Planning ignores the ghosts, which depend on the order of the moves. A deterministic commit phase then walks the
+moves in the order they were recorded, which is the order the sequential navigation would have run them in:
+ - a planned heading free of the ghosts committed so far is the sequential answer (every heading tried before it
+   was blocked by the planets and ships alone), it's committed as is
+ - no heading at all: the ghosts can only block more, the sequential fallback (intermediate position) is run
+ - a planned heading crossing a ghost is a conflict: the move is navigated again, sequentially
+So the commands are the same as with the sequential navigation, whatever the number of threads.
+
+The number of threads is OpenMP's (OMP_NUM_THREADS). Without OpenMP the planning runs on one thread.
+"""
+cimport cython
+from cython.parallel cimport prange
+from libc.stdlib cimport malloc, free
+from libc.math cimport sqrt, round
+
+from .navigation cimport Circle, Obstacles, ObstacleField, NavigationCache, obstacles_free_heading, move_along, \
+    calculate_distance_between, calculate_angle_between
+from .instrumentation cimport Metrics, STAGE_NAVIGATE_BATCH, COUNTER_ANGLE_RETRIES, COUNTER_INTERSECT_TESTS
+from .instrumentation import metrics
+from .navigation import ASSASSIN_AVOID_RADIUS, NAVIGATION_SHIP_DISTANCE, UNDOCKED_CHECKS
+from .spatial import QUERY_EPSILON
+
+cdef Metrics _metrics = metrics
+cdef double _ASSASSIN_AVOID_RADIUS = ASSASSIN_AVOID_RADIUS
+cdef double _NAVIGATION_SHIP_DISTANCE = NAVIGATION_SHIP_DISTANCE
+cdef bint _UNDOCKED_CHECKS = UNDOCKED_CHECKS
+cdef double _QUERY_EPSILON = QUERY_EPSILON
+
+
+cdef enum BodyKind:
+    BODY_PLANET
+    BODY_MINE
+    BODY_FOE
+
+
+cdef struct Body:
+    double x, y, radius
+    BodyKind kind
+    # Ships only: is the ship undocked?
+    bint undocked
+
+
+cdef struct World:
+    # Planets (Map.all_planets() order), then ships (Map._all_ships() order)
+    Body *bodies
+    int count
+    double width, height
+
+
+cdef struct NavRequest:
+    # Bodies of the navigating ship and of the entity located at the target (-1 if none)
+    int ship_index
+    int target_index
+    double ship_x, ship_y, ship_radius, target_x, target_y, distance
+    int angle, max_corrections, angular_step, hint
+    bint ignore_ships, ignore_planets, assassin
+    # Is the move searched by the planner? (no obstacle to look at, or no correction allowed: it isn't)
+    bint planned
+    # First heading free of planets and ships, -1 if none
+    int heading
+    # Work done by the search, and end of the move of the heading found
+    Obstacles field
+
+
+@cython.final
+cdef class DeferredMove:
+    """
+    A move recorded by Ship.navigate, with the arguments of the call.
+
+    :ivar ship: The ship that navigates
+    :ivar command: The thrust command, once resolved (None before)
+    """
+    cdef readonly object ship
+    cdef object target
+    cdef object closest_target
+    cdef object speed
+    cdef int max_corrections
+    cdef int angular_step
+    cdef bint ignore_ships
+    cdef bint ignore_planets
+    cdef object ignore_ghosts
+    cdef object assassin
+    cdef object kamikaze
+    cdef int hint
+    cdef public object command
+
+    def __repr__(self):
+        return "DeferredMove(ship={}, command={!r})".format(self.ship.id, self.command)
+
+
+cdef bint _overlaps(const Body *body, double x, double y, double radius) noexcept nogil:
+    """
+    Same test as SpatialGrid.query_radius: does the body overlap the disc?
+    """
+    cdef double dx = body.x - x
+    cdef double dy = body.y - y
+    cdef double reach = radius + body.radius + _QUERY_EPSILON
+    return dx * dx + dy * dy <= reach * reach
+
+
+cdef void _plan(const World *world, NavRequest *request) noexcept nogil:
+    """
+    Gather the planets and ships met by the request as ObstacleField does (ghosts left out), and search its heading
+    """
+    cdef double fudge = request.ship_radius + 0.1
+    cdef double undocked_fudge = fudge + (_ASSASSIN_AVOID_RADIUS if request.assassin else 0)
+    cdef double planet_reach = request.distance + fudge
+    cdef double ship_reach = request.distance + max(fudge, undocked_fudge)
+    cdef Obstacles *field = &request.field
+    cdef double *x = <double *> malloc(4 * max(world.count, 1) * sizeof(double))
+    cdef int *at_target = <int *> malloc(max(world.count, 1) * sizeof(int))
+    cdef double *y
+    cdef double *radius
+    cdef double *fudges
+    cdef const Body *body
+    cdef int i
+    cdef int count = 0
+
+    if x == NULL or at_target == NULL:
+        free(x)
+        free(at_target)
+        request.planned = False
+        return
+    y = x + world.count
+    radius = y + world.count
+    fudges = radius + world.count
+
+    for i in range(world.count):
+        body = &world.bodies[i]
+        if i == request.ship_index:
+            continue
+        if body.kind == BODY_PLANET:
+            if request.ignore_planets or not _overlaps(body, request.ship_x, request.ship_y, planet_reach):
+                continue
+            fudges[count] = fudge
+        else:
+            if request.ignore_ships or not _overlaps(body, request.ship_x, request.ship_y, ship_reach):
+                continue
+            # If the ship is too far ahead, no need to look right now
+            if body.undocked and sqrt(((body.x - request.ship_x) ** 2) + ((body.y - request.ship_y) ** 2)) \
+                    > _NAVIGATION_SHIP_DISTANCE:
+                continue
+            fudges[count] = undocked_fudge if body.kind == BODY_FOE and body.undocked else fudge
+        x[count] = body.x
+        y[count] = body.y
+        radius[count] = body.radius
+        at_target[count] = i == request.target_index and body.kind != BODY_MINE
+        count += 1
+
+    field.ship_x = request.ship_x
+    field.ship_y = request.ship_y
+    field.target_x = request.target_x
+    field.target_y = request.target_y
+    field.width = world.width
+    field.height = world.height
+    field.count = count
+    field.x = x
+    field.y = y
+    field.radius = radius
+    field.fudge = fudges
+    field.at_target = at_target
+    field.ghost_count = 0
+    field.tests = 0
+    field.retries = 0
+    request.heading = obstacles_free_heading(field, request.angle, request.distance, request.max_corrections,
+                                             request.angular_step, request.hint)
+    field.x = field.y = field.radius = field.fudge = NULL
+    field.at_target = NULL
+    free(x)
+    free(at_target)
+
+
+cdef class NavigationBatch:
+    """
+    The moves recorded during a turn, resolved by resolve()
+
+    :ivar planned: Moves searched by the parallel planner since the start of the game
+    :ivar conflicts: Planned moves crossing a ghost, navigated again sequentially
+    """
+    cdef list _moves
+    # Body of each position of the snapshot, by id() of the Circle
+    cdef dict _indexes
+    cdef readonly long planned
+    cdef readonly long conflicts
+
+    def __init__(self):
+        self._moves = []
+        self._indexes = {}
+        self.planned = 0
+        self.conflicts = 0
+
+    def start_turn(self):
+        """
+        Forget the moves of the last turn (only left if the turn was interrupted)
+
+        :return: nothing
+        """
+        self._moves = []
+
+    def __len__(self):
+        return len(self._moves)
+
+    def defer(self, ship, target, closest_target, speed, int max_corrections, int angular_step, bint ignore_ships,
+              bint ignore_planets, ignore_ghosts, assassin, kamikaze, int hint=-1):
+        """
+        Record a move, see Ship.navigate for the arguments
+
+        :return: The move, its command is set by resolve()
+        :rtype: DeferredMove
+        """
+        cdef DeferredMove move = DeferredMove.__new__(DeferredMove)
+        move.ship = ship
+        move.target = target
+        move.closest_target = closest_target
+        move.speed = speed
+        move.max_corrections = max_corrections
+        move.angular_step = angular_step
+        move.ignore_ships = ignore_ships
+        move.ignore_planets = ignore_planets
+        move.ignore_ghosts = ignore_ghosts
+        move.assassin = assassin
+        move.kamikaze = kamikaze
+        move.hint = hint
+        self._moves.append(move)
+        return move
+
+    def resolve(self, game_map, dict commands):
+        """
+        Plan the recorded moves in parallel, then commit them in the order they were recorded
+
+        :param Map game_map: The map of the turn
+        :param dict commands: Commands by ship id, some of them DeferredMove
+        :return: The commands, the DeferredMove replaced by their thrust command
+        :rtype: dict[int, str]
+        """
+        cdef list moves = self._moves
+        cdef int n = len(moves)
+        cdef double start = _metrics.start()
+        cdef World world
+        cdef NavRequest *requests
+        cdef int i
+        self._moves = []
+        if n == 0:
+            return commands
+
+        world.bodies = NULL
+        requests = <NavRequest *> malloc(n * sizeof(NavRequest))
+        if requests == NULL:
+            raise MemoryError()
+        try:
+            self._snapshot(game_map, &world)
+            for i in range(n):
+                self._request(game_map, moves[i], &requests[i])
+            with nogil:
+                for i in prange(n, schedule='dynamic'):
+                    if requests[i].planned:
+                        _plan(&world, &requests[i])
+            for i in range(n):
+                self._commit(game_map, moves[i], &requests[i])
+        finally:
+            free(world.bodies)
+            free(requests)
+        _metrics.stop(STAGE_NAVIGATE_BATCH, start)
+
+        return {ship_id: (<DeferredMove> command).command if isinstance(command, DeferredMove) else command
+                for ship_id, command in commands.items()}
+
+    cdef void _snapshot(self, game_map, World *world) except *:
+        """
+        Copy the planets and ships the navigation looks at (Map.planets_near and Map.ships_near) in world
+        """
+        cdef list planets = game_map.all_planets()
+        cdef list ships = game_map._all_ships()
+        cdef int i = 0
+        cdef Circle pos
+        my_id = game_map.my_id
+        self._indexes = {}
+        world.count = len(planets) + len(ships)
+        world.width = game_map.width
+        world.height = game_map.height
+        world.bodies = <Body *> malloc(max(world.count, 1) * sizeof(Body))
+        if world.bodies == NULL:
+            raise MemoryError()
+        for entity in planets:
+            pos = entity.pos
+            world.bodies[i].x = pos.x
+            world.bodies[i].y = pos.y
+            world.bodies[i].radius = pos.radius
+            world.bodies[i].kind = BODY_PLANET
+            world.bodies[i].undocked = False
+            self._indexes[id(pos)] = i
+            i += 1
+        for entity in ships:
+            pos = entity.pos
+            world.bodies[i].x = pos.x
+            world.bodies[i].y = pos.y
+            world.bodies[i].radius = pos.radius
+            world.bodies[i].kind = BODY_MINE if entity.owner_id == my_id else BODY_FOE
+            # Only the undocked-ship rules read it, see navigation.UNDOCKED_CHECKS
+            world.bodies[i].undocked = _UNDOCKED_CHECKS and entity.docking_status == 0
+            self._indexes[id(pos)] = i
+            i += 1
+
+    cdef void _request(self, game_map, DeferredMove move, NavRequest *request) except *:
+        """
+        Fill the request of a move, with the same distance, angle and hint (flow field or cache) as navigate
+        """
+        cdef Circle ship = move.ship.pos
+        cdef Circle target = move.closest_target.pos
+        cdef NavigationCache cache = game_map.navigation_cache
+        request.ship_index = self._indexes.get(id(ship), -1)
+        request.target_index = self._indexes.get(id(target), -1)
+        request.ship_x = ship.x
+        request.ship_y = ship.y
+        request.ship_radius = ship.radius
+        request.target_x = target.x
+        request.target_y = target.y
+        request.distance = calculate_distance_between(ship, target)
+        request.angle = int(round(calculate_angle_between(ship, target)))
+        request.max_corrections = move.max_corrections
+        request.angular_step = move.angular_step
+        request.ignore_ships = move.ignore_ships
+        request.ignore_planets = move.ignore_planets
+        request.assassin = bool(move.assassin)
+        request.planned = move.max_corrections > 0 and not (move.ignore_ships and move.ignore_planets)
+        request.heading = -1
+        request.hint = -1
+        if request.planned and cache is not None:
+            request.hint = cache.lookup(cache.key(move.ship.id, target))
+        if move.hint >= 0:
+            request.hint = move.hint
+
+    cdef void _commit(self, game_map, DeferredMove move, NavRequest *request) except *:
+        """
+        Commit a move, after the moves recorded before it
+        """
+        cdef Circle ship = move.ship.pos
+        cdef Circle target = move.closest_target.pos
+        cdef NavigationCache cache = game_map.navigation_cache
+        cdef ObstacleField ghosts
+        if not request.planned:
+            move.command = move.ship._navigate(move.target, move.closest_target, game_map, move.speed,
+                                               move.max_corrections, move.angular_step, move.ignore_ships,
+                                               move.ignore_planets, move.ignore_ghosts, move.assassin, move.kamikaze,
+                                               move.hint)
+            return
+        self.planned += 1
+
+        if request.heading >= 0 and not move.ignore_ghosts:
+            # Only the ghosts are left to check: the planets and ships are the same
+            ghosts = ObstacleField(ship, target, request.distance, game_map, ignore_ships=True, ignore_planets=True)
+            if ghosts.blocked(request.field.end_x, request.field.end_y, False):
+                # Conflict with a move committed before: navigate again, in order
+                self.conflicts += 1
+                move.command = move.ship._navigate(move.target, move.closest_target, game_map, move.speed,
+                                                   move.max_corrections, move.angular_step, move.ignore_ships,
+                                                   move.ignore_planets, move.ignore_ghosts, move.assassin,
+                                                   move.kamikaze, move.hint)
+                return
+
+        if cache is not None:
+            cache.record(cache.key(move.ship.id, target), request.heading,
+                         (request.heading != request.angle or request.field.retries > 0) and move.hint < 0,
+                         request.field.hint_used)
+        if _metrics.enabled:
+            _metrics.counts[<int>COUNTER_ANGLE_RETRIES] += request.field.retries
+            _metrics.counts[<int>COUNTER_INTERSECT_TESTS] += request.field.tests
+        if request.heading < 0:
+            move.command = move.ship._navigate_around(move.target, move.closest_target, game_map, move.speed,
+                                                      move.max_corrections, move.angular_step, move.ignore_ships,
+                                                      move.ignore_planets, move.ignore_ghosts, move.assassin,
+                                                      move.kamikaze)
+            return
+        speed, angle, ghost = move_along(ship, request.distance, move.speed, request.heading)
+        game_map.add_ghost((ship, ghost))
+        move.command = move.ship.thrust(speed, angle)
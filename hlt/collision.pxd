@@ -0,0 +1,10 @@
+cdef bint segment_circle_hit(double start_x, double start_y, double end_x, double end_y,
+                             double circle_x, double circle_y, double radius, double fudge) noexcept nogil
+
+cdef int segment_circles_first_hit(double start_x, double start_y, double end_x, double end_y,
+                                   const double *x, const double *y, const double *radius, const double *fudge,
+                                   const int *skip, int count, long *tests) noexcept nogil
+
+cdef int segment_circles_hit_mask(double start_x, double start_y, double end_x, double end_y,
+                                  const double *x, const double *y, const double *radius, const double *fudge,
+                                  const int *skip, int count, unsigned char *mask) noexcept nogil
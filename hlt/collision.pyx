@@ -1,39 +1,180 @@
-from .entity import Position, Entity
+"""
+Segment / circle collision kernel: is a move (segment) closer than fudge to a circle?
 
-def intersect_segment_circle(start, end, circle, *, fudge=0.5):
+The test follows the original SymPy derivation operation for operation, but compares squared distances: the
+square root is only taken when the squared distance is too close to the limit for the comparison to be exact.
+The results are the same as the starter kit's intersect_segment_circle.
+"""
+cimport cython
+from libc.math cimport sqrt
+
+from .instrumentation cimport Metrics, COUNTER_INTERSECT_TESTS
+from .instrumentation import metrics
+
+cdef Metrics _metrics = metrics
+
+# Relative margin around limit ** 2 within which the square root is taken (rounding error of the square: 2 ** -53)
+cdef double SQUARE_MARGIN = 1e-12
+
+
+cdef inline bint _within(double distance2, double limit) noexcept nogil:
     """
-    Test whether a line segment and circle intersect.
+    sqrt(distance2) <= limit, without the square root in almost all cases
+    """
+    cdef double limit2
+    if limit < 0:
+        return False
+    limit2 = limit * limit
+    if distance2 < limit2 * (1 - SQUARE_MARGIN):
+        return True
+    if distance2 > limit2 * (1 + SQUARE_MARGIN):
+        return False
+    return sqrt(distance2) <= limit
+
+
+@cython.cdivision(True)
+cdef bint segment_circle_hit(double start_x, double start_y, double end_x, double end_y,
+                             double circle_x, double circle_y, double radius, double fudge) noexcept nogil:
+    """
+    Test whether the segment [start, end] passes within radius + fudge of the circle center
 
-    :param Entity start: The start of the line segment. (Needs x, y attributes)
-    :param Entity end: The end of the line segment. (Needs x, y attributes)
-    :param Entity circle: The circle to test against. (Needs x, y, r attributes)
-    :param float fudge: A fudge factor; additional distance to leave between the segment and circle. (Probably set this to the ship radius, 0.5.)
     :return: True if intersects, False otherwise
-    :rtype: bool
     """
     # Derived with SymPy
     # Parameterize the segment as start + t * (end - start),
     # and substitute into the equation of a circle
     # Solve for t
-    dx = end.pos.x - start.pos.x
-    dy = end.pos.y - start.pos.y
-
-    a = dx**2 + dy**2
-    b = -2 * (start.pos.x**2 - start.pos.x*end.pos.x - start.pos.x*circle.pos.x + end.pos.x*circle.pos.x +
-              start.pos.y**2 - start.pos.y*end.pos.y - start.pos.y*circle.pos.y + end.pos.y*circle.pos.y)
-    c = (start.pos.x - circle.pos.x)**2 + (start.pos.y - circle.pos.y)**2
-
+    cdef double dx = end_x - start_x
+    cdef double dy = end_y - start_y
+    cdef double a = dx ** 2 + dy ** 2
     if a == 0.0:
         # Start and end are the same point
-        return start.calculate_distance_between(circle) <= circle.pos.radius + fudge
+        return _within(((start_x - circle_x) ** 2) + ((start_y - circle_y) ** 2), radius + fudge)
 
+    cdef double b = -2 * (start_x ** 2 - start_x * end_x - start_x * circle_x + end_x * circle_x +
+                          start_y ** 2 - start_y * end_y - start_y * circle_y + end_y * circle_y)
     # Time along segment when closest to the circle (vertex of the quadratic)
-    t = min(-b / (2 * a), 1.0)
+    cdef double t = min(-b / (2 * a), 1.0)
     if t < 0:
         return False
 
-    closest_x = start.pos.x + dx * t
-    closest_y = start.pos.y + dy * t
-    closest_distance = Position(closest_x, closest_y).calculate_distance_between(circle)
+    cdef double closest_x = start_x + dx * t
+    cdef double closest_y = start_y + dy * t
+    return _within(((closest_x - circle_x) ** 2) + ((closest_y - circle_y) ** 2), radius + fudge)
+
+
+cdef int segment_circles_first_hit(double start_x, double start_y, double end_x, double end_y,
+                                   const double *x, const double *y, const double *radius, const double *fudge,
+                                   const int *skip, int count, long *tests) noexcept nogil:
+    """
+    Test the segment [start, end] against count circles, each one with its own fudge
+
+    :param skip: Non zero for the circles to leave out (optional, NULL)
+    :param tests: Incremented by the number of circles tested, the skipped ones left out (optional, NULL)
+    :return: The index of the first circle hit, -1 if none
+    """
+    cdef int i
+    for i in range(count):
+        if skip != NULL and skip[i]:
+            continue
+        if tests != NULL:
+            tests[0] += 1
+        if segment_circle_hit(start_x, start_y, end_x, end_y, x[i], y[i], radius[i], fudge[i]):
+            return i
+    return -1
+
 
-    return closest_distance <= circle.pos.radius + fudge
+cdef int segment_circles_hit_mask(double start_x, double start_y, double end_x, double end_y,
+                                  const double *x, const double *y, const double *radius, const double *fudge,
+                                  const int *skip, int count, unsigned char *mask) noexcept nogil:
+    """
+    Test the segment [start, end] against count circles, each one with its own fudge
+
+    :param skip: Non zero for the circles to leave out (optional, NULL)
+    :param mask: Set to 1 for the circles hit, 0 for the others
+    :return: The number of circles hit
+    """
+    cdef int i
+    cdef int hits = 0
+    for i in range(count):
+        mask[i] = (skip == NULL or not skip[i]) and segment_circle_hit(start_x, start_y, end_x, end_y, x[i], y[i],
+                                                                      radius[i], fudge[i])
+        hits += mask[i]
+    return hits
+
+
+def intersect_segment_circle(start, end, circle, *, double fudge=0.5):
+    """
+    Test whether a line segment and circle intersect.
+
+    :param Entity start: The start of the line segment. (Needs x, y attributes)
+    :param Entity end: The end of the line segment. (Needs x, y attributes)
+    :param Entity circle: The circle to test against. (Needs x, y, r attributes)
+    :param float fudge: A fudge factor; additional distance to leave between the segment and circle. (Probably set this to the ship radius, 0.5.)
+    :return: True if intersects, False otherwise
+    :rtype: bool
+    """
+    if _metrics.enabled:
+        _metrics.counts[<int>COUNTER_INTERSECT_TESTS] += 1
+    return segment_circle_hit(start.pos.x, start.pos.y, end.pos.x, end.pos.y, circle.pos.x, circle.pos.y,
+                              circle.pos.radius, fudge)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def segment_first_hit(double start_x, double start_y, double end_x, double end_y, const double[:] x,
+                      const double[:] y, const double[:] radius, const double[:] fudge, const int[:] skip=None):
+    """
+    Test a segment against arrays of circles, up to the first hit
+
+    :param x: x-coordinates of the circles
+    :param y: y-coordinates of the circles
+    :param radius: Radii of the circles
+    :param fudge: Distance to leave between the segment and each circle
+    :param skip: Non zero for the circles to leave out (optional)
+    :return: The index of the first circle hit (-1 if none) and the number of circles tested
+    :rtype: (int, int)
+    """
+    cdef int count = x.shape[0]
+    cdef int hit
+    cdef long tests = 0
+    if y.shape[0] != count or radius.shape[0] != count or fudge.shape[0] != count or \
+            (skip is not None and skip.shape[0] != count):
+        raise ValueError("The circle arrays and the skip mask must have the same length")
+    if count == 0:
+        return -1, 0
+    with nogil:
+        hit = segment_circles_first_hit(start_x, start_y, end_x, end_y, &x[0], &y[0], &radius[0], &fudge[0],
+                                        &skip[0] if skip is not None else NULL, count, &tests)
+    if _metrics.enabled:
+        _metrics.counts[<int>COUNTER_INTERSECT_TESTS] += tests
+    return hit, tests
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def segment_hit_mask(double start_x, double start_y, double end_x, double end_y, const double[:] x,
+                     const double[:] y, const double[:] radius, const double[:] fudge, unsigned char[:] mask):
+    """
+    Test a segment against arrays of circles
+
+    :param x: x-coordinates of the circles
+    :param y: y-coordinates of the circles
+    :param radius: Radii of the circles
+    :param fudge: Distance to leave between the segment and each circle
+    :param mask: Output, set to 1 for the circles hit, 0 for the others
+    :return: The number of circles hit
+    :rtype: int
+    """
+    cdef int count = x.shape[0]
+    cdef int hits
+    if y.shape[0] != count or radius.shape[0] != count or fudge.shape[0] != count or mask.shape[0] != count:
+        raise ValueError("The circle arrays and the mask must have the same length")
+    if count == 0:
+        return 0
+    if _metrics.enabled:
+        _metrics.counts[<int>COUNTER_INTERSECT_TESTS] += count
+    with nogil:
+        hits = segment_circles_hit_mask(start_x, start_y, end_x, end_y, &x[0], &y[0], &radius[0], &fudge[0], NULL,
+                                        count, &mask[0])
+    return hits
@@ -0,0 +1,30 @@
+from .navigation cimport Circle
+
+
+cdef class Entity:
+    cdef public long id
+    cdef public Circle pos
+    cdef public long health
+    cdef public object owner
+    cdef public long owner_id
+
+
+cdef class Planet(Entity):
+    cdef public long num_docking_spots
+    cdef public long current_production
+    cdef public long remaining_resources
+    cdef public list _docked_ship_ids
+    cdef public dict _docked_ships
+    cdef public long anticipating_remaining_resources
+
+
+cdef class Ship(Entity):
+    cdef public int docking_status
+    cdef public object planet
+    cdef public long _docking_progress
+    cdef public long _weapon_cooldown
+    cdef public Circle velocity
+
+
+cdef class Position(Entity):
+    pass
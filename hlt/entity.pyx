@@ -2,19 +2,37 @@ import abc
 import logging
 import math
 import random
-from enum import Enum
+from enum import IntEnum
 
-from .navigation import Circle, navigate, calculate_distance_between, calculate_direction, calculate_angle_between, closest_point_to, op_target
+from .navigation cimport Circle, calculate_distance_between, calculate_angle_between, closest_point_to
+from .navigation import navigate, calculate_direction, op_target
+from .roles cimport RoleTable, ROLE_FIGHT, ROLE_BOMB, ROLE_SETTLE, ROLE_DEFEND
 from . import constants
 
 
 INTERMEDIATE_RATIO = 0.5
 
-class Entity:
+# Preformatted " <int>" fragments of the thrust commands
+_SPEED_FRAGMENTS = tuple(" {}".format(speed) for speed in range(constants.MAX_SPEED + 1))
+_ANGLE_FRAGMENTS = tuple(" {}".format(angle) for angle in range(361))
+
+
+class DockingStatus(IntEnum):
+    """
+    Docking status of a ship. Ships store it as a plain int, which compares equal to these values.
+    """
+    UNDOCKED = 0
+    DOCKING = 1
+    DOCKED = 2
+    UNDOCKING = 3
+
+
+cdef class Entity:
     """
     Then entity abstract base-class represents all game entities possible. As a base all entities possess
     a position, radius, health, an owner and an id. Note that ease of interoperability, Position inherits from
     Entity.
+    The fields are typed (see entity.pxd): the entities have no instance dict.
 
     :ivar id: The entity ID
     :ivar x: The entity x-coordinate.
@@ -22,13 +40,14 @@ class Entity:
     :ivar radius: The radius of the entity (may be 0)
     :ivar health: The entity's health.
     :ivar owner: The player ID of the owner, if any. If None, Entity is not owned.
+    :ivar owner_id: The player ID of the owner, -1 if none. Unlike owner, it stays an id after linking.
     """
-    __metaclass__ = abc.ABCMeta
 
-    def __init__(self, x, y, radius, health, player, entity_id):
+    def __init__(self, double x, double y, double radius, long health, player, long entity_id):
         self.pos = Circle(x, y, radius)
         self.health = health
         self.owner = player
+        self.owner_id = player if player is not None else -1
         self.id = entity_id
 
     def calculate_distance_between(self, target):
@@ -80,7 +99,7 @@ class Entity:
     DEFENSE_RADIUS = 35
 
 
-class Planet(Entity):
+cdef class Planet(Entity):
     """
     A planet on the game map.
 
@@ -99,7 +118,8 @@ class Planet(Entity):
 
     DEFENSE_RADIUS = 70
 
-    def __init__(self, planet_id, x, y, hp, radius, docking_spots, current, remaining, owned, owner, docked_ships):
+    def __init__(self, long planet_id, double x, double y, long hp, double radius, long docking_spots, long current,
+                 long remaining, owned, long owner, list docked_ships):
         self.id = planet_id
         self.pos = Circle(x, y, radius)
         self.num_docking_spots = docking_spots
@@ -107,7 +127,24 @@ class Planet(Entity):
         self.remaining_resources = remaining
 
         self.health = hp
-        self.owner = owner if bool(int(owned)) else None
+        self.owner_id = owner if owned else -1
+        self.owner = owner if owned else None
+        self._docked_ship_ids = docked_ships
+        self._docked_ships = {}
+        self.anticipating_remaining_resources = self.num_docking_spots - len(docked_ships)
+
+    def _update(self, long hp, long current, long remaining, owned, long owner, list docked_ships):
+        """
+        Update the planet in place with the state of a new turn. Planets don't move: only the dynamic fields change.
+        Owner is set back to an id, _link resolves it again.
+
+        :return: nothing
+        """
+        self.current_production = current
+        self.remaining_resources = remaining
+        self.health = hp
+        self.owner_id = owner if owned else -1
+        self.owner = owner if owned else None
         self._docked_ship_ids = docked_ships
         self._docked_ships = {}
         self.anticipating_remaining_resources = self.num_docking_spots - len(docked_ships)
@@ -194,7 +231,7 @@ class Planet(Entity):
         :return: nothing
         """
         if self.owner is not None:
-            self.owner = players.get(self.owner)
+            self.owner = players.get(self.owner_id)
             for ship in self._docked_ship_ids:
                 self._docked_ships[ship] = self.owner.get_ship(ship)
 
@@ -245,36 +282,68 @@ class Planet(Entity):
         return planets, remainder
 
 
-class Ship(Entity):
+cdef object _assigned_foe(RoleTable roles, long ship_id, map):
+    """
+    :return: The foe ship targeted by the ship, None if none. A target which died is forgotten.
+    """
+    owner = map.get_player(roles.foe_owner(ship_id))
+    if owner is None:
+        return None
+    foe = owner.get_ship(roles.foe(ship_id))
+    if foe is None:
+        roles.set_foe(ship_id, -1, -1)
+    return foe
+
+
+cdef class Ship(Entity):
     """
     A ship in the game.
 
     :ivar id: The ship ID.
     :ivar pos: The ship position (Circle)
     :ivar health: The ship's remaining health.
-    :ivar DockingStatus docking_status: The docking status (UNDOCKED, DOCKED, DOCKING, UNDOCKING)
+    :ivar int docking_status: The docking status (DockingStatus: UNDOCKED, DOCKED, DOCKING, UNDOCKING)
     :ivar planet: The ID of the planet the ship is docked to, if applicable.
     :ivar owner: The player ID of the owner, if any. If None, Entity is not owned.
     :ivar velocity Circl: contains vel_x & vel_y
     """
 
-    class DockingStatus(Enum):
-        UNDOCKED = 0
-        DOCKING = 1
-        DOCKED = 2
-        UNDOCKING = 3
+    # Kept as a class attribute for the existing Ship.DockingStatus.X comparisons
+    DockingStatus = DockingStatus
 
-    def __init__(self, player_id, ship_id, x, y, hp, vel_x, vel_y, docking_status, planet, progress, cooldown):
+    def __init__(self, long player_id, long ship_id, double x, double y, long hp, double vel_x, double vel_y,
+                 int docking_status, planet, long progress, long cooldown):
         self.id = ship_id
         self.pos = Circle(x, y, constants.SHIP_RADIUS)
         self.owner = player_id
+        self.owner_id = player_id
         self.health = hp
         self.docking_status = docking_status
-        self.planet = planet if (docking_status is not Ship.DockingStatus.UNDOCKED) else None
+        self.planet = planet if (docking_status != DockingStatus.UNDOCKED) else None
         self._docking_progress = progress
         self._weapon_cooldown = cooldown
         self.velocity = Circle(vel_x, vel_y, 0)
 
+    def _update(self, long player_id, double x, double y, long hp, double vel_x, double vel_y, int docking_status,
+                planet, long progress, long cooldown):
+        """
+        Update the ship in place with the state of a new turn, reusing its Circles.
+        Owner and planet are set back to ids, _link resolves them again.
+
+        :return: nothing
+        """
+        self.pos.x = x
+        self.pos.y = y
+        self.owner = player_id
+        self.owner_id = player_id
+        self.health = hp
+        self.docking_status = docking_status
+        self.planet = planet if (docking_status != DockingStatus.UNDOCKED) else None
+        self._docking_progress = progress
+        self._weapon_cooldown = cooldown
+        self.velocity.x = vel_x
+        self.velocity.y = vel_y
+
     def thrust(self, magnitude, angle):
         """
         Generate a command to accelerate this ship.
@@ -286,13 +355,17 @@ class Ship(Entity):
         """
         # restrict magnitude between 0 and MAX_SPEED
         if magnitude > constants.MAX_SPEED:
-            logging.ERROR("RECEIVED an invalid thrust ! %s" % magnitude)
+            logging.error("RECEIVED an invalid thrust ! %s", magnitude)
 
         magnitude = min(magnitude, constants.MAX_SPEED)
         magnitude = max(magnitude, 0)
         # we want to round angle to nearest integer, but we want to round
         # magnitude down to prevent overshooting and unintended collisions
-        return "t {} {} {}".format(self.id, int(magnitude), round(angle))
+        speed = int(magnitude)
+        angle = round(angle)
+        if type(angle) is int and 0 <= angle <= 360:
+            return "t " + str(self.id) + _SPEED_FRAGMENTS[speed] + _ANGLE_FRAGMENTS[angle]
+        return "t {} {} {}".format(self.id, speed, angle)
 
     def dock(self, planet):
         """
@@ -315,7 +388,7 @@ class Ship(Entity):
 
     def navigate(self, target, game_map, speed, max_corrections=90, angular_step=1, ignore_ships=False,
                  ignore_planets=False, ignore_ghosts=False, assassin=False, closest=False,
-                 kamikaze=False):
+                 kamikaze=False, flow=None):
         """
         # Will calculate a valid path between the ship and the target
 
@@ -329,7 +402,10 @@ class Ship(Entity):
         :param ignore_ghosts:  Should we ignore ghosts in obstacles list
         :param assassin:  Is the ship an assassin
         :param closest:  Shold we navigate to the target's position? or the closest position within the radius
-        :return:
+        :param flow: The planet the ship heads for: its flow field gives the heading tried first when the straight
+                     line is blocked, if the map has flow fields (see flowfield.FlowFields)
+        :return: The thrust command, or a batch.DeferredMove if the map batches the navigation (the command is
+                 computed by Map.resolve_navigation)
         """
 
         # Should we navigate to the point directly? or the closest points inside our radius?
@@ -338,8 +414,26 @@ class Ship(Entity):
         else:
             closest_target = target
 
+        hint = -1
+        if flow is not None and game_map.flow_fields is not None:
+            hint = game_map.flow_fields.heading(flow, self.pos, game_map)
+
+        batch = game_map.navigation_batch
+        if batch is not None:
+            # Only record the move: the moves of the turn are planned together by Map.resolve_navigation
+            return batch.defer(self, target, closest_target, speed, max_corrections, angular_step, ignore_ships,
+                               ignore_planets, ignore_ghosts, assassin, kamikaze, hint)
+        return self._navigate(target, closest_target, game_map, speed, max_corrections, angular_step, ignore_ships,
+                              ignore_planets, ignore_ghosts, assassin, kamikaze, hint)
+
+    def _navigate(self, target, closest_target, game_map, speed, max_corrections, angular_step, ignore_ships,
+                  ignore_planets, ignore_ghosts, assassin, kamikaze, hint=-1):
+        """
+        Navigate to closest_target right now, see navigate
+        """
         final_speed, angle, ghost = navigate(self.pos, closest_target.pos, game_map, speed, max_corrections=max_corrections, angular_step=angular_step, ignore_ships=ignore_ships,
-                                             ignore_planets=ignore_planets, ignore_ghosts=ignore_ghosts, assassin=assassin)
+                                             ignore_planets=ignore_planets, ignore_ghosts=ignore_ghosts, assassin=assassin,
+                                             cache_key=self.id, heading_hint=hint)
 
         # If there is a ghost it means we found a way to navigate
         if ghost is not None:
@@ -348,8 +442,16 @@ class Ship(Entity):
             # Move
             return self.thrust(final_speed, angle)
 
+        return self._navigate_around(target, closest_target, game_map, speed, max_corrections, angular_step,
+                                     ignore_ships, ignore_planets, ignore_ghosts, assassin, kamikaze)
+
+    def _navigate_around(self, target, closest_target, game_map, speed, max_corrections, angular_step,
+                         ignore_ships, ignore_planets, ignore_ghosts, assassin, kamikaze):
+        """
+        No path to closest_target: head for an intermediate position, closer to the ship, see navigate
+        """
         # Retry with an intermediate position
-        logging.debug("Can't find a path to %s, so Looking for an intermediate position" % target.id)
+        logging.debug("Can't find a path to %s, so Looking for an intermediate position", target.id)
         # Calculate the intermediate position
         # Take the direction
         new_target = calculate_direction(self.pos, target.pos)
@@ -360,7 +462,7 @@ class Ship(Entity):
         new_speed = min(speed, distance)
         new_speed *= INTERMEDIATE_RATIO
         # Apply a ratio to find an intermediate point at "speed" distance
-        logging.debug("Going at a new point located at 'speed:%s' distance of the ship" % new_speed)
+        logging.debug("Going at a new point located at 'speed:%s' distance of the ship", new_speed)
         if distance != 0:
             new_target.x *= new_speed / distance
             new_target.y *= new_speed / distance
@@ -371,7 +473,7 @@ class Ship(Entity):
         final_speed, angle, ghost = navigate(self.pos, new_target, game_map, new_speed,
                                              max_corrections=max_corrections + 30, angular_step=angular_step,
                                              ignore_ships=ignore_ships, ignore_planets=ignore_planets,
-                                             ignore_ghosts=ignore_ghosts, assassin=assassin)
+                                             ignore_ghosts=ignore_ghosts, assassin=assassin, cache_key=self.id)
 
 
         if ghost is not None:
@@ -404,7 +506,7 @@ class Ship(Entity):
         :param dict[int, Planet] players: A dictionary of planet objects keyed by id
         :return: nothing
         """
-        self.owner = players.get(self.owner)  # All ships should have an owner. If not, this will just reset to None
+        self.owner = players.get(self.owner_id)  # All ships should have an owner. If not, this will just reset to None
         self.planet = planets.get(self.planet)  # If not will just reset to none
 
 
@@ -412,103 +514,79 @@ class Ship(Entity):
 
 
     @staticmethod
-    def fight(self, map):
+    def fight(Ship self, map):
+        cdef RoleTable roles = map.roles
 
         if self.docking_status in [Ship.DockingStatus.DOCKED, Ship.DockingStatus.DOCKING]:
             return self.undock()
 
-        foe = None
-
-        try:
-            foe_owner = map.get_player(map.ship_assignment[self.id]['foe'][1])
-            foe = foe_owner.get_ship(map.ship_assignment[self.id]['foe'][0])
-            if foe is None:
-                del map.ship_assignment[self.id]['foe']
-        except:
-            pass
+        foe = _assigned_foe(roles, self.id, map)
 
         if foe is not None and map.ship_exist(foe):
             return self.navigate(self.closest_point_to(foe), map, speed=constants.MAX_SPEED, assassin=True)
 
-        foe_ships_by_distance = {}
-        for foe_ship in map.get_foe_ships():
-            foe_ships_by_distance.setdefault(self.calculate_distance_between(foe_ship), []).append(foe_ship)
-
-        for distance in sorted(foe_ships_by_distance):
-
-            near_foe_ships = foe_ships_by_distance[distance]
-            for foe_ship in near_foe_ships:
-                try:
-                    map.foe_ships_assignment[foe_ship.id]
-                    continue
-                except:
-                    map.foe_ships_assignment[foe_ship.id] = self.id
-                    map.ship_assignment[self.id]['foe'] = (foe_ship.id, foe_ship.owner.id)
-                    return self.navigate(self.closest_point_to(foe_ship), map, speed=constants.MAX_SPEED, assassin=True)
+        for distance, foe_ship in map.iter_nearest_foes(self):
+            if foe_ship.id in map.foe_ships_assignment:
+                continue
+            map.foe_ships_assignment[foe_ship.id] = self.id
+            roles.set_foe(self.id, foe_ship.id, foe_ship.owner_id)
+            return self.navigate(self.closest_point_to(foe_ship), map, speed=constants.MAX_SPEED, assassin=True)
 
-        del map.ship_assignment[self.id]
+        roles.clear(self.id)
         return None
 
 
     @staticmethod
-    def bomb(self, map):
+    def bomb(Ship self, map):
+        cdef RoleTable roles = map.roles
 
         alea = random.uniform(0, 100)
         if alea > 90:
-            map.ship_assignment[self.id]['action'] = Ship.fight
+            roles.set_role(self.id, ROLE_FIGHT)
 
-        foe_ship = None
-
-        try:
-            foe_owner = map.get_player(map.ship_assignment[self.id]['foe'][1])
-            foe_ship = foe_owner.get_ship(map.ship_assignment[self.id]['foe'][0])
-            if foe_ship is None:
-                del map.ship_assignment[self.id]['foe']
-        except:
-            pass
+        foe_ship = _assigned_foe(roles, self.id, map)
 
         if foe_ship is not None:
             if foe_ship.planet is not None:
-                map.ship_assignment[self.id]['planet'] = foe_ship.planet.id
+                roles.set_planet(self.id, foe_ship.planet.id)
             return self.navigate(self.closest_point_to(foe_ship), map, speed=constants.MAX_SPEED, assassin=True)
 
-        foe_ships_by_distance = {}
-        for foe_ship in map.get_foe_ships():
-            foe_ships_by_distance.setdefault(self.calculate_distance_between(foe_ship), []).append(foe_ship)
-
         closest_foe = None
-        for distance in sorted(foe_ships_by_distance.keys()):
+        for distance, foe_ship in map.iter_nearest_foes(self):
             if closest_foe is None:
-                closest_foe = distance
+                closest_foe = foe_ship
 
-            near_foe_ships = foe_ships_by_distance[distance]
-            for foe_ship in near_foe_ships:
-                try:
-                    map.foe_ships_assignment[foe_ship.id]
-                    continue
-                except:
-                    if foe_ship.docking_status != Ship.DockingStatus.UNDOCKED or distance < 10:
-                        map.foe_ships_assignment[foe_ship.id] = self.id
-                        map.ship_assignment[self.id]['foe'] = (foe_ship.id, foe_ship.owner.id)
-                        return self.navigate(self.closest_point_to(foe_ship), map, speed=constants.MAX_SPEED, assassin=True)
-        foe_ship = foe_ships_by_distance[closest_foe][0]
-        map.ship_assignment[self.id]['foe'] = (foe_ship.id, foe_ship.owner.id)
+            if foe_ship.id in map.foe_ships_assignment:
+                continue
+            if foe_ship.docking_status != Ship.DockingStatus.UNDOCKED or distance < 10:
+                map.foe_ships_assignment[foe_ship.id] = self.id
+                roles.set_foe(self.id, foe_ship.id, foe_ship.owner_id)
+                return self.navigate(self.closest_point_to(foe_ship), map, speed=constants.MAX_SPEED, assassin=True)
+
+        if closest_foe is None:
+            roles.clear(self.id)
+            return None
+
+        foe_ship = closest_foe
+        roles.set_foe(self.id, foe_ship.id, foe_ship.owner_id)
 
         return self.navigate(self.closest_point_to(foe_ship), map, speed=constants.MAX_SPEED, assassin=True)
 
     @staticmethod
-    def defend(self, map):
+    def defend(Ship self, map):
+        cdef RoleTable roles = map.roles
 
         alea = random.uniform(0, 100)
         if alea > 80:
-            map.ship_assignment[self.id]['action'] = Ship.fight
+            roles.set_role(self.id, ROLE_FIGHT)
             return  Ship.fight(self, map)
 
-        if 'position' in  map.ship_assignment[self.id]:
-            position = map.ship_assignment[self.id]['position']
+        held = roles.position(self.id)
+        if held is None:
+            roles.set_position(self.id, self.pos.x, self.pos.y, self.pos.radius)
+            position = Position(x=self.pos.x, y=self.pos.y, radius=self.pos.radius)
         else:
-            map.ship_assignment[self.id]['position'] = Position(x=self.pos.x, y=self.pos.y, radius=self.pos.radius)
-            position = map.ship_assignment[self.id]['position']
+            position = Position(*held)
 
         if self.docking_status in [Ship.DockingStatus.DOCKED, Ship.DockingStatus.DOCKING]:
             return self.undock()
@@ -516,177 +594,162 @@ class Ship(Entity):
         if self.calculate_distance_between(position) > self.DEFENSE_RADIUS:
             return self.navigate(self.closest_point_to(position), map, speed=constants.MAX_SPEED)
 
-        foe_ships_by_distance = {}
-        for foe_ship in map.get_foe_ships():
-            foe_ships_by_distance.setdefault(self.calculate_distance_between(foe_ship), []).append(foe_ship)
+        if map.influence().foes_near(self.pos, self.DEFENSE_RADIUS):
+            snapshot = map.snapshot()
+            foe_distances = snapshot.foe_distances(self)
+            closest = foe_distances.argmin()
+            if foe_distances[closest] <= self.DEFENSE_RADIUS:
+                return self.navigate(self.closest_point_to(snapshot.foe_ships[closest]), map,
+                                     speed=constants.MAX_SPEED, assassin=True)
 
-        for distance in sorted(foe_ships_by_distance.keys()):
 
-            if distance > self.DEFENSE_RADIUS:
-                break
-
-            return self.navigate(self.closest_point_to(foe_ships_by_distance[distance][0]), map,
-                                 speed=constants.MAX_SPEED, assassin=True)
-
-
-        if 'previous_planet' in map.ship_assignment[self.id]:
-            planet = map.get_planet(map.ship_assignment[self.id]['previous_planet'])
+        if roles.previous_planet(self.id) >= 0:
+            planet = map.get_planet(roles.previous_planet(self.id))
             if planet.anticipating_remaining_resources > 0:
                 planet.anticipating_remaining_resources -= 1
-                map.ship_assignment[self.id]['action'] = Ship.settle
-                map.ship_assignment[self.id]['planet'] = map.ship_assignment[self.id]['previous_planet']
+                roles.set_role(self.id, ROLE_SETTLE)
+                roles.set_planet(self.id, roles.previous_planet(self.id))
                 return Ship.settle(self, map)
 
-        map.ship_assignment[self.id]['action'] = Ship.fight
+        roles.set_role(self.id, ROLE_FIGHT)
         return Ship.fight(self, map)
 
     @staticmethod
-    def pure_settle(self, map):
+    def pure_settle(Ship self, map):
+        cdef RoleTable roles = map.roles
 
-        planet = map.get_planet(map.ship_assignment[self.id]['planet'])
+        planet = map.get_planet(roles.planet(self.id))
 
         if planet is None:
-            map.ship_assignment[self.id]['action'] = Ship.fight
+            roles.set_role(self.id, ROLE_FIGHT)
             return Ship.fight(self, map)
 
         if (planet.is_owned() is False or (planet.is_owned() is True \
                                            and planet.owner.id == map.get_me().id \
                                            and planet.is_full() is False)):
             if self.can_dock(planet):
-                del map.ship_assignment[self.id]
+                roles.clear(self.id)
                 return self.dock(planet)
             else:
                 return self.navigate(self.closest_point_to(planet), map,
-                                     speed=constants.MAX_SPEED)
+                                     speed=constants.MAX_SPEED, flow=planet)
 
         if planet.is_owned() is True and planet.owner.id != map.get_me().id:
-            map.ship_assignment[self.id] = {'action': self.bomb,}
+            roles.assign(self.id, ROLE_BOMB)
             return Ship.bomb(self, map)
 
-        map.ship_assignment[self.id]['action'] = Ship.fight
+        roles.set_role(self.id, ROLE_FIGHT)
         return Ship.fight(self, map)
 
 
 
     @staticmethod
-    def settle(self, map):
+    def settle(Ship self, map):
+        cdef RoleTable roles = map.roles
 
-        foe_ships_by_distance = {}
-
-        planet = map.get_planet(map.ship_assignment[self.id]['planet'])
+        planet = map.get_planet(roles.planet(self.id))
 
         if planet is not None and planet.remaining_resources == 0:
             planet = None
 
-        for foe_ship in map.get_foe_ships():
-            foe_ships_by_distance.setdefault(self.calculate_distance_between(foe_ship), []).append(foe_ship)
-
-        for distance in sorted(foe_ships_by_distance.keys()):
-            if distance > self.DEFENSE_RADIUS:
-                break
+        # Only the distances up to DEFENSE_RADIUS matter: the influence map rules out most settlers at once
+        if map.influence().foes_near(self.pos, self.DEFENSE_RADIUS):
+            foe_distances = map.snapshot().foe_distances(self)
+            distance = foe_distances.min() if len(foe_distances) > 0 else math.inf
+        else:
+            distance = math.inf
 
+        if distance <= self.DEFENSE_RADIUS:
             if planet is not None:
                 planet.anticipating_remaining_resources += 1
-                map.ship_assignment[self.id]['previous_planet'] = map.ship_assignment[self.id]['planet']
-                del  map.ship_assignment[self.id]['planet']
-            map.ship_assignment[self.id]['action'] = Ship.defend
+                roles.set_previous_planet(self.id, roles.planet(self.id))
+                roles.set_planet(self.id, -1)
+            roles.set_role(self.id, ROLE_DEFEND)
             return self.defend(self, map)
 
         if planet is None:
-            map.ship_assignment[self.id]['action'] = Ship.fight
+            roles.set_role(self.id, ROLE_FIGHT)
             return Ship.fight(self, map)
 
         if (planet.is_owned() is False or (planet.is_owned() is True \
                                            and planet.owner.id == map.get_me().id \
                                            and planet.is_full() is False)) \
                 and self.can_dock(planet):
-            del map.ship_assignment[self.id]
+            roles.clear(self.id)
             return self.dock(planet)
 
         if distance > 3:
             return self.navigate(self.closest_point_to(planet), map,
-                                 speed=constants.MAX_SPEED)
+                                 speed=constants.MAX_SPEED, flow=planet)
 
-        map.ship_assignment[self.id]['action'] = Ship.fight
+        roles.set_role(self.id, ROLE_FIGHT)
         return Ship.fight(self, map)
 
     @staticmethod
-    def nothing(self, map):
-        del map.ship_assignment[self.id]
+    def nothing(Ship self, map):
+        map.roles.clear(self.id)
         return None
 
     @staticmethod
-    def rabbit(self, map):
-        foe_ships_by_distance ={}
-        for foe_ship in map.get_foe_ships():
-            foe_ships_by_distance.setdefault(self.calculate_distance_between(foe_ship), []).append(foe_ship)
-
-        if len(foe_ships_by_distance) > 0:
-            for distance in sorted(foe_ships_by_distance.keys()):
-                for foe in foe_ships_by_distance[distance]:
-                    if foe.docking_status == Ship.DockingStatus.UNDOCKED:
-                        if distance < self.DEFENSE_RADIUS:
-                            try:
-                                planet = map.get_planet(map.planets_by_player[map.ship_assignment[self.id]['planet']])
-                                planet_pos = planet.pos
-                            except:
-                                try:
-                                    map.ship_assignment[self.id]['planet'] = map.planets_by_player[foe.owner.id][0]
-                                    planet = map.get_planet(map.planets_by_player[foe.owner.id][0])
-                                    planet_pos = planet.pos
-                                except:
-                                    planet = None
-                                    planet_pos = Circle(0,0,0)
-
-                            ghost_pos  = op_target(self.pos, foe.pos, map.width, map.height)
-                            ghost_pos.radius = 1
-
-                            if planet is not None and self.calculate_distance_between(planet) < 20:
-                                planet_pos = Circle(0,0,0)
-
-                            influence_ghost = 1
-                            influence_planet = 1
-                            p = Position((influence_ghost*ghost_pos.x+influence_planet*planet_pos.x)/(influence_ghost+influence_planet),
-                                         (0-influence_ghost*ghost_pos.y+influence_planet*planet_pos.y)/(influence_ghost+influence_planet),
-                                         ghost_pos.radius)
-
-                            return self.navigate(self.closest_point_to(p), map,
-                                                     speed=constants.MAX_SPEED,
-                                                     kamikaze=False)
-                        else:
-                            foe.pos.radius += self.DEFENSE_RADIUS
-                            return self.navigate(self.closest_point_to(foe), map,
-                                                     speed=constants.MAX_SPEED,
-                                                     assassin=True, closest=True)
-
-        del map.ship_assignment[self.id]
+    def rabbit(Ship self, map):
+        cdef RoleTable roles = map.roles
+        for distance, foe in map.nearest_foes(self, 1, status_filter=(Ship.DockingStatus.UNDOCKED,)):
+            if distance < self.DEFENSE_RADIUS:
+                try:
+                    planet = map.get_planet(map.planets_by_player[roles.planet(self.id)])
+                    planet_pos = planet.pos
+                except:
+                    try:
+                        roles.set_planet(self.id, map.planets_by_player[foe.owner.id][0])
+                        planet = map.get_planet(map.planets_by_player[foe.owner.id][0])
+                        planet_pos = planet.pos
+                    except:
+                        planet = None
+                        planet_pos = Circle(0,0,0)
+
+                ghost_pos  = op_target(self.pos, foe.pos, map.width, map.height)
+                ghost_pos.radius = 1
+
+                if planet is not None and self.calculate_distance_between(planet) < 20:
+                    planet_pos = Circle(0,0,0)
+
+                influence_ghost = 1
+                influence_planet = 1
+                p = Position((influence_ghost*ghost_pos.x+influence_planet*planet_pos.x)/(influence_ghost+influence_planet),
+                             (0-influence_ghost*ghost_pos.y+influence_planet*planet_pos.y)/(influence_ghost+influence_planet),
+                             ghost_pos.radius)
+
+                return self.navigate(self.closest_point_to(p), map,
+                                         speed=constants.MAX_SPEED,
+                                         kamikaze=False)
+            else:
+                # Don't inflate the foe itself: the spatial index is built on its real radius
+                area = Position(foe.pos.x, foe.pos.y, foe.pos.radius + self.DEFENSE_RADIUS)
+                return self.navigate(self.closest_point_to(area), map,
+                                         speed=constants.MAX_SPEED,
+                                         assassin=True, closest=True)
+
+        roles.clear(self.id)
         return None
 
 
     @staticmethod
-    def runner(self, map):
-        foe_ships_by_distance ={}
-        for foe_ship in map.get_foe_ships():
-            foe_ships_by_distance.setdefault(self.calculate_distance_between(foe_ship), []).append(foe_ship)
-
-        if len(foe_ships_by_distance) > 0:
-            for distance in sorted(foe_ships_by_distance.keys()):
-                for foe in foe_ships_by_distance[distance]:
-                    if foe.docking_status == Ship.DockingStatus.UNDOCKED:
-                        ghost_pos  = op_target(self.pos, foe.pos, map.width, map.height)
-                        p = Position(ghost_pos.x, ghost_pos.y, ghost_pos.radius)
-                        return self.navigate(self.closest_point_to(p), map,
-                                                 speed=constants.MAX_SPEED,
-                                                 kamikaze=False)
+    def runner(Ship self, map):
+        cdef RoleTable roles = map.roles
+        for distance, foe in map.nearest_foes(self, 1, status_filter=(Ship.DockingStatus.UNDOCKED,)):
+            ghost_pos  = op_target(self.pos, foe.pos, map.width, map.height)
+            p = Position(ghost_pos.x, ghost_pos.y, ghost_pos.radius)
+            return self.navigate(self.closest_point_to(p), map,
+                                     speed=constants.MAX_SPEED,
+                                     kamikaze=False)
 
 
         try:
-            player =  map.ship_assignment[self.id]['player']
+            player = map.get_player(roles.player(self.id))
             planets = self.planets_by_player[player.id]
             players = [player]
         except:
-            if 'player' in  map.ship_assignment[self.id]:
-                del map.ship_assignment[self.id]['player']
+            roles.set_player(self.id, -1)
             players = map.all_players()
 
         for player in players:
@@ -702,10 +765,10 @@ class Ship(Entity):
                 if len(planets_by_distance) > 0:
                     for distance in sorted(planets_by_distance.keys()):
                         planet = planets_by_distance[distance][0]
-                        map.ship_assignment[self.id]['player'] = player.id
+                        roles.set_player(self.id, player.id)
                         return self.navigate(self.closest_point_to(planet), map,
                                                  speed=constants.MAX_SPEED,
-                                                 )
+                                                 flow=planet)
             except:
                 pass
 
@@ -714,31 +777,24 @@ class Ship(Entity):
 
 
     @staticmethod
-    def kamikaze(self, map):
+    def kamikaze(Ship self, map):
+        cdef RoleTable roles = map.roles
 
-        if 'planet' in map.ship_assignment[self.id]:
-            target = map.get_planet(map.ship_assignment[self.id]['planet'])
+        if roles.planet(self.id) >= 0:
+            target = map.get_planet(roles.planet(self.id))
             if target is not None:
                 final_speed = constants.MAX_SPEED
                 angle = calculate_angle_between(self.pos, target.pos)
                 cmd = self.thrust(final_speed, angle)
-                logging.info('Kamikaze: %s'%cmd)
+                logging.debug('Kamikaze: %s', cmd)
                 return  cmd
 
-        planets_by_distance = {}
-        for planet in list(map.all_planets()):
-            distance = self.calculate_distance_between(planet)
-            planets_by_distance.setdefault(distance, []).append(planet)
-
-        for distance in sorted(planets_by_distance.keys()):
-            near_planets = planets_by_distance[distance]
-
-            for planet in near_planets:
-                if planet.is_owned() and planet.owner.id != map.get_me().id:
-                    map.ship_assignment[self.id]['planet'] = planet.id
-                    return self.navigate(self.closest_point_to(planet), map,
-                                         speed=constants.MAX_SPEED,
-                                         kamikaze=True)
+        my_id = map.get_me().id
+        for distance, planet in map.nearest_planets(self, 1, lambda p: p.is_owned() and p.owner.id != my_id):
+            roles.set_planet(self.id, planet.id)
+            return self.navigate(self.closest_point_to(planet), map,
+                                 speed=constants.MAX_SPEED,
+                                 kamikaze=True)
 
         return None
 
@@ -759,7 +815,7 @@ class Ship(Entity):
          docked, docked_planet, progress, cooldown, *remainder) = tokens
 
         sid = int(sid)
-        docked = Ship.DockingStatus(int(docked))
+        docked = int(docked)
 
         ship = Ship(player_id,
                     sid,
@@ -788,21 +844,27 @@ class Ship(Entity):
         return ships, remainder
 
 
-class Position(Entity):
+cdef class Position(Entity):
     """
     A simple wrapper for a coordinate. Intended to be passed to some functions in place of a ship or planet.
 
-    :ivar id: Unused
+    :ivar id: Unused (-1)
     :ivar pos: The position in Circle
-    :ivar health: Unused.
-    :ivar owner: Unused.
+    :ivar health: Unused (0)
+    :ivar owner: Unused (None)
     """
 
-    def __init__(self, x, y, radius = 0):
+    def __init__(self, double x, double y, double radius = 0):
         self.pos = Circle(x, y, radius)
-        self.health = None
+        self.health = 0
         self.owner = None
-        self.id = None
+        self.owner_id = -1
+        self.id = -1
 
     def _link(self, players, planets):
-        raise NotImplementedError("Position should not have link attributes.")
\ No newline at end of file
+        raise NotImplementedError("Position should not have link attributes.")
+
+
+#: Behavior of each role code (see roles.ROLE_NAMES), None for the unassigned ships
+ACTIONS = (None, Ship.nothing, Ship.fight, Ship.bomb, Ship.settle, Ship.pure_settle, Ship.defend, Ship.runner,
+           Ship.rabbit, Ship.kamikaze)
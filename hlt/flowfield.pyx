@@ -0,0 +1,359 @@
+"""
+Flow fields towards the planets: planets never move, so the way around them to a planet is computed once, on a
+grid over the map, and followed by every ship heading for that planet.
+
+The field of a planet is a shortest path search (Dijkstra, 16 neighbours) from the cells within docking range of
+the planet, around the cells a planet covers. Each cell keeps a waypoint up its path, in straight line of sight and
+at most LOOKAHEAD cells away (as in Theta*, the waypoint of its parent if it sees it, else its parent): the paths
+are not bound to the 16 directions of the grid. Ship.navigate heads for the waypoint of the ship's cell as a hint:
+the heading is still checked against the ships, ghosts and planets around the ship (see
+navigation.obstacles_free_heading), so the field only replaces the angular search around the static planets.
+
+The fields are built the first time a planet is targeted, and dropped when a planet is destroyed (the paths
+around it get shorter).
+"""
+cimport cython
+from libc.stdlib cimport malloc, free
+from libc.math cimport sqrt, floor, atan2, round, M_PI
+
+from . import constants
+from .geometry import PLANET_FUDGE
+from .instrumentation cimport Metrics, STAGE_FLOW_FIELD
+from .instrumentation import metrics
+from .navigation cimport Circle
+
+import numpy as np
+
+cdef Metrics _metrics = metrics
+
+#: Side of a cell
+DEFAULT_CELL_SIZE = 2.0
+#: Maximum distance between a cell and its waypoint, in cells
+LOOKAHEAD = 8
+
+cdef double _PLANET_FUDGE = PLANET_FUDGE
+cdef double _DOCK_REACH = constants.DOCK_RADIUS + constants.SHIP_RADIUS
+cdef int _LOOKAHEAD = LOOKAHEAD
+
+# Neighbours of a cell: 8 around it, plus the knight moves for 16 directions
+cdef int _NEIGHBOURS = 16
+cdef int _DX[16]
+cdef int _DY[16]
+_DX[:] = [1, -1, 0, 0, 1, 1, -1, -1, 1, 1, -1, -1, 2, 2, -2, -2]
+_DY[:] = [0, 0, 1, -1, 1, -1, 1, -1, 2, -2, 2, -2, 1, -1, 1, -1]
+
+# Waypoint of the cells within docking range, and of the cells out of reach
+cdef int GOAL = -1
+cdef int UNREACHABLE = -2
+
+
+cdef struct HeapItem:
+    double distance
+    int cell
+
+
+cdef void _push(HeapItem *heap, int *size, double distance, int cell) noexcept nogil:
+    cdef int i = size[0]
+    cdef int parent
+    size[0] += 1
+    while i > 0:
+        parent = (i - 1) // 2
+        if heap[parent].distance <= distance:
+            break
+        heap[i] = heap[parent]
+        i = parent
+    heap[i].distance = distance
+    heap[i].cell = cell
+
+
+cdef HeapItem _pop(HeapItem *heap, int *size) noexcept nogil:
+    cdef HeapItem top = heap[0]
+    cdef HeapItem last
+    cdef int i = 0
+    cdef int child
+    size[0] -= 1
+    last = heap[size[0]]
+    while True:
+        child = 2 * i + 1
+        if child >= size[0]:
+            break
+        if child + 1 < size[0] and heap[child + 1].distance < heap[child].distance:
+            child += 1
+        if heap[child].distance >= last.distance:
+            break
+        heap[i] = heap[child]
+        i = child
+    heap[i] = last
+    return top
+
+
+cdef class FlowField:
+    """
+    Paths to the docking range of a planet, from every cell of the map. Cell (row, col) covers
+    [col, col + 1) x [row, row + 1) * cell_size.
+
+    :ivar planet_id: Id of the planet
+    :ivar cell_size: Side of a cell
+    :ivar cols: Number of columns (x)
+    :ivar rows: Number of rows (y)
+    :ivar distance: Length of the path of each cell (rows x cols), inf if out of reach
+    :ivar waypoint: Cell each cell heads for (rows x cols), GOAL within docking range, UNREACHABLE out of reach
+    """
+    cdef readonly long planet_id
+    cdef readonly double cell_size
+    cdef readonly int cols
+    cdef readonly int rows
+    cdef readonly object distance
+    cdef readonly object waypoint
+    cdef unsigned char[:] _blocked
+    cdef int[:] _waypoint
+
+    def __init__(self, planet, planets, double width, double height, double cell_size=DEFAULT_CELL_SIZE):
+        """
+        :param Planet planet: The target planet
+        :param list[Planet] planets: The planets of the map (obstacles), the target included
+        :param float width: Map width
+        :param float height: Map height
+        :param float cell_size: Side of a cell
+        """
+        cdef double start = _metrics.start()
+        self.planet_id = planet.id
+        self.cell_size = cell_size
+        self.cols = max(1, <int>(width / cell_size))
+        self.rows = max(1, <int>(height / cell_size))
+        blocked = self._obstacles(planets)
+        self._blocked = blocked.ravel()
+        goal = self._goal(planet) & ~blocked
+        distance = np.full(self.rows * self.cols, np.inf)
+        waypoint = np.full(self.rows * self.cols, UNREACHABLE, dtype=np.int32)
+        waypoint[goal.ravel()] = GOAL
+        parent = np.full(self.rows * self.cols, -1, dtype=np.int32)
+        order = np.empty(self.rows * self.cols, dtype=np.int32)
+        reached = self._search(distance, parent, order, goal.ravel())
+        self._waypoints(waypoint, parent, order, reached)
+        self.distance = distance.reshape(self.rows, self.cols)
+        self.waypoint = waypoint.reshape(self.rows, self.cols)
+        self._waypoint = waypoint
+        _metrics.stop(STAGE_FLOW_FIELD, start)
+
+    def _centers(self):
+        x = (np.arange(self.cols) + 0.5) * self.cell_size
+        y = (np.arange(self.rows) + 0.5) * self.cell_size
+        return x[None, :], y[:, None]
+
+    def _obstacles(self, planets):
+        """
+        :return: The cells a ship can't fully enter without hitting a planet (rows x cols)
+        :rtype: numpy.ndarray
+        """
+        x, y = self._centers()
+        blocked = np.zeros((self.rows, self.cols), dtype=np.uint8)
+        half_diagonal = self.cell_size * sqrt(2) / 2
+        for obstacle in planets:
+            reach = obstacle.pos.radius + _PLANET_FUDGE + half_diagonal
+            blocked |= (x - obstacle.pos.x) ** 2 + (y - obstacle.pos.y) ** 2 < reach ** 2
+        return blocked.astype(bool)
+
+    def _goal(self, planet):
+        """
+        :return: The cells whose center is within docking range of the planet (rows x cols)
+        :rtype: numpy.ndarray
+        """
+        x, y = self._centers()
+        reach = planet.pos.radius + _DOCK_REACH
+        return (x - planet.pos.x) ** 2 + (y - planet.pos.y) ** 2 <= reach ** 2
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef bint _free(self, int row, int col) noexcept nogil:
+        return 0 <= row < self.rows and 0 <= col < self.cols and not self._blocked[row * self.cols + col]
+
+    cdef bint _free_step(self, int row, int col, int k) noexcept nogil:
+        """
+        Can a ship move from (row, col) to its neighbour k without cutting a blocked corner?
+        """
+        cdef int dx = _DX[k]
+        cdef int dy = _DY[k]
+        if not self._free(row + dy, col + dx):
+            return False
+        if dx != 0 and dy != 0:
+            # The cells the segment crosses, besides both ends
+            if abs(dx) == 2:
+                return self._free(row, col + dx // 2) and self._free(row + dy, col + dx // 2)
+            if abs(dy) == 2:
+                return self._free(row + dy // 2, col) and self._free(row + dy // 2, col + dx)
+            return self._free(row, col + dx) and self._free(row + dy, col)
+        return True
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    @cython.cdivision(True)
+    cdef int _search(self, double[:] distance, int[:] parent, int[:] order, goal) except -1:
+        """
+        Dijkstra from the goal cells
+        :return: The number of cells reached, listed by increasing distance in order
+        """
+        cdef int n = self.rows * self.cols
+        # A cell is pushed at most once per neighbour, plus once as a goal
+        cdef HeapItem *heap = <HeapItem *> malloc((_NEIGHBOURS + 1) * n * sizeof(HeapItem))
+        cdef double cost[16]
+        cdef int size = 0
+        cdef int reached = 0
+        cdef HeapItem item
+        cdef int cell, row, col, k, neighbour
+        if heap == NULL:
+            raise MemoryError()
+        for k in range(_NEIGHBOURS):
+            cost[k] = sqrt(_DX[k] * _DX[k] + _DY[k] * _DY[k]) * self.cell_size
+        try:
+            for cell in np.flatnonzero(goal):
+                distance[cell] = 0
+                _push(heap, &size, 0, cell)
+            with nogil:
+                while size > 0:
+                    item = _pop(heap, &size)
+                    if item.distance > distance[item.cell]:
+                        continue
+                    order[reached] = item.cell
+                    reached += 1
+                    row = item.cell // self.cols
+                    col = item.cell % self.cols
+                    for k in range(_NEIGHBOURS):
+                        if not self._free_step(row, col, k):
+                            continue
+                        neighbour = (row + _DY[k]) * self.cols + col + _DX[k]
+                        if item.distance + cost[k] < distance[neighbour]:
+                            distance[neighbour] = item.distance + cost[k]
+                            parent[neighbour] = item.cell
+                            _push(heap, &size, item.distance + cost[k], neighbour)
+        finally:
+            free(heap)
+        return reached
+
+    @cython.cdivision(True)
+    cdef bint _line_of_sight(self, int first, int second) noexcept nogil:
+        """
+        Are the cells along the segment between the centers of two cells all free?
+        """
+        cdef double x0 = first % self.cols + 0.5
+        cdef double y0 = first // self.cols + 0.5
+        cdef double dx = second % self.cols + 0.5 - x0
+        cdef double dy = second // self.cols + 0.5 - y0
+        # Samples every half cell
+        cdef int samples = <int>(2 * sqrt(dx * dx + dy * dy)) + 1
+        cdef int i
+        cdef double t
+        for i in range(1, samples):
+            t = <double>i / samples
+            if not self._free(<int>floor(y0 + t * dy), <int>floor(x0 + t * dx)):
+                return False
+        return True
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    @cython.cdivision(True)
+    cdef void _waypoints(self, int[:] waypoint, int[:] parent, int[:] order, int reached) noexcept:
+        """
+        By increasing distance, so that the waypoint of the parent of a cell is known: a cell heads for the
+        waypoint of its parent if it sees it within LOOKAHEAD cells, else for its parent
+        """
+        cdef int i, cell, up, target
+        cdef double dx, dy
+        with nogil:
+            for i in range(reached):
+                cell = order[i]
+                up = parent[cell]
+                if waypoint[cell] == GOAL or up < 0:
+                    continue
+                waypoint[cell] = up
+                target = waypoint[up]
+                if target < 0:
+                    continue
+                dx = target % self.cols - cell % self.cols
+                dy = target // self.cols - cell // self.cols
+                if dx * dx + dy * dy <= _LOOKAHEAD * _LOOKAHEAD and self._line_of_sight(cell, target):
+                    waypoint[cell] = target
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    @cython.cdivision(True)
+    cpdef int heading(self, double x, double y):
+        """
+        :param float x: x-coordinate of a ship
+        :param float y: y-coordinate of a ship
+        :return: The integer heading to the waypoint of the cell of the ship, -1 within docking range, in a blocked
+                 cell or out of reach
+        """
+        cdef int row = <int>floor(y / self.cell_size)
+        cdef int col = <int>floor(x / self.cell_size)
+        cdef int target
+        cdef double angle
+        if not self._free(row, col):
+            return -1
+        target = self._waypoint[row * self.cols + col]
+        if target < 0:
+            return -1
+        angle = atan2((target // self.cols + 0.5) * self.cell_size - y,
+                      (target % self.cols + 0.5) * self.cell_size - x) * 180.0 / M_PI
+        return (<int>round(angle) % 360 + 360) % 360
+
+
+cdef class FlowFields:
+    """
+    The flow fields of the planets, built on demand and kept until a planet is destroyed
+
+    :ivar cell_size: Side of the cells of the fields
+    :ivar built: Number of fields built since the start of the game
+    :ivar invalidations: Number of times the fields were dropped
+    """
+    cdef dict _fields
+    cdef readonly double cell_size
+    cdef readonly long built
+    cdef readonly long invalidations
+
+    def __init__(self, double cell_size=DEFAULT_CELL_SIZE):
+        """
+        :param float cell_size: Side of the cells of the fields
+        """
+        self._fields = {}
+        self.cell_size = cell_size
+        self.built = 0
+        self.invalidations = 0
+
+    def start_turn(self, planets_destroyed=()):
+        """
+        Drop the fields if a planet was destroyed: the paths around it changed
+
+        :param planets_destroyed: Ids of the planets destroyed since the last turn
+        :return: nothing
+        """
+        if planets_destroyed and self._fields:
+            self._fields = {}
+            self.invalidations += 1
+
+    def field(self, planet, game_map):
+        """
+        :param Planet planet: A planet
+        :param Map game_map: The map of the turn
+        :return: The flow field of the planet
+        :rtype: FlowField
+        """
+        field = self._fields.get(planet.id)
+        if field is None:
+            field = FlowField(planet, game_map.all_planets(), game_map.width, game_map.height, self.cell_size)
+            self._fields[planet.id] = field
+            self.built += 1
+        return field
+
+    def heading(self, planet, Circle pos, game_map):
+        """
+        :param Planet planet: The planet a ship heads for
+        :param Circle pos: Position of the ship
+        :param Map game_map: The map of the turn
+        :return: The heading of the path to the planet, -1 if none (see FlowField.heading)
+        :rtype: int
+        """
+        return (<FlowField> self.field(planet, game_map)).heading(pos.x, pos.y)
+
+    def __len__(self):
+        return len(self._fields)
@@ -1,10 +1,23 @@
-from .navigation import calculate_distance_between
+from .navigation import calculate_distance_between, NavigationCache
+from .batch import NavigationBatch
+from .flowfield import FlowFields
 from hlt.entity import Ship
 from . import collision, entity
 from .collision import intersect_segment_circle
-
+from .spatial import SpatialGrid, GhostRegistry
+from .parsing import parse_map
+from .snapshot import WorldSnapshot
+from .influence import InfluenceMap, DEFAULT_CELL_SIZE as INFLUENCE_CELL_SIZE
+from .geometry import StaticGeometry
+from .assignment import plan_settlers, plan_targets
+from .roles import RoleTable, ROLE_NAMES, NONE, NOTHING, FIGHT, BOMB, SETTLE, DEFEND, RUNNER, RABBIT
+from .instrumentation import timed, PARSE, ASSIGN_SHIP, ASSIGN_SHIP_SHORT, OBSTACLES_BETWEEN, PLAN_ASSIGNMENTS
+
+import itertools
 import logging
 
+import numpy as np
+
 
 class Map:
     """
@@ -13,27 +26,96 @@ class Map:
     :ivar my_id: Current player id associated with the map
     :ivar width: Map width
     :ivar height: Map height
+    :ivar incremental: Keep the entity objects across turns and update them in place
+    :ivar navigation_cache: Headings of the last turn reused by navigate, None if disabled
+    :ivar navigation_batch: Moves recorded by Ship.navigate, planned together by resolve_navigation, None if the
+                            ships navigate one by one
+    :ivar flow_fields: Paths around the planets to each planet, followed by the settlers and runners, None if
+                       disabled
+    :ivar ships_born: Ids of the ships which appeared this turn
+    :ivar ships_died: Ids of the ships which disappeared this turn
+    :ivar planets_destroyed: Ids of the planets which disappeared this turn
+    :ivar static_geometry: Planet geometry computed on the first parse, see StaticGeometry
+    :ivar roles: Roles and targets of the user's ships, see RoleTable
+    :ivar settle_plan: Planet id of the ships placed on a docking slot by plan_assignments, see release_settle_plan
+    :ivar influence_cell_size: Side of the cells of the influence map, see influence()
     """
 
     MAX_SHIPS = 40
 
-    def __init__(self, my_id, width, height):
+    def __init__(self, my_id, width, height, incremental=True, cache_navigation=False, batch_navigation=False,
+                 flow_fields=False):
         """
         :param my_id: User's id (tag)
         :param width: Map width
         :param height: Map height
+        :param incremental: Keep the entity objects across turns and update them in place
+        :param cache_navigation: Reuse the headings of the last turn in navigate, see NavigationCache
+        :param batch_navigation: Plan the moves of the turn in parallel, see batch.NavigationBatch
+        :param flow_fields: Head for the planets along their flow fields, see flowfield.FlowFields
         """
         self.my_id = my_id
         self.width = width
         self.height = height
+        self.incremental = incremental
         self._players = {}
         self._planets = {}
-        self._ghosts = []
+        self._ships = {}
+        self.ships_born = set()
+        self.ships_died = set()
+        self.planets_destroyed = set()
+        self._ghosts = GhostRegistry(width, height)
+        self._ship_grid = SpatialGrid(width, height)
+        self._foe_grid = SpatialGrid(width, height)
+        self._snapshot = None
+        self._influence = None
+        self.influence_cell_size = INFLUENCE_CELL_SIZE
+        self.static_geometry = None
+        self.navigation_cache = NavigationCache() if cache_navigation else None
+        self.navigation_batch = NavigationBatch() if batch_navigation else None
+        self.flow_fields = FlowFields() if flow_fields else None
 
         self.foe_ships = None
         self._foe_ships_exit_table = None
         self.planets_assigned = None
-        self.ship_assignment = {}
+        self.roles = RoleTable()
+        self.settle_plan = {}
+        self._reserved_slots = {}
+
+    @property
+    def fighters(self):
+        """
+        :return: Number of the user's ships with the fight role
+        """
+        return self.roles.count(FIGHT)
+
+    @property
+    def bombers(self):
+        """
+        :return: Number of the user's ships with the bomb role
+        """
+        return self.roles.count(BOMB)
+
+    @property
+    def settlers(self):
+        """
+        :return: Number of the user's ships with the settle role
+        """
+        return self.roles.count(SETTLE)
+
+    @property
+    def defenders(self):
+        """
+        :return: Number of the user's ships with the defend role
+        """
+        return self.roles.count(DEFEND)
+
+    @property
+    def runners(self):
+        """
+        :return: Number of the user's ships with the runner or rabbit role
+        """
+        return self.roles.count(RUNNER) + self.roles.count(RABBIT)
 
     def get_me(self):
         """
@@ -83,19 +165,135 @@ class Map:
             all_ships.extend(player.all_ships())
         return all_ships
 
-    def nearby_entities_by_distance(self, entity):
+    def nearby_entities_by_distance(self, entity, max_distance=None):
         """
         :param entity: The source entity to find distances from
+        :param max_distance: Only look at the entities within this distance (optional)
         :return: Dict containing all entities with their designated distances
         :rtype: dict
         """
+        if max_distance is None:
+            foreign_entities = self._ship_grid.entities + self.all_planets()
+        else:
+            foreign_entities = self.entities_near(entity.pos, max_distance)
+
         result = {}
-        for foreign_entity in self._all_ships() + self.all_planets():
+        for foreign_entity in foreign_entities:
             if entity == foreign_entity:
                 continue
-            result.setdefault(entity.calculate_distance_between(foreign_entity), []).append(foreign_entity)
+            distance = entity.calculate_distance_between(foreign_entity)
+            if max_distance is not None and distance > max_distance:
+                continue
+            result.setdefault(distance, []).append(foreign_entity)
         return result
 
+    def entities_near(self, pos, radius):
+        """
+        Spatial query: the ships and planets whose circle overlaps the given disc
+
+        :param Circle pos: Center of the disc
+        :param float radius: Radius of the disc
+        :return: The ships, then the planets, in parsing order
+        :rtype: list[entity.Entity]
+        """
+        return self.ships_near(pos, radius) + self.planets_near(pos, radius)
+
+    def ships_near(self, pos, radius):
+        """
+        Spatial query: the ships whose circle overlaps the given disc
+
+        :param Circle pos: Center of the disc
+        :param float radius: Radius of the disc
+        :return: The ships, in parsing order
+        :rtype: list[Ship]
+        """
+        return self._ship_grid.query_radius(pos.x, pos.y, radius)
+
+    def planets_near(self, pos, radius):
+        """
+        Spatial query: the planets whose circle overlaps the given disc
+
+        :param Circle pos: Center of the disc
+        :param float radius: Radius of the disc
+        :return: The planets, in parsing order
+        :rtype: list[entity.Planet]
+        """
+        return self._alive(self.static_geometry.grid.query_radius(pos.x, pos.y, radius))
+
+    def ships_along(self, start, end, fudge):
+        """
+        Spatial query: the ships which may be closer than fudge to the segment [start, end]
+
+        :param Circle start: Start of the segment
+        :param Circle end: End of the segment
+        :param float fudge: Distance to leave between the segment and the ships
+        :return: The candidate ships (the exact test is left to the caller)
+        :rtype: list[Ship]
+        """
+        return self._ship_grid.query_segment(start.x, start.y, end.x, end.y, fudge)
+
+    def planets_along(self, start, end, fudge):
+        """
+        Spatial query: the planets which may be closer than fudge to the segment [start, end]
+
+        :param Circle start: Start of the segment
+        :param Circle end: End of the segment
+        :param float fudge: Distance to leave between the segment and the planets
+        :return: The candidate planets (the exact test is left to the caller)
+        :rtype: list[entity.Planet]
+        """
+        return self._alive(self.static_geometry.grid.query_segment(start.x, start.y, end.x, end.y, fudge))
+
+    def _alive(self, planets):
+        """
+        :param list[entity.Planet] planets: Planets of the static index
+        :return: The planets of the current turn with the same ids, destroyed planets left out
+        :rtype: list[entity.Planet]
+        """
+        return [self._planets[planet.id] for planet in planets if planet.id in self._planets]
+
+    def iter_nearest_foes(self, entity, max_dist=None, status_filter=None):
+        """
+        Iterate over the foe ships by increasing distance to the entity. Foes at the same distance come in
+        get_foe_ships() order. The iteration is lazy: stopping early only costs the foes looked at.
+
+        :param entity.Entity entity: The source entity
+        :param float max_dist: Ignore the foes further than this distance (optional)
+        :param status_filter: Only keep the foes with one of these docking statuses (optional)
+        :return: generator of (distance, foe ship)
+        """
+        for distance, foe_ship in self._foe_grid.nearest(entity.pos.x, entity.pos.y,
+                                                         -1 if max_dist is None else max_dist):
+            if status_filter is not None and foe_ship.docking_status not in status_filter:
+                continue
+            yield distance, foe_ship
+
+    def nearest_foes(self, entity, k=None, max_dist=None, status_filter=None):
+        """
+        :param entity.Entity entity: The source entity
+        :param int k: Maximum number of foes returned (optional)
+        :param float max_dist: Ignore the foes further than this distance (optional)
+        :param status_filter: Only keep the foes with one of these docking statuses (optional)
+        :return: The k nearest foe ships with their distance, by increasing distance
+        :rtype: list[(float, Ship)]
+        """
+        return list(itertools.islice(self.iter_nearest_foes(entity, max_dist, status_filter), k))
+
+    def nearest_planets(self, entity, k=None, predicate=None):
+        """
+        :param entity.Entity entity: The source entity
+        :param int k: Maximum number of planets returned (optional)
+        :param predicate: Only keep the planets for which predicate(planet) is true (optional)
+        :return: The k nearest planets with their distance, by increasing distance
+        :rtype: list[(float, entity.Planet)]
+        """
+        planets = ((distance, self._planets[planet.id])
+                   for distance, planet in self.static_geometry.grid.nearest(entity.pos.x, entity.pos.y)
+                   if planet.id in self._planets)
+        if predicate is not None:
+            planets = ((distance, planet) for distance, planet in planets if predicate(planet))
+        return list(itertools.islice(planets, k))
+
     def _link(self):
         """
         Updates all the entities with the correct ship and planet objects
@@ -105,93 +303,93 @@ class Map:
         for celestial_object in self.all_planets() + self._all_ships():
             celestial_object._link(self._players, self._planets)
 
+    @timed(PARSE)
     def _parse(self, map_string):
         """
         Parse the map description from the game.
 
-        :param map_string: The string which the Halite engine outputs
+        :param map_string: The bytes (or str) which the Halite engine outputs
         :return: nothing
         """
-        tokens = map_string.split()
+        previous_ships = self._ships
+        previous_planets = self._planets
+        if self.incremental:
+            ships_by_player, self._planets = parse_map(map_string, previous_ships, previous_planets)
+        else:
+            ships_by_player, self._planets = parse_map(map_string)
 
-        self._players, tokens = Player._parse(tokens)
-        self._planets, tokens = entity.Planet._parse(tokens)
-
-        self._ghosts = []
+        players = {}
+        self._ships = {}
+        for player_id, ships in ships_by_player.items():
+            player = self._players.get(player_id) if self.incremental else None
+            if player is None:
+                player = Player(player_id, ships)
+            else:
+                player._ships = ships
+            players[player_id] = player
+            self._ships.update(ships)
+        self._players = players
+
+        # What changed since the previous turn
+        self.ships_born = self._ships.keys() - previous_ships.keys()
+        self.ships_died = previous_ships.keys() - self._ships.keys()
+        self.planets_destroyed = previous_planets.keys() - self._planets.keys()
+
+        self._ghosts.clear()
+        if self.navigation_cache is not None:
+            self.navigation_cache.start_turn(self.ships_died)
+        if self.navigation_batch is not None:
+            self.navigation_batch.start_turn()
+        if self.flow_fields is not None:
+            self.flow_fields.start_turn(self.planets_destroyed)
 
-        assert(len(tokens) == 0)  # There should be no remaining tokens at this point
         self._link()
 
+        # Planets never move: their geometry and index are only computed once
+        if self.static_geometry is None:
+            self.static_geometry = StaticGeometry(self)
+
+        # Index the turn's entities for the obstacle & proximity queries
+        self._ship_grid.build(self._all_ships())
+        self._snapshot = None
+        self._influence = None
+
         self.foe_ships = None
+        self._foe_grid.build(self.get_foe_ships())
         self.planets_assigned = set(p.id for p in self.all_planets())
+        self.settle_plan = {}
+        self._reserved_slots = {}
 
         self.ships = 0
-        self.fighters = 0
-        self.bombers = 0
-        self.settlers = 0
-        self.defenders = 0
         self.realocate_defender = 0
-        self.runners = 0
-
 
         self.undocked_ship = []
         self.undocking_ship = []
 
-        self.living_ship = {}
-
         for s in self.get_me().all_ships():
-            self.living_ship[s.id] = True
             if s.docking_status == Ship.DockingStatus.UNDOCKED:
                 self.ships += 1
                 self.undocked_ship.append(s)
             if s.docking_status == Ship.DockingStatus.UNDOCKING:
                 self.undocking_ship.append(s)
 
-        self.foe_ships_assignment = {}
-        to_delete = []
-        for k, v in self.ship_assignment.items():
-            try:
-                self.living_ship[k]
-            except:
-                to_delete.append(k)
-                continue
-
-            if v['action'].__name__ == 'fight':
-                self.fighters += 1
-                try:
-                    foe_owner = map.get_player(map.ship_assignment[self.id]['foe'][1])
-                    foe = foe_owner.get_ship(map.ship_assignment[self.id]['foe'][0])
-                    if foe is None:
-                        try:
-                            del self.ship_assignment[self.id]['foe']
-                        except:
-                            pass
-
-                    else:
-                        self.foe_ships_assignment[foe.id] = k
-                except:
-                    pass
-                continue
-            if v['action'].__name__ == 'bomb':
-                self.bombers += 1
-                continue
-            elif v['action'].__name__ == 'settle':
-                self.settlers += 1
-                if 'planet' in v:
-                    self._planets[v['planet']].anticipating_remaining_resources -= 1
-                continue
-            elif v['action'].__name__ == 'defend':
-                self.defenders += 1
-                continue
-            elif v['action'].__name__ == 'runner':
-                self.runners += 1
-                continue
-            elif v['action'].__name__ == 'rabbit':
-                self.runners += 1
-                continue
+        # Forget the roles of the ships which died
+        self.roles.remove(self.ships_died)
 
-        for k in to_delete:
-            del self.ship_assignment[k]
+        # The fighters keep their target if it's still alive
+        self.foe_ships_assignment = {}
+        for ship_id in self.roles.ships(FIGHT):
+            owner = self.get_player(self.roles.foe_owner(ship_id))
+            foe = owner.get_ship(self.roles.foe(ship_id)) if owner is not None else None
+            if foe is None:
+                self.roles.set_foe(ship_id, -1, -1)
+            else:
+                self.foe_ships_assignment[foe.id] = ship_id
+
+        for ship_id in self.roles.ships(SETTLE):
+            planet = self._planets.get(self.roles.planet(ship_id))
+            if planet is not None:
+                planet.anticipating_remaining_resources -= 1
 
         self.kamikazes = self.ships - self.MAX_SHIPS
 
@@ -206,7 +404,67 @@ class Map:
                     planets_by_player[planet.owner.id] = [planet.id, ]
 
         self.planets_by_player = planets_by_player
-        logging.info(self.planets_by_player)
+        logging.debug('Planets by player: %s', planets_by_player)
+
+    @timed(PLAN_ASSIGNMENTS)
+    def plan_assignments(self):
+        """
+        Solve the assignments of the turn in one pass, see hlt.assignment: the docking slots of the new and idle
+        ships (used by assign_ship), and the targets of the fighters which lost theirs (claimed right away).
+
+        :return: nothing
+        """
+        idle = [ship for ship in self.undocked_ship if self.roles.role(ship.id) in (NONE, NOTHING)]
+        self.settle_plan = plan_settlers(self, idle)
+        self._reserved_slots = {}
+        for planet_id in self.settle_plan.values():
+            self._reserved_slots[planet_id] = self._reserved_slots.get(planet_id, 0) + 1
+
+        # Targets of the fighters are checked by _parse, the bombers' by bomb
+        claimed = set(self.foe_ships_assignment)
+        claimed.update(self.roles.foe(ship_id) for ship_id in self.roles.ships(BOMB))
+        fighters = [ship for ship in self.undocked_ship
+                    if self.roles.role(ship.id) == FIGHT and self.roles.foe(ship.id) < 0]
+        for ship_id, foe in plan_targets(self, fighters, claimed).items():
+            self.foe_ships_assignment[foe.id] = ship_id
+            self.roles.set_foe(ship_id, foe.id, foe.owner_id)
+
+    def release_settle_plan(self, ship):
+        """
+        Take the ship out of the settle plan and give its reserved docking slot back. Every ship planned by
+        plan_assignments goes through here once it gets a role or is skipped, else its slot stays reserved for the
+        rest of the turn.
+
+        :param Ship ship: The ship
+        :return: The planet planned for the ship, None if it had no plan
+        :rtype: entity.Planet
+        """
+        planned = self._planets.get(self.settle_plan.pop(ship.id, None))
+        if planned is not None:
+            self._reserved_slots[planned.id] -= 1
+        return planned
+
+    def snapshot(self):
+        """
+        Columnar view of the turn, built on first use
+
+        :return: The snapshot of the current turn
+        :rtype: WorldSnapshot
+        """
+        if self._snapshot is None:
+            self._snapshot = WorldSnapshot(self)
+        return self._snapshot
+
+    def influence(self):
+        """
+        Foe counts, threat and support grids of the turn, built on first use
+
+        :return: The influence map of the current turn
+        :rtype: InfluenceMap
+        """
+        if self._influence is None:
+            self._influence = InfluenceMap(self, self.influence_cell_size)
+        return self._influence
 
     def all_ghost(self):
         """
@@ -214,7 +472,38 @@ class Map:
         :return: List of ghost
         :rtype: List[Circle]
         """
-        return self._ghosts
+        return self._ghosts.ghosts
+
+    def ghosts_along(self, start, end, reach):
+        """
+        Spatial query: the ghosts whose move comes within reach (+ ghost radius) of the segment [start, end]
+
+        :param Circle start: Start of the segment
+        :param Circle end: End of the segment
+        :param float reach: Distance to leave between the segment and the ghosts
+        :return: The candidate (start, ghost) tuples (the exact tests are left to the caller)
+        :rtype: list[tuple]
+        """
+        return self._ghosts.query_segment(start.x, start.y, end.x, end.y, reach)
+
+    def ghosts_near(self, pos, radius):
+        """
+        Spatial query: the ghosts whose move comes within radius (+ ghost radius) of pos
+
+        :param Circle pos: Center of the disc
+        :param float radius: Radius of the disc
+        :return: The candidate (start, ghost) tuples
+        :rtype: list[tuple]
+        """
+        return self._ghosts.query_radius(pos.x, pos.y, radius)
+
+    def ghost_stats(self):
+        """
+        :return: Number of ghosts checked and skipped by the ghost index since the last
+            GhostRegistry.reset_counters(), which the map never calls: since the start of the game
+        :rtype: dict
+        """
+        return {'checked': self._ghosts.checked, 'skipped': self._ghosts.skipped}
 
     def _all_ships(self):
         """
@@ -236,7 +525,7 @@ class Map:
         :return: The colliding entity if so, else None.
         :rtype: entity.Entity
         """
-        for celestial_object in self._all_ships() + self.all_planets():
+        for celestial_object in self.entities_near(target.pos, target.pos.radius + 0.1):
             if celestial_object is target:
                 continue
             d = celestial_object.calculate_distance_between(target)
@@ -244,6 +533,7 @@ class Map:
                 return celestial_object
         return None
 
+    @timed(OBSTACLES_BETWEEN)
     def obstacles_between(self, ship, target, ignore=()):
         """
         Check whether there is a straight-line path to the given point, without planetary obstacles in between.
@@ -255,22 +545,42 @@ class Map:
         :rtype: list[entity.Entity]
         """
         obstacles = []
-        if ignore_ships is False:
-            for enemy_ship in self.all_ships():
+        fudge = ship.pos.radius + 0.1
+        if Ship not in ignore:
+            for enemy_ship in self.ships_along(ship.pos, target.pos, fudge):
                 if enemy_ship == ship or enemy_ship == target:
                     continue
-                if intersect_segment_circle(ship, target, enemy_ship, fudge=ship.pos.radius + 0.1):
+                if intersect_segment_circle(ship, target, enemy_ship, fudge=fudge):
                     obstacles.append(enemy_ship)
-        if ignore_planets is False:
-            for planet in self.all_planets():
+        if entity.Planet not in ignore:
+            for planet in self.planets_along(ship.pos, target.pos, fudge):
                 if planet == ship or planet == target:
                     continue
-                if intersect_segment_circle(ship, target, planet, fudge=ship.pos.radius + 0.1):
+                if intersect_segment_circle(ship, target, planet, fudge=fudge):
                     obstacles.append(planet)
         return obstacles
 
+    def resolve_navigation(self, commands):
+        """
+        Compute the moves recorded by Ship.navigate when the navigation is batched. The moves are committed in the
+        order they were recorded: the result is the same as navigating the ships one by one.
+
+        :param dict commands: Commands by ship id, as returned by the behaviors
+        :return: The commands, the recorded moves replaced by their thrust command
+        :rtype: dict[int, str]
+        """
+        if self.navigation_batch is None:
+            return commands
+        return self.navigation_batch.resolve(self, commands)
+
     def add_ghost(self, ghost):
-        self._ghosts.append(ghost)
+        """
+        Register a committed move, see GhostRegistry
+
+        :param tuple ghost: (start, ghost)
+        :return: nothing
+        """
+        self._ghosts.add(ghost)
 
     def get_foe_ships(self):
 
@@ -298,26 +608,25 @@ class Map:
 
         return ship.id in self._foe_ships_exit_table[ship.owner.id]
 
+    @timed(ASSIGN_SHIP_SHORT)
     def assign_ship_short(self, ship, map):
+        role = self.roles.role(ship.id)
 
-        if ship.id in self.ship_assignment and self.ship_assignment[ship.id]['action'].__name__ != 'nothing':
-            logging.info('Already Assigned ship: %s %s' % (ship.id, self.ship_assignment[ship.id]['action'].__name__))
+        if role not in (NONE, NOTHING):
+            logging.debug('Already Assigned ship: %s %s', ship.id, ROLE_NAMES[role])
 
-        if ship.id in self.ship_assignment and self.ship_assignment[ship.id]['action'].__name__ == 'rabbit' and map.fighters < 2:
-            logging.info('Already Assigned ship: %s %s' % (ship.id, self.ship_assignment[ship.id]['action'].__name__))
+        if role == RABBIT and map.fighters < 2:
+            logging.debug('Already Assigned ship: %s %s', ship.id, ROLE_NAMES[role])
             return
 
-        foe_ships_by_distance = {}
-        for foe_ship in map.get_foe_ships():
-            foe_ships_by_distance.setdefault(ship.calculate_distance_between(foe_ship), []).append(foe_ship)
-
-        for distance in sorted(foe_ships_by_distance):
+        for distance, foe_ship in map.nearest_foes(ship, 1):
             if distance < 90:
-                map.ship_assignment[ship.id] = {'action': Ship.fight}
+                map.release_settle_plan(ship)
+                map.roles.assign(ship.id, FIGHT)
                 return
             elif map.runners < 1:
-                map.ship_assignment[ship.id] = {'action': ship.rabbit}
-                map.runners += 1
+                map.release_settle_plan(ship)
+                map.roles.assign(ship.id, RABBIT)
                 return
 
 
@@ -325,63 +634,65 @@ class Map:
 
 
 
+    @timed(ASSIGN_SHIP)
     def assign_ship(self, ship, map):
 
 
 
         # if self.defenders >= 6 \
         #     and self.realocate_defender < 4 \
-        #     and ship.id in self.ship_assignment and self.ship_assignment[ship.id]['action'].__name__ != 'defend':
+        #     and self.roles.role(ship.id) not in (NONE, DEFEND):
         #     self.realocate_defender += 1
-        #     self.defenders -= 1
-        #     self.ship_assignment[ship.id]['action'] = Ship.fight
+        #     self.roles.set_role(ship.id, FIGHT)
 
-        if ship.id in self.ship_assignment and self.ship_assignment[ship.id]['action'].__name__ != 'nothing':
-            logging.info('Already Assigned ship: %s %s' % (ship.id, self.ship_assignment[ship.id]['action'].__name__))
+        role = self.roles.role(ship.id)
+        if role not in (NONE, NOTHING):
+            logging.debug('Already Assigned ship: %s %s', ship.id, ROLE_NAMES[role])
             return
 
-        logging.info('Assign ship: %s' % ship.id)
+        logging.debug('Assign ship: %s', ship.id)
 
-        planets_by_distance = {}
-        for planet in list(self.all_planets()):
-            distance = ship.calculate_distance_between(planet) / (planet.num_docking_spots)
-            planets_by_distance.setdefault(distance, []).append(planet)
-
-        for distance in sorted(planets_by_distance.keys()):
-            near_planets = planets_by_distance[distance]
-            for p in near_planets:
-                logging.info('%s %s %s' % (p.id, ship.id, p.anticipating_remaining_resources))
-                if (p.is_owned() is False or p.owner.id == self.get_me().id) and p.anticipating_remaining_resources > 0 :
-                    self.settlers += 1
-                    p.anticipating_remaining_resources -= 1
-                    self.ship_assignment[ship.id] = {'action': ship.settle, 'planet': p.id}
-                    return
+        planned = self.release_settle_plan(ship)
+        if planned is not None and planned.anticipating_remaining_resources > 0:
+            planned.anticipating_remaining_resources -= 1
+            self.roles.assign(ship.id, SETTLE, planned.id)
+            return
+
+        # Not planned, or the planned slot was taken by another ship: best slot left free by the plan. Planets by
+        # score, ties in planet order
+        snapshot = self.snapshot()
+        scores = snapshot.planet_distances(ship) / snapshot.planet_docking_spots
+        planets_by_score = [snapshot.planets[row] for row in np.argsort(scores, kind='stable').tolist()]
+
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        for p in planets_by_score:
+            if debug:
+                logging.debug('%s %s %s', p.id, ship.id, p.anticipating_remaining_resources)
+            if (p.is_owned() is False or p.owner.id == self.get_me().id) \
+                    and p.anticipating_remaining_resources - self._reserved_slots.get(p.id, 0) > 0:
+                p.anticipating_remaining_resources -= 1
+                self.roles.assign(ship.id, SETTLE, p.id)
+                return
 
         if self.runners < 1 and len(map.all_players())>2:
-            self.ship_assignment[ship.id] = {'action': ship.runner}
-            self.runners += 1
+            self.roles.assign(ship.id, RUNNER)
             return
 
         if self.runners < 2 and len(map.all_players())>2:
-            self.ship_assignment[ship.id] = {'action': ship.rabbit}
-            self.runners += 1
+            self.roles.assign(ship.id, RABBIT)
             return
 
-        for distance in sorted(planets_by_distance.keys()):
-            near_planets = planets_by_distance[distance]
-            for p in near_planets:
-                if p.is_owned() is True and p.owner.id != map.get_me().id:
-                    self.bombers += 1
-                    self.ship_assignment[ship.id] = {'action': ship.bomb, 'planet': p.id}
-                    return
+        for p in planets_by_score:
+            if p.is_owned() is True and p.owner.id != map.get_me().id:
+                self.roles.assign(ship.id, BOMB, p.id)
+                return
 
         if self.runners < 4 and len(self.all_players()) > 2:
-            self.ship_assignment[ship.id] = {'action': ship.rabbit}
-            self.runners += 1
+            self.roles.assign(ship.id, RABBIT)
             return
 
 
-        self.ship_assignment[ship.id] = {'action': ship.fight}
+        self.roles.assign(ship.id, FIGHT)
 
     def defend_planet(self, planet, map):
 
@@ -393,35 +704,29 @@ class Map:
         if planet_defenders > 1:
             return {}
 
-        foe_ships_by_distance = {}
-
-        for foe_ship in map.get_foe_ships():
-            foe_ships_by_distance.setdefault(planet.calculate_distance_between(foe_ship), []).append(foe_ship)
-
         cmd = {}
-        docked_ship = iter(planet.all_docked_ships())
-        for distance in sorted(foe_ships_by_distance.keys()):
-            if distance > planet.DEFENSE_RADIUS + planet.pos.radius:
-                break
-
-            for foe_ship in foe_ships_by_distance[distance]:
+        defense_radius = planet.DEFENSE_RADIUS + planet.pos.radius
+        if not map.influence().foes_near(planet.pos, defense_radius, undocked_only=True):
+            return cmd
 
-                if foe_ship.docking_status != Ship.DockingStatus.UNDOCKED:
-                    continue
+        docked_ship = iter(planet.all_docked_ships())
+        for distance, foe_ship in map.iter_nearest_foes(planet, max_dist=defense_radius,
+                                                        status_filter=(Ship.DockingStatus.UNDOCKED,)):
 
-                if planet_defenders > 0:
-                    planet_defenders -= 1
-                    continue
+            if planet_defenders > 0:
+                planet_defenders -= 1
+                continue
 
-                logging.info('Try to awake a ship')
-                try:
-                    ship = next(docked_ship)
-                    logging.info('Awake a ship: %s' % ship.id)
-                    self.ship_assignment[ship.id] = {'action': ship.defend, 'previous_planet':planet.id}
-                    cmd[ship.id] = ship.undock()
-                except:
-                    logging.exception('Awake a ship failed')
-                    return cmd
+            logging.debug('Try to awake a ship')
+            try:
+                ship = next(docked_ship)
+                logging.info('Awake a ship: %s', ship.id)
+                self.roles.assign(ship.id, DEFEND)
+                self.roles.set_previous_planet(ship.id, planet.id)
+                cmd[ship.id] = ship.undock()
+            except:
+                logging.exception('Awake a ship failed')
+                return cmd
 
         return cmd
 
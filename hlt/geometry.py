@@ -0,0 +1,57 @@
+import numpy as np
+
+from . import constants
+from .spatial import SpatialGrid
+
+#: Distance kept between a ship path and a planet, as in navigation.obstacles_between
+PLANET_FUDGE = constants.SHIP_RADIUS + 0.1
+
+
+class StaticGeometry:
+    """
+    Immutable geometry of the planets, computed once when the game starts: planets never move.
+    Rows follow the order of the planets in the first map. Destroyed planets keep their row.
+
+    :ivar planet_ids: Planet ids
+    :ivar planet_x: Planet x-coordinates
+    :ivar planet_y: Planet y-coordinates
+    :ivar planet_radius: Planet radii
+    :ivar docking_spots: Number of docking spots of each planet
+    :ivar grid: Spatial index of the planets
+    """
+
+    def __init__(self, game_map):
+        """
+        :param Map game_map: The map of the first turn
+        """
+        planets = game_map.all_planets()
+        self.width = game_map.width
+        self.height = game_map.height
+        self.planet_ids = np.array([planet.id for planet in planets], dtype=np.int64)
+        self.planet_x = np.array([planet.pos.x for planet in planets], dtype=np.float64)
+        self.planet_y = np.array([planet.pos.y for planet in planets], dtype=np.float64)
+        self.planet_radius = np.array([planet.pos.radius for planet in planets], dtype=np.float64)
+        self.docking_spots = np.array([planet.num_docking_spots for planet in planets], dtype=np.int64)
+        self._row = {planet.id: row for row, planet in enumerate(planets)}
+
+        self.grid = SpatialGrid(game_map.width, game_map.height)
+        self.grid.build(planets)
+
+        for table in (self.planet_ids, self.planet_x, self.planet_y, self.planet_radius, self.docking_spots):
+            table.flags.writeable = False
+
+    def row(self, planet_id):
+        """
+        :param int planet_id: A planet id
+        :return: The row of the planet in the tables
+        :rtype: int
+        """
+        return self._row[planet_id]
+
+    def rows(self, planets):
+        """
+        :param list[Planet] planets: Planets of any turn
+        :return: The rows of the planets, in the same order
+        :rtype: numpy.ndarray
+        """
+        return np.array([self._row[planet.id] for planet in planets], dtype=np.int64)
@@ -0,0 +1,152 @@
+"""
+Influence of the ships over the map, on a grid of square cells, computed on first use in a turn:
+ - threat: damage the undocked foe ships can deal in a cell next turn, WEAPON_DAMAGE for each of them close enough
+   to move (MAX_SPEED) and fire (WEAPON_RADIUS)
+ - support: the same for the user's undocked ships
+
+The ships are counted per cell, then the counts are summed over the reach of each cell with an integral image
+(summed-area table): O(ships + cells), whatever the reach. The reach of a cell is the square of cells covering the
+disc around any of its points, so the values are upper bounds.
+
+The integral images also answer "may there be a foe within this distance of this point?" in four lookups: a no
+is exact, a yes still needs the distances (see Map.snapshot()).
+"""
+import math
+
+import numpy as np
+
+from . import constants
+from .entity import Ship
+
+#: Side of a cell
+DEFAULT_CELL_SIZE = 4.0
+#: Distance at which an undocked ship can hit a point next turn
+THREAT_RADIUS = constants.MAX_SPEED + constants.WEAPON_RADIUS
+#: Margin added to the queries, so that a ship at exactly the given distance is always counted
+QUERY_EPSILON = 1e-6
+
+
+class InfluenceMap:
+    """
+    Threat and support grids of a turn. Cell (row, col) covers [col, col + 1) x [row, row + 1) * cell_size.
+    The grids are built on first access: the foes_near lookups only need the integral images of the foes.
+
+    :ivar cell_size: Side of a cell
+    :ivar cols: Number of columns (x)
+    :ivar rows: Number of rows (y)
+    """
+
+    def __init__(self, game_map, cell_size=DEFAULT_CELL_SIZE):
+        """
+        :param Map game_map: The map of the turn
+        :param float cell_size: Side of a cell
+        """
+        snapshot = game_map.snapshot()
+        self.cell_size = cell_size
+        self.cols = max(1, int(game_map.width / cell_size) + 1)
+        self.rows = max(1, int(game_map.height / cell_size) + 1)
+
+        undocked = snapshot.ship_docking_status == Ship.DockingStatus.UNDOCKED
+        foe_rows = snapshot.foe_rows
+        undocked_foe_rows = foe_rows[undocked[foe_rows]]
+        my_undocked_rows = snapshot.my_rows[undocked[snapshot.my_rows]]
+        # Positions of the turn, for the support grid
+        self._my_undocked_x = snapshot.ship_x[my_undocked_rows]
+        self._my_undocked_y = snapshot.ship_y[my_undocked_rows]
+        self._foes = self._integral(snapshot.ship_x[foe_rows], snapshot.ship_y[foe_rows])
+        self._undocked_foes = self._integral(snapshot.ship_x[undocked_foe_rows], snapshot.ship_y[undocked_foe_rows])
+        self._threat = None
+        self._support = None
+
+    @property
+    def threat(self):
+        """
+        :return: Damage the undocked foe ships can deal in each cell next turn (rows x cols), an upper bound
+        :rtype: numpy.ndarray
+        """
+        if self._threat is None:
+            self._threat = constants.WEAPON_DAMAGE * self._reach_sums(self._undocked_foes, THREAT_RADIUS)
+        return self._threat
+
+    @property
+    def support(self):
+        """
+        :return: Damage the user's undocked ships can deal in each cell next turn (rows x cols), an upper bound
+        :rtype: numpy.ndarray
+        """
+        if self._support is None:
+            my_undocked = self._integral(self._my_undocked_x, self._my_undocked_y)
+            self._support = constants.WEAPON_DAMAGE * self._reach_sums(my_undocked, THREAT_RADIUS)
+        return self._support
+
+    def _integral(self, x, y):
+        """
+        :param numpy.ndarray x: x-coordinates of the ships
+        :param numpy.ndarray y: y-coordinates of the ships
+        :return: Integral image of the number of ships per cell: [r, c] counts the ships of the cells above and
+                 left of (r, c), (rows + 1) x (cols + 1)
+        :rtype: numpy.ndarray
+        """
+        rows = np.clip(np.floor(y / self.cell_size).astype(np.int64), 0, self.rows - 1)
+        cols = np.clip(np.floor(x / self.cell_size).astype(np.int64), 0, self.cols - 1)
+        counts = np.bincount(rows * self.cols + cols, minlength=self.rows * self.cols).reshape(self.rows, self.cols)
+        table = np.zeros((self.rows + 1, self.cols + 1), dtype=np.int64)
+        table[1:, 1:] = counts.cumsum(axis=0).cumsum(axis=1)
+        return table
+
+    def _reach_sums(self, table, radius):
+        """
+        :param numpy.ndarray table: Integral image of ship counts
+        :param float radius: Reach of the ships
+        :return: For each cell, the number of ships of the square of cells within radius (rows x cols)
+        :rtype: numpy.ndarray
+        """
+        half = int(math.ceil(radius / self.cell_size))
+        rows = np.arange(self.rows)
+        cols = np.arange(self.cols)
+        top = np.clip(rows - half, 0, self.rows)
+        bottom = np.clip(rows + half + 1, 0, self.rows)
+        left = np.clip(cols - half, 0, self.cols)
+        right = np.clip(cols + half + 1, 0, self.cols)
+        return (table[np.ix_(bottom, right)] - table[np.ix_(top, right)] - table[np.ix_(bottom, left)] +
+                table[np.ix_(top, left)])
+
+    def _row(self, y):
+        return min(max(int(math.floor(y / self.cell_size)), 0), self.rows - 1)
+
+    def _col(self, x):
+        return min(max(int(math.floor(x / self.cell_size)), 0), self.cols - 1)
+
+    def threat_at(self, pos):
+        """
+        :param Circle pos: A point of the map
+        :return: Damage the undocked foe ships may deal at this point next turn
+        :rtype: int
+        """
+        return int(self.threat[self._row(pos.y), self._col(pos.x)])
+
+    def support_at(self, pos):
+        """
+        :param Circle pos: A point of the map
+        :return: Damage the user's undocked ships may deal at this point next turn
+        :rtype: int
+        """
+        return int(self.support[self._row(pos.y), self._col(pos.x)])
+
+    def foes_near(self, pos, radius, undocked_only=False):
+        """
+        Count the foe ships of the cells covering the disc: 0 means that no foe ship is within radius of pos.
+
+        :param Circle pos: Center of the disc
+        :param float radius: Radius of the disc
+        :param bool undocked_only: Only count the undocked foe ships
+        :return: An upper bound of the number of foe ships within radius of pos
+        :rtype: int
+        """
+        table = self._undocked_foes if undocked_only else self._foes
+        radius += QUERY_EPSILON
+        top = self._row(pos.y - radius)
+        bottom = self._row(pos.y + radius) + 1
+        left = self._col(pos.x - radius)
+        right = self._col(pos.x + radius) + 1
+        return int(table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left])
@@ -0,0 +1,38 @@
+cdef enum Stage:
+    STAGE_PARSE
+    STAGE_ASSIGN_SHIP
+    STAGE_ASSIGN_SHIP_SHORT
+    STAGE_NAVIGATE
+    STAGE_OBSTACLES_BETWEEN
+    STAGE_PLAN_ASSIGNMENTS
+    STAGE_NAVIGATE_BATCH
+    STAGE_FLOW_FIELD
+    STAGE_COUNT
+
+cdef enum Counter:
+    COUNTER_ANGLE_RETRIES
+    COUNTER_INTERSECT_TESTS
+    COUNTER_NAV_CACHE_HITS
+    COUNTER_NAV_CACHE_MISSES
+    COUNTER_COUNT
+
+
+cdef class Metrics:
+    cdef public bint enabled
+    cdef readonly int turn
+    cdef readonly object sink
+
+    cdef long calls[<int>STAGE_COUNT]
+    cdef double seconds[<int>STAGE_COUNT]
+    cdef long counts[<int>COUNTER_COUNT]
+    cdef dict behaviors
+    cdef double turn_start
+
+    cdef void _reset(self)
+
+    cpdef double start(self)
+    cpdef void stop(self, int stage, double start)
+    cpdef void stop_behavior(self, str name, double start)
+    cpdef void count(self, int counter, long n=*)
+    cpdef void start_turn(self, int turn)
+    cpdef void end_turn(self, int commands=*)
@@ -0,0 +1,187 @@
+"""
+Opt-in instrumentation of the hot path: calls and time of each stage (parse, assignment, navigation, obstacle
+checks, assignment planning, batched navigation, flow field builds, behaviors) and a few counters (angle retries,
+segment/circle tests, navigation cache hits and misses), written as one JSON line per turn.
+
+Disabled, every probe costs one test of the enabled flag: the Cython modules check it on the C struct of the
+shared Metrics object, the Python ones through the timed decorator.
+
+Enable it with the HALITE_METRICS variable (see Game, the file name gets the player id) or with
+metrics.enable(open(path, 'w')).
+"""
+import functools
+import json
+import time
+
+#: Stage codes, see Metrics.stop()
+PARSE = STAGE_PARSE
+ASSIGN_SHIP = STAGE_ASSIGN_SHIP
+ASSIGN_SHIP_SHORT = STAGE_ASSIGN_SHIP_SHORT
+NAVIGATE = STAGE_NAVIGATE
+OBSTACLES_BETWEEN = STAGE_OBSTACLES_BETWEEN
+PLAN_ASSIGNMENTS = STAGE_PLAN_ASSIGNMENTS
+NAVIGATE_BATCH = STAGE_NAVIGATE_BATCH
+FLOW_FIELD = STAGE_FLOW_FIELD
+#: Counter codes, see Metrics.count()
+ANGLE_RETRIES = COUNTER_ANGLE_RETRIES
+INTERSECT_TESTS = COUNTER_INTERSECT_TESTS
+NAV_CACHE_HITS = COUNTER_NAV_CACHE_HITS
+NAV_CACHE_MISSES = COUNTER_NAV_CACHE_MISSES
+
+#: Names of the stages and counters in the records
+STAGE_NAMES = ('parse', 'assign_ship', 'assign_ship_short', 'navigate', 'obstacles_between', 'plan_assignments',
+               'navigate_batch', 'flow_field')
+COUNTER_NAMES = ('angle_retries', 'intersect_tests', 'nav_cache_hits', 'nav_cache_misses')
+
+
+cdef class Metrics:
+    """
+    Per-turn counters of the bot. Times are inclusive: assign_ship_short contains the assign_ship it calls,
+    a behavior contains its navigate calls.
+
+    :ivar enabled: Are the probes recording?
+    :ivar turn: Number of the current turn
+    :ivar sink: File the records are written to
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.turn = -1
+        self.sink = None
+        self.behaviors = {}
+        self._reset()
+
+    cdef void _reset(self):
+        cdef int i
+        for i in range(<int>STAGE_COUNT):
+            self.calls[i] = 0
+            self.seconds[i] = 0
+        for i in range(<int>COUNTER_COUNT):
+            self.counts[i] = 0
+        self.behaviors.clear()
+
+    def enable(self, sink):
+        """
+        Start recording
+
+        :param sink: Text file the records are written to
+        :return: nothing
+        """
+        self.sink = sink
+        self.enabled = True
+        self._reset()
+
+    def disable(self):
+        """
+        Stop recording, the current turn is dropped
+
+        :return: nothing
+        """
+        self.enabled = False
+        self.sink = None
+
+    cpdef double start(self):
+        """
+        :return: The start time of a probe, 0 if disabled
+        """
+        if not self.enabled:
+            return 0
+        return time.perf_counter()
+
+    cpdef void stop(self, int stage, double start):
+        """
+        Close a probe opened with start()
+
+        :param int stage: Stage code
+        :param double start: Value returned by start()
+        """
+        if not self.enabled:
+            return
+        self.calls[stage] += 1
+        self.seconds[stage] += time.perf_counter() - start
+
+    cpdef void stop_behavior(self, str name, double start):
+        """
+        Close a probe opened with start() around a ship behavior
+
+        :param str name: Name of the behavior (fight, settle...)
+        :param double start: Value returned by start()
+        """
+        if not self.enabled:
+            return
+        elapsed = time.perf_counter() - start
+        record = self.behaviors.get(name)
+        if record is None:
+            self.behaviors[name] = [1, elapsed]
+        else:
+            record[0] += 1
+            record[1] += elapsed
+
+    cpdef void count(self, int counter, long n=1):
+        """
+        :param int counter: Counter code
+        :param long n: Increment
+        """
+        if self.enabled:
+            self.counts[counter] += n
+
+    cpdef void start_turn(self, int turn):
+        """
+        :param int turn: Number of the turn starting
+        """
+        self.turn = turn
+        if self.enabled:
+            self._reset()
+            self.turn_start = time.perf_counter()
+
+    cpdef void end_turn(self, int commands=-1):
+        """
+        Write the record of the turn to the sink
+
+        :param int commands: Number of commands sent (optional)
+        """
+        if not self.enabled:
+            return
+        record = self.record()
+        record['commands'] = commands
+        self.sink.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.sink.flush()
+
+    def record(self):
+        """
+        :return: The record of the current turn: [calls, milliseconds] per stage and behavior, and the counters
+        :rtype: dict
+        """
+        cdef int i
+        return {
+            'turn': self.turn,
+            'ms': round((time.perf_counter() - self.turn_start) * 1e3, 3),
+            'stages': {STAGE_NAMES[i]: [self.calls[i], round(self.seconds[i] * 1e3, 3)]
+                       for i in range(<int>STAGE_COUNT)},
+            'behaviors': {name: [calls, round(seconds * 1e3, 3)] for name, (calls, seconds) in self.behaviors.items()},
+            'counts': {COUNTER_NAMES[i]: self.counts[i] for i in range(<int>COUNTER_COUNT)},
+        }
+
+
+#: The metrics of the bot, shared by all the modules
+metrics = Metrics()
+
+
+def timed(int stage):
+    """
+    Decorator recording the calls and time of a Python function under the given stage
+
+    :param int stage: Stage code
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            start = metrics.start()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics.stop(stage, start)
+        return wrapper
+    return decorator
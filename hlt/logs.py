@@ -0,0 +1,90 @@
+"""
+Logging set up of the bot. The file is written by a background thread: the records go through a queue, and
+their messages are only formatted by the writer, so that the turns don't pay for the file I/O.
+
+Profiles:
+    debug: synchronous DEBUG log, as the starter kit
+    async: DEBUG log written by the background thread
+    production: INFO log written by the background thread: the per ship / per planet messages are left out (default)
+
+The submitted bot runs with the production profile: the DEBUG profiles are opt-in, through HALITE_LOG.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+
+#: Environment variable selecting the profile, see Game
+LOG_PROFILE_ENV = 'HALITE_LOG'
+#: Profile of the bot when HALITE_LOG is not set: the Halite server never sets it
+DEFAULT_PROFILE = 'production'
+#: Level and background writer of each profile
+PROFILES = {
+    'debug': (logging.DEBUG, False),
+    'async': (logging.DEBUG, True),
+    'production': (logging.INFO, True),
+}
+
+_listener = None
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler which leaves the formatting to the writer thread. The arguments of the records are formatted
+    after the call: only immutable values (ids, numbers, strings) should be logged from the hot paths.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            # The traceback must be rendered while it's still alive
+            return super().prepare(record)
+        return record
+
+
+def set_up(log_file, profile=DEFAULT_PROFILE):
+    """
+    Set up and truncate the log
+
+    :param str log_file: The log file
+    :param str profile: One of PROFILES
+    :return: nothing
+    """
+    global _listener
+    if profile not in PROFILES:
+        raise ValueError("Unknown log profile {}, expected one of {}".format(profile, ', '.join(PROFILES)))
+    level, background = PROFILES[profile]
+
+    stop()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(level)
+
+    file_handler = logging.FileHandler(log_file, mode='w')
+    file_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    if not background:
+        root.addHandler(file_handler)
+        return
+
+    records = queue.SimpleQueue()
+    root.addHandler(DeferredQueueHandler(records))
+    _listener = logging.handlers.QueueListener(records, file_handler)
+    _listener.start()
+
+
+def stop():
+    """
+    Write the pending records and stop the writer thread, if any
+
+    :return: nothing
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop)
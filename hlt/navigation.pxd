@@ -0,0 +1,73 @@
+cdef class Circle:
+    cdef public double x
+    cdef public double y
+    cdef public double radius
+
+cpdef double calculate_distance_between(Circle p1, Circle p2)
+cpdef double calculate_angle_between(Circle p1, Circle p2)
+cpdef Circle closest_point_to(Circle p1, Circle p2, int min_distance=*)
+
+
+cdef struct Obstacles:
+    # The ship (start of the moves), the original target and the map size
+    double ship_x, ship_y, target_x, target_y, width, height
+    # Circles: planets & ships
+    int count
+    const double *x
+    const double *y
+    const double *radius
+    const double *fudge
+    # Non zero for the entity located at the original target: it's ignored while heading straight to it
+    const int *at_target
+    # Ghosts: committed moves of my ships
+    int ghost_count
+    double ghost_fudge
+    const double *start_x
+    const double *start_y
+    const double *ghost_x
+    const double *ghost_y
+    const double *ghost_radius
+    # Work done by the search, for the instrumentation
+    long tests
+    int retries
+    # Did the search return the hint?
+    bint hint_used
+    # End of the move of the last heading tested (the free one after a successful search)
+    double end_x, end_y
+
+cdef bint obstacles_blocked(Obstacles *field, double tx, double ty, bint original_target) noexcept nogil
+cdef int obstacles_free_heading(Obstacles *field, int angle, double distance, int max_corrections,
+                                int angular_step, int hint) noexcept nogil
+
+
+cdef class ObstacleField:
+    cdef Obstacles obstacles
+    cdef double[:] x
+    cdef double[:] y
+    cdef double[:] radius
+    cdef double[:] fudge
+    cdef int[:] at_target
+    cdef double[:] start_x
+    cdef double[:] start_y
+    cdef double[:] ghost_x
+    cdef double[:] ghost_y
+    cdef double[:] ghost_radius
+
+    cdef bint blocked(self, double tx, double ty, bint original_target) noexcept nogil
+    cdef int first_free_heading(self, int angle, double distance, int max_corrections, int angular_step,
+                                int hint=*)
+
+
+cdef class NavigationCache:
+    cdef dict _entries
+    cdef readonly long turn
+    cdef readonly long hits
+    cdef readonly long misses
+    cdef readonly long evictions
+
+    cdef tuple key(self, long ship_id, Circle target)
+    cdef int lookup(self, tuple key)
+    cdef void record(self, tuple key, int heading, bint searched, bint hint_used)
+
+
+cdef tuple move_along(Circle ship, double distance, double speed, int heading)
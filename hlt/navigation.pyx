@@ -1,10 +1,31 @@
 
-from libc.math cimport sqrt, M_PI, sin, cos, round, atan2, acos
+from libc.math cimport sqrt, M_PI, sin, cos, round, atan2, acos, asin, floor
+from cpython cimport array
+cimport cython
+import array
+
+from .collision cimport segment_circle_hit, segment_circles_first_hit
+from .instrumentation cimport Metrics, STAGE_NAVIGATE, STAGE_OBSTACLES_BETWEEN, COUNTER_ANGLE_RETRIES, \
+    COUNTER_INTERSECT_TESTS, COUNTER_NAV_CACHE_HITS, COUNTER_NAV_CACHE_MISSES
+from .instrumentation import metrics
+
+cdef Metrics _metrics = metrics
 ASSASSIN_AVOID_RADIUS = 7
 NAVIGATION_SHIP_DISTANCE = 90
 GHOST_RATIO_RADIUS = 1.4
-
-cdef double radians(double angle):
+#: Apply the undocked-ship rules: far undocked ships left out of the obstacles, ASSASSIN_AVOID_RADIUS added to the
+#: fudge of the undocked foes. The bot was tuned while the docking status was an Enum, never equal to 0, so these
+#: rules never ran: they stay off to keep the same moves
+UNDOCKED_CHECKS = False
+cdef bint _UNDOCKED_CHECKS = UNDOCKED_CHECKS
+#: Size of the cells the targets are quantized to in the navigation cache
+cdef double NAV_CACHE_CELL = 4.0
+#: Number of headings probed on each side of a cached heading
+cdef int NAV_CACHE_PROBE = 5
+#: Margin (degrees) kept inside the tangents of a circle: a heading this close to a tangent is tested, not skipped
+cdef double TANGENT_MARGIN = 1e-4
+
+cdef double radians(double angle) nogil:
     """
     Convert degrees to radians
     :param angle: 
@@ -12,7 +33,7 @@ cdef double radians(double angle):
     """
     return (angle / 180.0) * M_PI
 
-cdef double degrees(double angle):
+cdef double degrees(double angle) nogil:
     """
     convert radians to degrees
     :param angle: 
@@ -20,6 +41,30 @@ cdef double degrees(double angle):
     """
     return (angle / M_PI) * 180.0
 
+# cos / sin of the integer headings (the engine commands only take integer angles), computed as navigate always did
+cdef double COS_TABLE[360]
+cdef double SIN_TABLE[360]
+cdef int _heading
+for _heading in range(360):
+    COS_TABLE[_heading] = cos(radians(_heading))
+    SIN_TABLE[_heading] = sin(radians(_heading))
+
+
+@cython.cdivision(True)
+cdef inline int table_index(int heading) noexcept nogil:
+    """
+    :return: The heading in [0, 360), whatever its sign
+    """
+    return ((heading % 360) + 360) % 360
+
+
+cdef inline double cos_heading(int heading) noexcept nogil:
+    return COS_TABLE[table_index(heading)]
+
+
+cdef inline double sin_heading(int heading) noexcept nogil:
+    return SIN_TABLE[table_index(heading)]
+
 cdef class Circle:
     """
     A simple wrapper for a coordinate. Intended to be passed to some functions in place of a ship or planet.
@@ -27,9 +72,6 @@ cdef class Circle:
     :ivar y: The y-coordinate.
     :ivar radius: The radius
     """
-    cdef public double x
-    cdef public double y
-    cdef public double radius
     def __init__(self, double x, double y, double radius = 0):
         self.x = x
         self.y = y
@@ -138,7 +180,7 @@ cpdef Circle closest_point_to(Circle p1, Circle p2, int min_distance=3):
 
     return Circle(x, y)
 
-cpdef bint intersect_segment_circle(Circle start, Circle end, Circle circle, fudge=0.5):
+cpdef bint intersect_segment_circle(Circle start, Circle end, Circle circle, double fudge=0.5):
     """
     Test whether a line segment and circle intersect.
     :param Entity start: The start of the line segment. (Needs x, y attributes)
@@ -148,35 +190,9 @@ cpdef bint intersect_segment_circle(Circle start, Circle end, Circle circle, fud
     :return: True if intersects, False otherwise
     :rtype: bool
     """
-    # Derived with SymPy
-    # Parameterize the segment as start + t * (end - start),
-    # and substitute into the equation of a circle
-    # Solve for t
-    cdef double dx = end.x - start.x
-    cdef double dy = end.y - start.y
-
-    cdef double a = dx ** 2 + dy ** 2
-
-    #Never happens
-    if a == 0.0:
-        # Start and end are the same point
-        return calculate_distance_between(start, circle) <= circle.radius + fudge
-
-    cdef double b = -2 * (start.x ** 2 - start.x * end.x - start.x * circle.x + end.x * circle.x +
-                          start.y ** 2 - start.y * end.y - start.y * circle.y + end.y * circle.y)
-    cdef double c = (start.x - circle.x) ** 2 + (start.y - circle.y) ** 2
-
-    # Time along segment when closest to the circle (vertex of the quadratic)
-    cdef double t = min(-b / (2 * a), 1.0)
-    if t < 0:
-        return False
-
-    cdef double closest_x = start.x + dx * t
-    cdef double closest_y = start.y + dy * t
-    cdef Circle closest = Circle(closest_x, closest_y)
-    cdef double closest_distance = calculate_distance_between(closest, circle)
-
-    return closest_distance <= circle.radius + fudge
+    if _metrics.enabled:
+        _metrics.counts[<int>COUNTER_INTERSECT_TESTS] += 1
+    return segment_circle_hit(start.x, start.y, end.x, end.y, circle.x, circle.y, circle.radius, fudge)
 
 cpdef bint obstacles_between(Circle ship, Circle target, game_map, bint ignore_ships=False,
                              bint ignore_planets = False, bint ignore_ghosts = False, assassin = False):
@@ -192,7 +208,15 @@ cpdef bint obstacles_between(Circle ship, Circle target, game_map, bint ignore_s
     :return: is there an obstacle on the path?
     :rtype: bint
     """
+    cdef double start = _metrics.start()
+    cdef bint blocked = _obstacles_between(ship, target, game_map, ignore_ships, ignore_planets, ignore_ghosts,
+                                           assassin)
+    _metrics.stop(STAGE_OBSTACLES_BETWEEN, start)
+    return blocked
 
+
+cdef bint _obstacles_between(Circle ship, Circle target, game_map, bint ignore_ships, bint ignore_planets,
+                             bint ignore_ghosts, assassin):
     if target.x < 1:
         return True
     if target.y < 1:
@@ -203,20 +227,10 @@ cpdef bint obstacles_between(Circle ship, Circle target, game_map, bint ignore_s
         return True
 
     cdef double fudge = ship.radius + 0.1
-    # Avoid my own ships
-    if not ignore_ships:
-        for my_ship in game_map.get_me().all_ships():
-            if my_ship.pos == ship:
-                continue
-            # If the ship is too far ahead, no need to look right now
-            if my_ship.docking_status==0 and calculate_distance_between(my_ship.pos, ship) > NAVIGATION_SHIP_DISTANCE:
-                continue
-            if intersect_segment_circle(ship, target, my_ship.pos, fudge=fudge):
-                return True
 
     # Avoid ghost (future position of my ships)
     if not ignore_ghosts:
-        for start,ghost in game_map.all_ghost():
+        for start,ghost in game_map.ghosts_along(ship, target, fudge + 1):
             if segment_intersect(start,ghost, ship, target):
                 return True
             if intersect_segment_circle(ship, target, ghost, fudge=fudge+1):
@@ -226,7 +240,7 @@ cpdef bint obstacles_between(Circle ship, Circle target, game_map, bint ignore_s
 
     # Avoid planets
     if not ignore_planets:
-        for planet in game_map.all_planets():
+        for planet in game_map.planets_along(ship, target, fudge):
             if planet.pos == ship or planet.pos == target:
                 continue
             if intersect_segment_circle(ship, target, planet.pos, fudge=fudge):
@@ -238,30 +252,467 @@ cpdef bint obstacles_between(Circle ship, Circle target, game_map, bint ignore_s
         # Increase the the fudge but only for undocked ship, docked ship are safe
         undocked_fudge += ASSASSIN_AVOID_RADIUS
 
-    # Avoid enemy ships
+    # Avoid ships: only the ones close to the path are returned by the spatial index
     if not ignore_ships:
-        for enemy_ship in game_map.all_ships():
-            # Don't look at my own ship in this loop
-            if enemy_ship.owner.id == game_map.get_me().id:
+        my_id = game_map.my_id
+        for other_ship in game_map.ships_along(ship, target, max(fudge, undocked_fudge)):
+            if other_ship.owner_id == my_id:
+                # Avoid my own ships
+                if other_ship.pos == ship:
+                    continue
+                # If the ship is too far ahead, no need to look right now
+                if _UNDOCKED_CHECKS and other_ship.docking_status == 0 and calculate_distance_between(other_ship.pos, ship) > NAVIGATION_SHIP_DISTANCE:
+                    continue
+                if intersect_segment_circle(ship, target, other_ship.pos, fudge=fudge):
+                    return True
                 continue
+
+            # Avoid enemy ships
             # Don't look at the ship that could be the target
-            if enemy_ship.pos == target:
+            if other_ship.pos == target:
                 continue
             # If the ship is too far ahead, no need to look right now
-            if enemy_ship.docking_status==0 and calculate_distance_between(enemy_ship.pos, ship) > NAVIGATION_SHIP_DISTANCE:
+            if _UNDOCKED_CHECKS and other_ship.docking_status == 0 and calculate_distance_between(other_ship.pos, ship) > NAVIGATION_SHIP_DISTANCE:
                 continue
             # Handle docked & undocked ship with different fudge (if assassin)
-            if enemy_ship.docking_status == 0: # UNDOCKED (hack to avoid import)
-                if intersect_segment_circle(ship, target, enemy_ship.pos, fudge=undocked_fudge):
+            if _UNDOCKED_CHECKS and other_ship.docking_status == 0: # UNDOCKED (hack to avoid import)
+                if intersect_segment_circle(ship, target, other_ship.pos, fudge=undocked_fudge):
                     return True
             else:
-                if intersect_segment_circle(ship, target, enemy_ship.pos, fudge=fudge):
+                if intersect_segment_circle(ship, target, other_ship.pos, fudge=fudge):
                     return True
 
+    return False
+
+cdef bint obstacles_blocked(Obstacles *field, double tx, double ty, bint original_target) noexcept nogil:
+    """
+    Is there an obstacle between the ship and (tx, ty)?
+    :param Obstacles field: The obstacles met by the ship
+    :param double tx: x-coordinate of the end of the move
+    :param double ty: y-coordinate of the end of the move
+    :param bint original_target: Is (tx, ty) the original target?
+    :return: is there an obstacle on the path?
+    """
+    cdef int i, hit
+
+    if tx < 1 or ty < 1 or tx + 1 > field.width or ty + 1 > field.height:
+        return True
+
+    for i in range(field.ghost_count):
+        if _segment_intersect(field.start_x[i], field.start_y[i], field.ghost_x[i], field.ghost_y[i],
+                              field.ship_x, field.ship_y, tx, ty):
+            return True
+        field.tests += 1
+        if segment_circle_hit(field.ship_x, field.ship_y, tx, ty, field.ghost_x[i], field.ghost_y[i],
+                              field.ghost_radius[i], field.ghost_fudge + 1):
+            return True
+        if sqrt(((tx - field.ghost_x[i]) ** 2) + ((ty - field.ghost_y[i]) ** 2)) < field.ghost_radius[i] + field.ghost_fudge:
+            return True
+
+    if field.count == 0:
+        return False
+    hit = segment_circles_first_hit(field.ship_x, field.ship_y, tx, ty, field.x, field.y, field.radius,
+                                    field.fudge, field.at_target if original_target else NULL, field.count,
+                                    &field.tests)
+    return hit >= 0
+
+
+cdef bint _free_at(Obstacles *field, int heading, double distance) noexcept nogil:
+    """
+    Is the move of the given length along heading free? Its end is kept in field.end_x, field.end_y
+    """
+    field.end_x = field.ship_x + cos_heading(heading) * distance
+    field.end_y = field.ship_y + sin_heading(heading) * distance
+    return not obstacles_blocked(field, field.end_x, field.end_y, False)
+
+
+@cython.cdivision(True)
+cdef void _cover_circle(double dx, double dy, double reach, double distance, unsigned char *covered) noexcept nogil:
+    """
+    Mark the integer headings whose move of the given length certainly passes within reach of a circle center
+    (dx, dy away from the ship): the ones strictly between the two tangents to the inflated circle, or, when the
+    tangent points are out of reach, between the two headings whose move ends on the circle. The segment/circle test
+    only sees the circles ahead of the ship (see segment_circle_hit): a ship within a circle is blocked up to 90
+    degrees away from its center.
+    """
+    cdef int heading, first, last
+    cdef double d2 = dx * dx + dy * dy
+    cdef double center, half_width, cosine
+    if d2 <= reach * reach:
+        half_width = 90
+    elif distance * distance >= d2 - reach * reach:
+        # The tangent points are within the move
+        half_width = degrees(asin(reach / sqrt(d2)))
+    else:
+        # Only the end of the move can enter the circle
+        cosine = (distance * distance + d2 - reach * reach) / (2 * distance * sqrt(d2))
+        if cosine >= 1:
+            return
+        half_width = degrees(acos(cosine))
+    half_width -= TANGENT_MARGIN
+    if half_width <= 0:
+        return
+    center = degrees(atan2(dy, dx))
+    first = <int>floor(center - half_width) + 1
+    last = <int>floor(center + half_width)
+    if <double>last == center + half_width:
+        last -= 1
+    for heading in range(first, last + 1):
+        covered[(heading % 360 + 360) % 360] = True
+
+
+cdef void _mark_covered(Obstacles *field, double distance, unsigned char *covered) noexcept nogil:
+    """
+    Mark the integer headings whose move of the given length certainly hits one of the circles or ghosts, see
+    _cover_circle. The ghost paths and the borders are left to the exact tests.
+    """
+    cdef int i, heading
+    for heading in range(360):
+        covered[heading] = False
+    for i in range(field.count):
+        _cover_circle(field.x[i] - field.ship_x, field.y[i] - field.ship_y, field.radius[i] + field.fudge[i],
+                      distance, covered)
+    for i in range(field.ghost_count):
+        # obstacles_blocked tests the ghosts with an extra unit of fudge
+        _cover_circle(field.ghost_x[i] - field.ship_x, field.ghost_y[i] - field.ship_y,
+                      field.ghost_radius[i] + field.ghost_fudge + 1, distance, covered)
+
+
+cdef int _free_near_hint(Obstacles *field, int angle, int hint, double distance, int max_corrections,
+                         int angular_step, const unsigned char *covered) noexcept nogil:
+    """
+    Probe the headings of the search (within max_corrections of angle, but angle) around the hint: the hint,
+    then alternating steps of angular_step degrees, the one closer to angle first. The covered headings are skipped.
+    :return: The first free heading, -1 if there is none within NAV_CACHE_PROBE steps
+    """
+    cdef int deviation = ((hint - angle) % 360 + 360) % 360
+    cdef int side, step, candidate, k
+    if deviation > 180:
+        deviation -= 360
+    side = 1 if deviation > 0 else -1
+    # Snap to the headings of the search
+    deviation -= deviation % angular_step if deviation > 0 else -((-deviation) % angular_step)
+    for k in range(2 * NAV_CACHE_PROBE + 1):
+        step = (k + 1) // 2
+        candidate = deviation - side * step * angular_step if k % 2 == 1 else deviation + side * step * angular_step
+        if candidate == 0 or abs(candidate) > max_corrections:
+            continue
+        candidate = ((angle + candidate) % 360 + 360) % 360
+        if not covered[candidate] and _free_at(field, candidate, distance):
+            return candidate
+    return -1
+
+
+cdef int obstacles_free_heading(Obstacles *field, int angle, double distance, int max_corrections,
+                                int angular_step, int hint) noexcept nogil:
+    """
+    Try the headings in the navigate order: angle, then alternating deviations of angular_step degrees.
+    A hint (heading in [0, 360), -1 if none) is tried right after angle: if it or one of the headings around it
+    is free, the search is skipped.
+    Only the headings outside the tangents of the circles and ghosts (see _mark_covered) are tested: the others are
+    blocked anyway, so the heading found is the same as with every heading tested, for a handful of tests.
+    :return: The first free heading, -1 if there is none within max_corrections. The end of its move is left in
+             field.end_x, field.end_y.
+    """
+    cdef int da = 0
+    cdef int direction = 1
+    cdef int new_angle = angle
+    cdef unsigned char covered[360]
+
+    field.hint_used = False
+    field.end_x = field.target_x
+    field.end_y = field.target_y
+    if not obstacles_blocked(field, field.target_x, field.target_y, True):
+        return angle
+    _mark_covered(field, distance, covered)
+    if hint >= 0:
+        new_angle = _free_near_hint(field, angle, hint, distance, max_corrections, angular_step, covered)
+        if new_angle >= 0:
+            field.hint_used = True
+            return new_angle
+    while True:
+        # Increase the delta angle
+        da += angular_step
+        # If we ran out of tries
+        if da > max_corrections:
+            return -1
+        field.retries += 1
+
+        #Switch direction
+        direction = -1 * direction
+        # Add the new delta
+        new_angle = angle + da * direction
+
+        # Make sure the new_angle is between [0, 360]
+        if new_angle < 0:
+            new_angle = 360 + new_angle
+        new_angle = new_angle % 360
+
+        # Calculate the position of the new target
+        if not covered[new_angle] and _free_at(field, new_angle, distance):
+            return new_angle
+
+
+@cython.final
+cdef class ObstacleField:
+    """
+    The obstacles met by a ship navigating at a given distance, gathered once so that every candidate heading
+    of a navigate call is tested by a typed loop, without going back to the game_map.
+    The tests are the same as obstacles_between, operation for operation.
+
+    The arrays are owned by the field, the Obstacles struct handed to the nogil kernels points into them.
+    """
+
+    def __init__(self, Circle ship, Circle target, double distance, game_map, bint ignore_ships=False,
+                 bint ignore_planets=False, bint ignore_ghosts=False, assassin=False):
+        """
+        :param Circle ship: The ship that navigates
+        :param Circle target: The original target
+        :param double distance: Length of the candidate moves
+        :param Map game_map: the game_map
+        :param bint ignore_ships: Should we ignore ships
+        :param bint ignore_planets: Should we ignore planets
+        :param bint ignore_ghosts: Should we ignore ghosts
+        :param bint assassin: Is the ship an assassin? => Increase fudge for enemy ship
+        """
+        cdef array.array template = array.array('d')
+        cdef double fudge = ship.radius + 0.1
+        cdef double undocked_fudge = fudge
+        cdef list circles = []
+        cdef list fudges = []
+        cdef list targets = []
+        cdef int i, count, ghost_count
+
+        if assassin:
+            # Increase the the fudge but only for undocked ship, docked ship are safe
+            undocked_fudge += ASSASSIN_AVOID_RADIUS
+
+        # Every candidate move stays within distance of the ship
+        if not ignore_planets:
+            for planet in game_map.planets_near(ship, distance + fudge):
+                pos = planet.pos
+                if pos == ship:
+                    continue
+                circles.append(pos)
+                fudges.append(fudge)
+                targets.append(pos == target)
+
+        if not ignore_ships:
+            my_id = game_map.my_id
+            for other_ship in game_map.ships_near(ship, distance + max(fudge, undocked_fudge)):
+                pos = other_ship.pos
+                # If the ship is too far ahead, no need to look right now
+                if _UNDOCKED_CHECKS and other_ship.docking_status == 0 and calculate_distance_between(pos, ship) > NAVIGATION_SHIP_DISTANCE:
+                    continue
+                if other_ship.owner_id == my_id:
+                    if pos == ship:
+                        continue
+                    circles.append(pos)
+                    fudges.append(fudge)
+                    targets.append(False)
+                else:
+                    circles.append(pos)
+                    # Handle docked & undocked ship with different fudge (if assassin)
+                    fudges.append(undocked_fudge if _UNDOCKED_CHECKS and other_ship.docking_status == 0 else fudge)
+                    targets.append(pos == target)
+
+        count = len(circles)
+        self.x = array.clone(template, count, zero=False)
+        self.y = array.clone(template, count, zero=False)
+        self.radius = array.clone(template, count, zero=False)
+        self.fudge = array.clone(template, count, zero=False)
+        self.at_target = array.clone(array.array('i'), count, zero=False)
+        for i in range(count):
+            self.x[i] = circles[i].x
+            self.y[i] = circles[i].y
+            self.radius[i] = circles[i].radius
+            self.fudge[i] = fudges[i]
+            self.at_target[i] = targets[i]
+
+        ghosts = [] if ignore_ghosts else game_map.ghosts_near(ship, distance + fudge + 1)
+        ghost_count = len(ghosts)
+        self.start_x = array.clone(template, ghost_count, zero=False)
+        self.start_y = array.clone(template, ghost_count, zero=False)
+        self.ghost_x = array.clone(template, ghost_count, zero=False)
+        self.ghost_y = array.clone(template, ghost_count, zero=False)
+        self.ghost_radius = array.clone(template, ghost_count, zero=False)
+        for i in range(ghost_count):
+            start, ghost = ghosts[i]
+            self.start_x[i] = start.x
+            self.start_y[i] = start.y
+            self.ghost_x[i] = ghost.x
+            self.ghost_y[i] = ghost.y
+            self.ghost_radius[i] = ghost.radius
+
+        self.obstacles.ship_x = ship.x
+        self.obstacles.ship_y = ship.y
+        self.obstacles.target_x = target.x
+        self.obstacles.target_y = target.y
+        self.obstacles.width = game_map.width
+        self.obstacles.height = game_map.height
+        self.obstacles.count = count
+        self.obstacles.x = &self.x[0] if count else NULL
+        self.obstacles.y = &self.y[0] if count else NULL
+        self.obstacles.radius = &self.radius[0] if count else NULL
+        self.obstacles.fudge = &self.fudge[0] if count else NULL
+        self.obstacles.at_target = &self.at_target[0] if count else NULL
+        self.obstacles.ghost_count = ghost_count
+        self.obstacles.ghost_fudge = fudge
+        self.obstacles.start_x = &self.start_x[0] if ghost_count else NULL
+        self.obstacles.start_y = &self.start_y[0] if ghost_count else NULL
+        self.obstacles.ghost_x = &self.ghost_x[0] if ghost_count else NULL
+        self.obstacles.ghost_y = &self.ghost_y[0] if ghost_count else NULL
+        self.obstacles.ghost_radius = &self.ghost_radius[0] if ghost_count else NULL
+        self.obstacles.tests = 0
+        self.obstacles.retries = 0
+        self.obstacles.hint_used = False
+
+    cdef bint blocked(self, double tx, double ty, bint original_target) noexcept nogil:
+        """
+        Is there an obstacle between the ship and (tx, ty)? See obstacles_blocked
+        """
+        return obstacles_blocked(&self.obstacles, tx, ty, original_target)
+
+    cdef int first_free_heading(self, int angle, double distance, int max_corrections, int angular_step,
+                                int hint=-1):
+        """
+        First free heading in the navigate order, see obstacles_free_heading
+        :return: The first free heading, -1 if there is none within max_corrections
+        """
+        with nogil:
+            return obstacles_free_heading(&self.obstacles, angle, distance, max_corrections, angular_step, hint)
+
+    @property
+    def tests(self):
+        """
+        :return: Number of segment/circle tests run by first_free_heading
+        """
+        return self.obstacles.tests
+
+    @property
+    def retries(self):
+        """
+        :return: Number of headings tried by the search of first_free_heading
+        """
+        return self.obstacles.retries
+
+    @property
+    def hint_used(self):
+        """
+        :return: Did first_free_heading return the hint?
+        """
+        return self.obstacles.hint_used
+
+
+cdef class NavigationCache:
+    """
+    Heading found by the last navigation of each ship towards each target cell (targets quantized to
+    NAV_CACHE_CELL). Ships keep heading for the same target for many turns: when the straight line is blocked,
+    the cached heading is revalidated against the obstacles around the ship, and the angular search is only run
+    if it's blocked too. The headings reused are always free, but not always the smallest deviation.
+
+    Entries not used during a turn are evicted at the start of the next one: the target died, or moved to
+    another cell.
+
+    :ivar turn: Number of start_turn calls
+    :ivar hits: Angular searches skipped thanks to a cached heading
+    :ivar misses: Angular searches run (no entry, or the cached heading is blocked)
+    :ivar evictions: Entries dropped by start_turn
+    """
+    def __init__(self):
+        self._entries = {}
+        self.turn = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def start_turn(self, dead_ships=()):
+        """
+        Evict the entries which were not used during the last turn, and the ones of the ships which died
+
+        :param dead_ships: Ids of the ships which died
+        :return: nothing
+        """
+        cdef dict kept = {}
+        for key, entry in self._entries.items():
+            if entry[1] == self.turn and key[0] not in dead_ships:
+                kept[key] = entry
+        self.evictions += len(self._entries) - len(kept)
+        self._entries = kept
+        self.turn += 1
+
+    cdef tuple key(self, long ship_id, Circle target):
+        return ship_id, <long>floor(target.x / NAV_CACHE_CELL), <long>floor(target.y / NAV_CACHE_CELL)
+
+    cdef int lookup(self, tuple key):
+        entry = self._entries.get(key)
+        return -1 if entry is None else entry[0]
+
+    cdef void record(self, tuple key, int heading, bint searched, bint hint_used):
+        """
+        :param tuple key: Key of the navigation
+        :param int heading: The heading found, -1 if none
+        :param bint searched: Was the straight line blocked?
+        :param bint hint_used: Was the cached heading used?
+        """
+        if searched:
+            if hint_used:
+                self.hits += 1
+                _metrics.count(COUNTER_NAV_CACHE_HITS)
+            else:
+                self.misses += 1
+                _metrics.count(COUNTER_NAV_CACHE_MISSES)
+        if heading < 0:
+            self._entries.pop(key, None)
+        else:
+            self._entries[key] = (heading % 360, self.turn)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+cdef inline int _orientation(double px, double py, double qx, double qy, double rx, double ry) noexcept nogil:
+    """
+    orientation on raw coordinates
+    """
+    cdef double val = (qy - py) * (rx - qx) - (qx - px) * (ry - qy)
+    if val == 0:
+        return 0
+    if val > 0:
+        return 1
+    return 2
+
+
+cdef inline bint _on_segment(double px, double py, double qx, double qy, double rx, double ry) noexcept nogil:
+    """
+    on_segment on raw coordinates
+    """
+    return min(px, rx) <= qx <= max(px, rx) and min(py, ry) <= qy <= max(py, ry)
 
 
+cdef inline bint _segment_intersect(double p1x, double p1y, double q1x, double q1y,
+                                    double p2x, double p2y, double q2x, double q2y) noexcept nogil:
+    """
+    segment_intersect on raw coordinates
+    """
+    cdef int o1 = _orientation(p1x, p1y, q1x, q1y, p2x, p2y)
+    cdef int o2 = _orientation(p1x, p1y, q1x, q1y, q2x, q2y)
+    cdef int o3 = _orientation(p2x, p2y, q2x, q2y, p1x, p1y)
+    cdef int o4 = _orientation(p2x, p2y, q2x, q2y, q1x, q1y)
+
+    if o1 != o2 and o3 != o4:
+        return True
+    if o1 == 0 and _on_segment(p1x, p1y, p2x, p2y, q1x, q1y):
+        return True
+    if o2 == 0 and _on_segment(p1x, p1y, q2x, q2y, q1x, q1y):
+        return True
+    if o3 == 0 and _on_segment(p2x, p2y, p1x, p1y, q2x, q2y):
+        return True
+    if o4 == 0 and _on_segment(p2x, p2y, q1x, q1y, q2x, q2y):
+        return True
     return False
 
+
 cdef Circle dx_target(start, angle, distance):
     cdef int new_target_dx
     cdef int new_target_dy
@@ -297,7 +748,8 @@ cpdef Circle op_target(Circle ship, Circle target,int max_x, int max_y):
     return new_target
 
 cpdef tuple navigate(Circle ship, Circle target, game_map, double speed, int max_corrections=90, int angular_step=1,
-                     bint ignore_ships=False, bint ignore_planets=False, ignore_ghosts=False, assassin=False):
+                     bint ignore_ships=False, bint ignore_planets=False, ignore_ghosts=False, assassin=False,
+                     cache_key=None, int heading_hint=-1):
     """
     Move a ship to a specific target position (Entity). It is recommended to place the position
     itself here, else navigate will crash into the target. If avoid_obstacles is set to True (default)
@@ -315,6 +767,10 @@ cpdef tuple navigate(Circle ship, Circle target, game_map, double speed, int max
     :param bool ignore_planets: Whether to ignore planets in calculations (useful if you want to crash onto planets)
     :param bool ignore_ghosts: Whether to ignore ghosts
     :param bool assassin: Whether the ship is an assassin
+    :param cache_key: Id of the navigating ship, to reuse its heading of the last turn through
+                      game_map.navigation_cache. None to always search.
+    :param int heading_hint: Heading tried first when the straight line is blocked (see flowfield.FlowField), instead
+                             of the cached one. -1 if none.
     :return tuple: the speed and angle of the thrust
     :rtype: tuple
     """
@@ -336,50 +792,57 @@ cpdef tuple navigate(Circle ship, Circle target, game_map, double speed, int max
     cdef int angle = int(round(calculate_angle_between(ship, target)))
 
 
-    # New ship target after correction
-    cdef double new_target_dx
-    cdef double new_target_dy
-    cdef Circle new_target = target
-
-    cdef int da = 0
-    cdef int direction = 1
     cdef int new_angle = angle
+    cdef ObstacleField field
+    cdef NavigationCache cache = None
+    cdef tuple key = None
+    cdef int hint = -1
+    cdef double start = _metrics.start()
 
     if not ignore_planets or not ignore_ships:
-        while obstacles_between(ship, new_target, game_map, ignore_ships=ignore_ships, ignore_planets=ignore_planets,
-                                ignore_ghosts=ignore_ghosts, assassin=assassin):
-            # Increase the delta angle
-            da += angular_step
-            # If we ran out of tries
-            if da > max_corrections:
-                # Return no thrust
-                return 0, 0, None
-
-            #Switch direction
-            direction = -1 * direction
-            # Add the new delta
-            new_angle = angle + da * direction
-
-            # Make sure the new_angle is between [0, 360]
-            if new_angle < 0:
-                new_angle = 360 + new_angle
-            new_angle = new_angle % 360
-
-            # Calculate the position of the new target
-            new_target_dx = cos(radians(new_angle)) * distance
-            new_target_dy = sin(radians(new_angle)) * distance
-            new_target = Circle(ship.x + new_target_dx, ship.y + new_target_dy, target.radius)
-
-
-
+        if cache_key is not None:
+            cache = game_map.navigation_cache
+        if cache is not None:
+            key = cache.key(cache_key, target)
+            hint = cache.lookup(key)
+        if heading_hint >= 0:
+            hint = heading_hint
+        # Gather the obstacles once, then test all the candidate headings against them
+        field = ObstacleField(ship, target, distance, game_map, ignore_ships=ignore_ships,
+                              ignore_planets=ignore_planets, ignore_ghosts=ignore_ghosts, assassin=assassin)
+        new_angle = field.first_free_heading(angle, distance, max_corrections, angular_step, hint)
+        if cache is not None:
+            # The hits and misses are the ones of the cached headings
+            cache.record(key, new_angle, (new_angle != angle or field.obstacles.retries > 0) and heading_hint < 0,
+                         field.obstacles.hint_used)
+        if _metrics.enabled:
+            _metrics.counts[<int>COUNTER_ANGLE_RETRIES] += field.obstacles.retries
+            _metrics.counts[<int>COUNTER_INTERSECT_TESTS] += field.obstacles.tests
+        if new_angle < 0:
+            # Return no thrust
+            _metrics.stop(STAGE_NAVIGATE, start)
+            return 0, 0, None
+
+    _metrics.stop(STAGE_NAVIGATE, start)
+    return move_along(ship, distance, speed, new_angle)
+
+
+cdef tuple move_along(Circle ship, double distance, double speed, int heading):
+    """
+    The move of a ship which found a free heading
+    :param Circle ship: The ship that navigates
+    :param double distance: Distance to the target
+    :param double speed: The (max) speed of the move
+    :param int heading: The free heading
+    :return: the speed and angle of the thrust, and the ghost (future position of the ship)
+    :rtype: tuple
+    """
     speed = speed if (distance >= speed) else distance
 
     #Also calculate the future position of the ship
-    new_target_dx = cos(radians(new_angle)) * speed
-    new_target_dy = sin(radians(new_angle)) * speed
-    new_target = Circle(ship.x + new_target_dx, ship.y + new_target_dy, ship.radius * GHOST_RATIO_RADIUS)
-
-    return speed, new_angle, new_target
+    cdef double new_target_dx = cos_heading(heading) * speed
+    cdef double new_target_dy = sin_heading(heading) * speed
+    return speed, heading, Circle(ship.x + new_target_dx, ship.y + new_target_dy, ship.radius * GHOST_RATIO_RADIUS)
 
 
 # From https://www.cdn.geeksforgeeks.org/check-if-two-given-line-segments-intersect/
@@ -1,15 +1,46 @@
+import os
 import sys
 import logging
-import copy
+import time
 
-from . import game_map
+from . import game_map, logs
+from .instrumentation import metrics
+
+#: Environment variable naming the trace file of the record mode
+RECORD_ENV = 'HALITE_RECORD'
+#: Environment variable naming the file the per-turn metrics are written to, see instrumentation
+METRICS_ENV = 'HALITE_METRICS'
+#: Environment variable enabling the navigation cache (1), see navigation.NavigationCache
+NAV_CACHE_ENV = 'HALITE_NAV_CACHE'
+#: Environment variable enabling the batched navigation (1), see batch.NavigationBatch
+NAV_BATCH_ENV = 'HALITE_NAV_BATCH'
+#: Environment variable enabling the flow fields (1), see flowfield.FlowFields
+FLOW_FIELDS_ENV = 'HALITE_FLOW_FIELDS'
+
+
+def player_path(path, player_id):
+    """
+    :param str path: A file path
+    :param int player_id: Id of the player
+    :return: The path with the player id before its extension (game.trace -> game_0.trace)
+    :rtype: str
+    """
+    root, extension = os.path.splitext(path)
+    return "{}_{}{}".format(root, player_id, extension)
 
 
 class Game:
     """
     :ivar map: Current map representation
-    :ivar initial_map: The initial version of the map before game starts
+    :ivar static_geometry: Planet geometry computed before the game starts, see geometry.StaticGeometry
+    :ivar turn_start: Time (time.time()) at which the map of the current turn was received
+    :ivar turn: Number of the current turn, starting at 0
     """
+    #: Trace file of the record mode, None when not recording
+    _trace = None
+    #: Output buffer of the commands, reused every turn
+    _out = bytearray()
+
     @staticmethod
     def _send_string(s):
         """
@@ -18,7 +49,7 @@ class Game:
         :param str s: String to send
         :return: nothing
         """
-        sys.stdout.write(s)
+        sys.stdout.buffer.write(s.encode('ascii'))
 
     @staticmethod
     def _done_sending():
@@ -27,8 +58,22 @@ class Game:
 
         :return: nothing
         """
-        sys.stdout.write('\n')
-        sys.stdout.flush()
+        sys.stdout.buffer.write(b'\n')
+        sys.stdout.buffer.flush()
+
+    @staticmethod
+    def _get_bytes():
+        """
+        Read raw input from the game. All the reads go through the binary buffer of stdin, so that text and binary
+        reads never compete for the same buffered data.
+
+        :return: The input read from the Halite engine
+        :rtype: bytes
+        """
+        line = sys.stdin.buffer.readline().rstrip(b'\n')
+        if Game._trace is not None:
+            Game._trace.write(line + b'\n')
+        return line
 
     @staticmethod
     def _get_string():
@@ -38,49 +83,99 @@ class Game:
         :return: The input read from the Halite engine
         :rtype: str
         """
-        result = sys.stdin.readline().rstrip('\n')
-        return result
+        return Game._get_bytes().decode('ascii')
 
     @staticmethod
     def send_command_queue(command_queue):
         """
-        Issue the given list of commands.
+        Issue the given list of commands. They are gathered in a reused buffer, sent with a single write.
 
         :param list[str] command_queue: List of commands to send the Halite engine
         :return: nothing
         """
+        cdef bytearray out = Game._out
+        cdef str command
+        del out[:]
         for command in command_queue:
-            Game._send_string(command)
-
-        Game._done_sending()
+            out += command.encode('ascii')
+        out += b'\n'
+        sys.stdout.buffer.write(out)
+        sys.stdout.buffer.flush()
+        metrics.end_turn(len(command_queue))
 
     @staticmethod
-    def _set_up_logging(tag, name):
+    def _set_up_logging(tag, name, profile=logs.DEFAULT_PROFILE):
         """
         Set up and truncate the log
 
         :param tag: The user tag (used for naming the log)
         :param name: The bot name (used for naming the log)
+        :param profile: The logging profile, see logs.PROFILES
         :return: nothing
         """
         log_file = "{}_{}.log".format(tag, name)
-        logging.basicConfig(filename=log_file, level=logging.DEBUG, filemode='w')
+        logs.set_up(log_file, profile)
         logging.info("Initialized bot {}".format(name))
 
-    def __init__(self, name):
+    @staticmethod
+    def _start_recording(path, tag_line):
+        """
+        Record the lines read from the engine (id, size, then one map per turn) to a trace file, see
+        benchmarks/replay.py. The file is unbuffered: the engine kills the bot without notice at the end of the game.
+
+        :param str path: The trace file
+        :param bytes tag_line: The id line, already read
+        :return: nothing
+        """
+        Game._trace = open(path, 'wb', buffering=0)
+        Game._trace.write(tag_line + b'\n')
+
+    def __init__(self, name, record=None, metrics_file=None, log_profile=None, cache_navigation=None,
+                 batch_navigation=None, flow_fields=None):
         """
         Initialize the bot with the given name.
 
         :param name: The name of the bot.
+        :param record: Trace file to record the game to (optional, defaults to the HALITE_RECORD variable)
+        :param metrics_file: File to write the per-turn metrics to (optional, defaults to the HALITE_METRICS variable)
+
+        Every bot of a local game inherits the same variables: the paths taken from HALITE_RECORD and HALITE_METRICS
+        get the player id before their extension, see player_path (game.trace -> game_0.trace, game_1.trace...).
+        :param log_profile: The logging profile, see logs.PROFILES (optional, defaults to the HALITE_LOG variable)
+        :param cache_navigation: Reuse the headings of the last turn in navigate (optional, defaults to the
+                                 HALITE_NAV_CACHE variable)
+        :param batch_navigation: Plan the moves of the turn in parallel (optional, defaults to the HALITE_NAV_BATCH
+                                 variable)
+        :param flow_fields: Head for the planets along their flow fields (optional, defaults to the
+                            HALITE_FLOW_FIELDS variable)
         """
+        self.turn = -1
         self._name = name
         self._send_name = False
-        tag = int(self._get_string())
-        Game._set_up_logging(tag, name)
+        tag_line = self._get_bytes()
+        tag = int(tag_line)
+        if record is None and os.environ.get(RECORD_ENV):
+            record = player_path(os.environ[RECORD_ENV], tag)
+        if record:
+            Game._start_recording(record, tag_line)
+        if metrics_file is None and os.environ.get(METRICS_ENV):
+            metrics_file = player_path(os.environ[METRICS_ENV], tag)
+        if metrics_file:
+            metrics.enable(open(metrics_file, 'w'))
+        Game._set_up_logging(tag, name, log_profile or os.environ.get(logs.LOG_PROFILE_ENV, logs.DEFAULT_PROFILE))
+        if record:
+            logging.info("Recording the game to {}".format(record))
         width, height = [int(x) for x in self._get_string().strip().split()]
-        self.map = game_map.Map(tag, width, height)
+        if cache_navigation is None:
+            cache_navigation = os.environ.get(NAV_CACHE_ENV) == '1'
+        if batch_navigation is None:
+            batch_navigation = os.environ.get(NAV_BATCH_ENV) == '1'
+        if flow_fields is None:
+            flow_fields = os.environ.get(FLOW_FIELDS_ENV) == '1'
+        self.map = game_map.Map(tag, width, height, cache_navigation=cache_navigation,
+                                batch_navigation=batch_navigation, flow_fields=flow_fields)
         self.update_map()
-        self.initial_map = copy.deepcopy(self.map)
+        self.static_geometry = self.map.static_geometry
         self._send_name = True
 
     def update_map(self):
@@ -95,5 +190,10 @@ class Game:
             self._done_sending()
             self._send_name = False
         logging.info("---NEW TURN---")
-        self.map._parse(self._get_string())
+        map_bytes = self._get_bytes()
+        # The engine's clock runs from here: this is the reference of the turn budget
+        self.turn_start = time.time()
+        self.turn += 1
+        metrics.start_turn(self.turn)
+        self.map._parse(map_bytes)
         return self.map
@@ -0,0 +1,145 @@
+from libc.stdlib cimport strtol, strtod
+
+from .entity import Ship, Planet
+
+
+cdef class MapCursor:
+    """
+    Single pass reader over the map description sent by the Halite engine.
+    The numbers are read in place with strtol / strtod: no token list is ever built.
+
+    :ivar position: Offset of the next character to read
+    """
+    cdef bytes _data
+    cdef const char *_start
+    cdef const char *_ptr
+
+    def __init__(self, data):
+        """
+        :param data: The map description, as bytes (or str)
+        """
+        if isinstance(data, str):
+            data = data.encode('ascii')
+        self._data = data
+        self._start = self._data
+        self._ptr = self._start
+
+    @property
+    def position(self):
+        return self._ptr - self._start
+
+    cdef long read_int(self) except? -1:
+        """
+        Read the next integer
+        """
+        cdef char *end
+        cdef long value = strtol(self._ptr, &end, 10)
+        if end == self._ptr:
+            raise ValueError("Expected an integer at offset %s" % self.position)
+        self._ptr = end
+        return value
+
+    cdef double read_double(self) except? -1:
+        """
+        Read the next floating point number
+        """
+        cdef char *end
+        cdef double value = strtod(self._ptr, &end)
+        if end == self._ptr:
+            raise ValueError("Expected a number at offset %s" % self.position)
+        self._ptr = end
+        return value
+
+    cdef bint at_end(self):
+        """
+        :return: True if only whitespace is left
+        """
+        while self._ptr[0] in b' \t\r\n':
+            self._ptr += 1
+        return self._ptr[0] == 0
+
+
+cdef dict _parse_ships(MapCursor cursor, long player_id, dict known):
+    cdef dict ships = {}
+    cdef long num_ships = cursor.read_int()
+    cdef long sid, hp, docked, docked_planet, progress, cooldown
+    cdef double x, y, vel_x, vel_y
+
+    for _ in range(num_ships):
+        sid = cursor.read_int()
+        x = cursor.read_double()
+        y = cursor.read_double()
+        hp = cursor.read_int()
+        vel_x = cursor.read_double()
+        vel_y = cursor.read_double()
+        docked = cursor.read_int()
+        docked_planet = cursor.read_int()
+        progress = cursor.read_int()
+        cooldown = cursor.read_int()
+        ship = known.get(sid) if known is not None else None
+        if ship is None:
+            ship = Ship(player_id, sid, x, y, hp, vel_x, vel_y,
+                        docked, docked_planet, progress, cooldown)
+        else:
+            ship._update(player_id, x, y, hp, vel_x, vel_y,
+                         docked, docked_planet, progress, cooldown)
+        ships[sid] = ship
+    return ships
+
+
+cdef dict _parse_planets(MapCursor cursor, dict known):
+    cdef dict planets = {}
+    cdef long num_planets = cursor.read_int()
+    cdef long plid, hp, docking, current, remaining, owned, owner, num_docked_ships
+    cdef double x, y, r
+    cdef list docked_ships
+
+    for _ in range(num_planets):
+        plid = cursor.read_int()
+        x = cursor.read_double()
+        y = cursor.read_double()
+        hp = cursor.read_int()
+        r = cursor.read_double()
+        docking = cursor.read_int()
+        current = cursor.read_int()
+        remaining = cursor.read_int()
+        owned = cursor.read_int()
+        owner = cursor.read_int()
+        num_docked_ships = cursor.read_int()
+        docked_ships = [cursor.read_int() for _ in range(num_docked_ships)]
+        planet = known.get(plid) if known is not None else None
+        if planet is None:
+            planet = Planet(plid, x, y, hp, r, docking, current, remaining,
+                            bool(owned), owner, docked_ships)
+        else:
+            planet._update(hp, current, remaining, bool(owned), owner, docked_ships)
+        planets[plid] = planet
+    return planets
+
+
+cpdef tuple parse_map(data, dict ships=None, dict planets=None):
+    """
+    Parse the map description from the game in a single pass.
+    The entities of the previous turn, when given, are updated in place instead of being created again.
+
+    :param data: The bytes (or str) which the Halite engine outputs
+    :param dict ships: The ships of the previous turn, keyed by id (optional)
+    :param dict planets: The planets of the previous turn, keyed by id (optional)
+    :return: The ships of each player keyed by player id then ship id, and the planets keyed by id
+    :rtype: (dict[int, dict[int, Ship]], dict[int, Planet])
+    """
+    cdef MapCursor cursor = MapCursor(data)
+    cdef dict ships_by_player = {}
+    cdef long num_players = cursor.read_int()
+    cdef long player_id
+
+    for _ in range(num_players):
+        player_id = cursor.read_int()
+        ships_by_player[player_id] = _parse_ships(cursor, player_id, ships)
+
+    planets = _parse_planets(cursor, planets)
+
+    if not cursor.at_end():
+        raise ValueError("Unexpected data at offset %s of the map" % cursor.position)
+
+    return ships_by_player, planets
@@ -0,0 +1,48 @@
+from cpython cimport array
+
+cdef enum Role:
+    ROLE_NONE
+    ROLE_NOTHING
+    ROLE_FIGHT
+    ROLE_BOMB
+    ROLE_SETTLE
+    ROLE_PURE_SETTLE
+    ROLE_DEFEND
+    ROLE_RUNNER
+    ROLE_RABBIT
+    ROLE_KAMIKAZE
+    ROLE_COUNT
+
+
+cdef class RoleTable:
+    cdef readonly long capacity
+    cdef array.array _role
+    cdef array.array _planet
+    cdef array.array _previous_planet
+    cdef array.array _foe
+    cdef array.array _foe_owner
+    cdef array.array _player
+    cdef array.array _position
+    cdef long _counts[<int>ROLE_COUNT]
+    cdef list _members
+
+    cdef void _reserve(self, long ship_id)
+    cdef void _reset_record(self, long ship_id)
+
+    cpdef int role(self, long ship_id)
+    cpdef bint assigned(self, long ship_id)
+    cpdef void assign(self, long ship_id, int role, long planet=*)
+    cpdef void set_role(self, long ship_id, int role)
+    cpdef void clear(self, long ship_id)
+    cpdef long count(self, int role)
+    cpdef long planet(self, long ship_id)
+    cpdef void set_planet(self, long ship_id, long planet)
+    cpdef long previous_planet(self, long ship_id)
+    cpdef void set_previous_planet(self, long ship_id, long planet)
+    cpdef long foe(self, long ship_id)
+    cpdef long foe_owner(self, long ship_id)
+    cpdef void set_foe(self, long ship_id, long foe, long owner)
+    cpdef long player(self, long ship_id)
+    cpdef void set_player(self, long ship_id, long player)
+    cpdef object position(self, long ship_id)
+    cpdef void set_position(self, long ship_id, double x, double y, double radius)
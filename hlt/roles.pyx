@@ -0,0 +1,276 @@
+"""
+Role registry of the user's ships: one fixed-size record per ship id, stored in flat arrays indexed by the id
+(ship ids are small consecutive integers).
+
+A record holds the role code of the ship and its targets (planet, previous planet, foe, player, position),
+-1 / None when unset. The number of ships and the set of ship ids of each role are maintained when a role
+changes, so counting the fighters or listing the settlers never scans the table.
+"""
+from cpython cimport array
+import array
+
+from libc.math cimport isnan, NAN
+
+#: Role codes
+NONE = ROLE_NONE
+NOTHING = ROLE_NOTHING
+FIGHT = ROLE_FIGHT
+BOMB = ROLE_BOMB
+SETTLE = ROLE_SETTLE
+PURE_SETTLE = ROLE_PURE_SETTLE
+DEFEND = ROLE_DEFEND
+RUNNER = ROLE_RUNNER
+RABBIT = ROLE_RABBIT
+KAMIKAZE = ROLE_KAMIKAZE
+#: Name of each role, as the behavior implementing it (see entity.ACTIONS)
+ROLE_NAMES = ('none', 'nothing', 'fight', 'bomb', 'settle', 'pure_settle', 'defend', 'runner', 'rabbit',
+              'kamikaze')
+
+#: Initial number of records, grown by doubling
+DEFAULT_CAPACITY = 256
+#: Doubles of the position of a record: x, y, radius
+cdef int POSITION_SIZE = 3
+
+cdef array.array _SCHARS = array.array('b')
+cdef array.array _LONGS = array.array('l')
+cdef array.array _DOUBLES = array.array('d')
+
+
+cdef class RoleTable:
+    """
+    Roles and targets of the ships, by ship id.
+    A ship without a record (never assigned, or cleared) has the role NONE.
+
+    :ivar capacity: Number of ship ids the arrays can hold
+    """
+
+    def __init__(self, long capacity=DEFAULT_CAPACITY):
+        """
+        :param long capacity: Initial number of records
+        """
+        self.capacity = 0
+        self._role = array.clone(_SCHARS, 0, False)
+        self._planet = array.clone(_LONGS, 0, False)
+        self._previous_planet = array.clone(_LONGS, 0, False)
+        self._foe = array.clone(_LONGS, 0, False)
+        self._foe_owner = array.clone(_LONGS, 0, False)
+        self._player = array.clone(_LONGS, 0, False)
+        self._position = array.clone(_DOUBLES, 0, False)
+        self._members = [set() for _ in range(<int>ROLE_COUNT)]
+        cdef int role
+        for role in range(<int>ROLE_COUNT):
+            self._counts[role] = 0
+        self._reserve(max(capacity, 1) - 1)
+
+    cdef void _reserve(self, long ship_id):
+        """
+        Grow the arrays to hold the given ship id
+        """
+        cdef long capacity = max(self.capacity, 1)
+        cdef long old = self.capacity
+        cdef long i
+        if ship_id < 0:
+            raise ValueError("Invalid ship id {}".format(ship_id))
+        if ship_id < self.capacity:
+            return
+        while capacity <= ship_id:
+            capacity *= 2
+        array.resize(self._role, capacity)
+        array.resize(self._planet, capacity)
+        array.resize(self._previous_planet, capacity)
+        array.resize(self._foe, capacity)
+        array.resize(self._foe_owner, capacity)
+        array.resize(self._player, capacity)
+        array.resize(self._position, capacity * POSITION_SIZE)
+        self.capacity = capacity
+        for i in range(old, capacity):
+            self._role.data.as_schars[i] = ROLE_NONE
+            self._reset_record(i)
+
+    cdef void _reset_record(self, long ship_id):
+        self._planet.data.as_longs[ship_id] = -1
+        self._previous_planet.data.as_longs[ship_id] = -1
+        self._foe.data.as_longs[ship_id] = -1
+        self._foe_owner.data.as_longs[ship_id] = -1
+        self._player.data.as_longs[ship_id] = -1
+        self._position.data.as_doubles[ship_id * POSITION_SIZE] = NAN
+
+    cpdef int role(self, long ship_id):
+        """
+        :param long ship_id: Id of the ship
+        :return: The role code of the ship, NONE if unassigned
+        """
+        if ship_id < 0 or ship_id >= self.capacity:
+            return ROLE_NONE
+        return self._role.data.as_schars[ship_id]
+
+    cpdef bint assigned(self, long ship_id):
+        """
+        :param long ship_id: Id of the ship
+        :return: True if the ship has a role
+        """
+        return self.role(ship_id) != ROLE_NONE
+
+    cpdef void assign(self, long ship_id, int role, long planet=-1):
+        """
+        Give a new role to a ship, its previous targets are forgotten
+
+        :param long ship_id: Id of the ship
+        :param int role: Role code
+        :param long planet: Target planet id, -1 if none
+        """
+        self.set_role(ship_id, role)
+        self._reset_record(ship_id)
+        self._planet.data.as_longs[ship_id] = planet
+
+    cpdef void set_role(self, long ship_id, int role):
+        """
+        Change the role of a ship, its targets are kept
+
+        :param long ship_id: Id of the ship
+        :param int role: Role code
+        """
+        if role < 0 or role >= <int>ROLE_COUNT:
+            raise ValueError("Invalid role {}".format(role))
+        self._reserve(ship_id)
+        cdef int previous = self._role.data.as_schars[ship_id]
+        if previous == role:
+            return
+        if previous != ROLE_NONE:
+            self._counts[previous] -= 1
+            self._members[previous].discard(ship_id)
+        if role != ROLE_NONE:
+            self._counts[role] += 1
+            self._members[role].add(ship_id)
+        self._role.data.as_schars[ship_id] = role
+
+    cpdef void clear(self, long ship_id):
+        """
+        Remove the record of a ship: it needs a new assignment
+
+        :param long ship_id: Id of the ship
+        """
+        if self.role(ship_id) == ROLE_NONE:
+            return
+        self.set_role(ship_id, ROLE_NONE)
+        self._reset_record(ship_id)
+
+    def remove(self, ship_ids):
+        """
+        Remove the records of the ships which died
+
+        :param ship_ids: Ids of the ships
+        :return: nothing
+        """
+        for ship_id in ship_ids:
+            self.clear(ship_id)
+
+    cpdef long count(self, int role):
+        """
+        :param int role: Role code
+        :return: Number of ships with this role
+        """
+        if role < 0 or role >= <int>ROLE_COUNT:
+            raise ValueError("Invalid role {}".format(role))
+        return self._counts[role]
+
+    def ships(self, int role):
+        """
+        :param int role: Role code (but NONE)
+        :return: The ids of the ships with this role. The set is owned by the table: copy it before changing roles
+                 while iterating.
+        :rtype: set[int]
+        """
+        if role == ROLE_NONE:
+            raise ValueError("The unassigned ships are not tracked")
+        return self._members[role]
+
+    cpdef long planet(self, long ship_id):
+        """
+        :return: The target planet id of the ship, -1 if none
+        """
+        if ship_id < 0 or ship_id >= self.capacity:
+            return -1
+        return self._planet.data.as_longs[ship_id]
+
+    cpdef void set_planet(self, long ship_id, long planet):
+        self._reserve(ship_id)
+        self._planet.data.as_longs[ship_id] = planet
+
+    cpdef long previous_planet(self, long ship_id):
+        """
+        :return: The planet the ship was settling before defending, -1 if none
+        """
+        if ship_id < 0 or ship_id >= self.capacity:
+            return -1
+        return self._previous_planet.data.as_longs[ship_id]
+
+    cpdef void set_previous_planet(self, long ship_id, long planet):
+        self._reserve(ship_id)
+        self._previous_planet.data.as_longs[ship_id] = planet
+
+    cpdef long foe(self, long ship_id):
+        """
+        :return: The id of the foe ship targeted by the ship, -1 if none
+        """
+        if ship_id < 0 or ship_id >= self.capacity:
+            return -1
+        return self._foe.data.as_longs[ship_id]
+
+    cpdef long foe_owner(self, long ship_id):
+        """
+        :return: The player id of the foe ship targeted by the ship, -1 if none
+        """
+        if ship_id < 0 or ship_id >= self.capacity:
+            return -1
+        return self._foe_owner.data.as_longs[ship_id]
+
+    cpdef void set_foe(self, long ship_id, long foe, long owner):
+        """
+        :param long foe: Id of the targeted foe ship, -1 to forget the target
+        :param long owner: Player id of the foe ship
+        """
+        self._reserve(ship_id)
+        self._foe.data.as_longs[ship_id] = foe
+        self._foe_owner.data.as_longs[ship_id] = owner if foe >= 0 else -1
+
+    cpdef long player(self, long ship_id):
+        """
+        :return: The id of the player targeted by the ship, -1 if none
+        """
+        if ship_id < 0 or ship_id >= self.capacity:
+            return -1
+        return self._player.data.as_longs[ship_id]
+
+    cpdef void set_player(self, long ship_id, long player):
+        self._reserve(ship_id)
+        self._player.data.as_longs[ship_id] = player
+
+    cpdef object position(self, long ship_id):
+        """
+        :return: The position held by the ship (x, y, radius), None if none
+        :rtype: (float, float, float)
+        """
+        if ship_id < 0 or ship_id >= self.capacity:
+            return None
+        cdef double *position = self._position.data.as_doubles + ship_id * POSITION_SIZE
+        if isnan(position[0]):
+            return None
+        return position[0], position[1], position[2]
+
+    cpdef void set_position(self, long ship_id, double x, double y, double radius):
+        self._reserve(ship_id)
+        cdef double *position = self._position.data.as_doubles + ship_id * POSITION_SIZE
+        position[0] = x
+        position[1] = y
+        position[2] = radius
+
+    def __len__(self):
+        """
+        :return: Number of ships with a role
+        """
+        cdef long total = 0
+        cdef int role
+        for role in range(1, <int>ROLE_COUNT):
+            total += self._counts[role]
+        return total
@@ -0,0 +1,170 @@
+import logging
+import math
+import time
+
+from . import constants
+from .entity import Ship
+
+#: Wall-clock budget of a turn (seconds), measured from the reception of the map. The engine allows 2 seconds.
+TURN_BUDGET = 1.6
+#: Past this point even the fallback commands are skipped
+HARD_BUDGET = 1.85
+#: Weight of the last measure in the moving average of the cost of a ship
+COST_SMOOTHING = 0.2
+#: Margin applied to the predicted cost of the next ship
+COST_SAFETY = 1.5
+#: Number of corrections allowed to a fallback move
+FALLBACK_CORRECTIONS = 10
+
+
+def dockable(ship, planet, game_map):
+    """
+    Can the ship dock to the planet right now? The planet must be free or mine, with a free spot, and within reach:
+    the check of assign_ship, plus the distance. Bombers keep the foe planet they dive at in roles.planet.
+
+    :param Ship ship: The ship
+    :param Planet planet: The planet, or None
+    :param Map game_map: The map of the turn
+    :rtype: bool
+    """
+    return planet is not None and (planet.is_owned() is False or planet.owner.id == game_map.get_me().id) \
+        and not planet.is_full() and ship.can_dock(planet)
+
+
+def urgency(ship, game_map):
+    """
+    Sort key of a ship: the lower, the more urgent.
+    Ships which can dock right now come first (cheap and valuable), then the ships closest to an undocked foe.
+
+    :param Ship ship: The ship to rank
+    :param Map game_map: The map of the turn
+    :return: The sort key
+    :rtype: tuple
+    """
+    if dockable(ship, game_map.get_planet(game_map.roles.planet(ship.id)), game_map):
+        return 0, 0.0
+
+    for distance, _ in game_map.nearest_foes(ship, 1, status_filter=(Ship.DockingStatus.UNDOCKED,)):
+        return 1, distance
+    return 1, math.inf
+
+
+def fallback_command(ship, game_map):
+    """
+    Cheap command for a ship which did not fit in the budget: dock if possible, else a short-search move towards
+    the current target of the ship (the planet planned for it if it has no role yet), else nothing.
+
+    :param Ship ship: The ship
+    :param Map game_map: The map of the turn
+    :return: The command, or None
+    :rtype: str
+    """
+    # The ship skips assign_ship this turn: the slot planned for it goes back to the other ships, the planet stays
+    # its target
+    planned = game_map.release_settle_plan(ship)
+    roles = game_map.roles
+    target = game_map.get_planet(roles.planet(ship.id))
+    if target is None:
+        target = planned
+    if dockable(ship, target, game_map):
+        return ship.dock(target)
+    if target is None:
+        owner = game_map.get_player(roles.foe_owner(ship.id))
+        target = owner.get_ship(roles.foe(ship.id)) if owner is not None else None
+    if target is None:
+        return None
+    return ship.navigate(ship.closest_point_to(target), game_map, speed=constants.MAX_SPEED,
+                         max_corrections=FALLBACK_CORRECTIONS)
+
+
+class TurnScheduler:
+    """
+    Run the actions of the ships of a turn by decreasing urgency, as long as the next ship is predicted to fit in
+    the budget. The cost of a ship is tracked with an exponential moving average across turns.
+    The ships left over get a fallback command.
+
+    Only the undocked ships go through run(). The caller checks expired() before its other per-turn work
+    (defend_planet in MyBot.play_turn); the undock commands of the ships already undocking are exempt, they cost
+    a string each.
+
+    :ivar budget: Time (seconds) after which no new ship action is started
+    :ivar hard_budget: Time (seconds) after which no fallback command is computed
+    :ivar ship_cost: Moving average of the cost of one ship action (seconds)
+    :ivar scheduled: Number of ship actions run during the last turn
+    :ivar fallbacks: Number of fallback commands issued during the last turn
+    """
+
+    def __init__(self, budget=TURN_BUDGET, hard_budget=HARD_BUDGET, smoothing=COST_SMOOTHING, safety=COST_SAFETY,
+                 clock=time.time):
+        """
+        :param float budget: Time (seconds) after which no new ship action is started
+        :param float hard_budget: Time (seconds) after which no fallback command is computed
+        :param float smoothing: Weight of the last measure in the cost average
+        :param float safety: Margin applied to the predicted cost of the next ship
+        :param clock: Time source
+        """
+        self.budget = budget
+        self.hard_budget = hard_budget
+        self.smoothing = smoothing
+        self.safety = safety
+        self.clock = clock
+        self.ship_cost = 0.0
+        self.scheduled = 0
+        self.fallbacks = 0
+
+    def _record(self, cost):
+        if self.ship_cost == 0.0:
+            self.ship_cost = cost
+        else:
+            self.ship_cost += self.smoothing * (cost - self.ship_cost)
+
+    def expired(self, turn_start):
+        """
+        :param float turn_start: Time (clock) at which the map was received
+        :return: Is the hard budget exhausted? No more command should be computed then
+        :rtype: bool
+        """
+        return self.clock() - turn_start > self.hard_budget
+
+    def run(self, game_map, ships, action, turn_start, fallback=fallback_command):
+        """
+        Compute the commands of the given ships
+
+        :param Map game_map: The map of the turn
+        :param list[Ship] ships: The ships to command
+        :param action: action(ship, game_map) -> command or None
+        :param float turn_start: Time (clock) at which the map was received
+        :param fallback: fallback(ship, game_map) -> command or None, for the ships which don't fit in the budget
+        :return: The commands by ship id
+        :rtype: dict[int, str]
+        """
+        commands = {}
+        ordered = sorted(ships, key=lambda ship: urgency(ship, game_map))
+        self.scheduled = 0
+        self.fallbacks = 0
+
+        now = self.clock()
+        for ship in ordered:
+            if now - turn_start + self.ship_cost * self.safety > self.budget:
+                break
+            cmd = action(ship, game_map)
+            if cmd is not None:
+                commands[ship.id] = cmd
+            end = self.clock()
+            self._record(end - now)
+            now = end
+            self.scheduled += 1
+
+        left_over = ordered[self.scheduled:]
+        if left_over:
+            logging.warning('Turn budget reached after %s ships, %s ships on fallback', self.scheduled,
+                            len(left_over))
+        for ship in left_over:
+            if self.expired(turn_start):
+                break
+            cmd = fallback(ship, game_map)
+            if cmd is not None:
+                commands[ship.id] = cmd
+                self.fallbacks += 1
+
+        return commands
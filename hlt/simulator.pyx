@@ -0,0 +1,764 @@
+"""
+Fast forward simulator of Halite II: the state of a turn and the commands of the players (the strings of
+Ship.thrust / dock / undock) give the map description of the next turn, in the format of the Halite engine
+(see parsing.parse_map). Bots can play against each other in-process, thousands of turns per second, without the
+halite binary.
+
+A turn is played in the engine order:
+ 1. the docking / undocking ships make progress, the weapons cool down
+ 2. commands: a thrust sets the velocity of an undocked ship, dock / undock start a (un)docking of DOCK_TURNS turns.
+    A free planet docked to by several players in the same turn stays free.
+ 3. movement and combat, in continuous time over the turn. The events (two ships colliding, a ship hitting a planet
+    or leaving the map, enemy ships coming within WEAPON_RADIUS) are played by increasing time, simultaneous events
+    (within 1 / EVENT_TIME_PRECISION) together: the collisions first, then the attacks. A collision destroys both
+    ships; a planet hit loses the health of the ship. An undocked ship with a cool weapon fires once per turn, at its
+    first contact with enemies: WEAPON_DAMAGE is split between the enemies met at that time.
+ 4. the owned planets produce BASE_PRODUCTIVITY per docked ship (from their remaining resources), and spawn a ship
+    every SHIP_COST, SPAWN_RADIUS away from their surface, towards the center of the map
+ 5. the planets without health left explode: their docked ships are destroyed, the other ships lose health
+    linearly with their distance, up to EXPLOSION_RADIUS from the surface
+
+The ship ids are global (the next ship gets the largest id + 1), as Map expects.
+"""
+from libc.stdlib cimport malloc, realloc, free, qsort
+from libc.stdio cimport snprintf
+from libc.math cimport sqrt, cos, sin, atan2, ceil, round, M_PI
+
+from . import constants
+
+#: Production a planet needs to spawn a ship (engine rule, not sent to the bots)
+SHIP_COST = 72
+#: Events closer in time than 1 / EVENT_TIME_PRECISION (of a turn) are simultaneous
+EVENT_TIME_PRECISION = 10000
+#: Number of headings (every 360 / SPAWN_TRIES degrees) tried around a planet to find a free spawn position
+SPAWN_TRIES = 36
+
+cdef double _MAX_SPEED = constants.MAX_SPEED
+cdef double _SHIP_RADIUS = constants.SHIP_RADIUS
+cdef double _BASE_SHIP_HEALTH = constants.BASE_SHIP_HEALTH
+cdef int _WEAPON_COOLDOWN = constants.WEAPON_COOLDOWN
+cdef double _WEAPON_RADIUS = constants.WEAPON_RADIUS
+cdef double _WEAPON_DAMAGE = constants.WEAPON_DAMAGE
+cdef double _EXPLOSION_RADIUS = constants.EXPLOSION_RADIUS
+cdef double _DOCK_RADIUS = constants.DOCK_RADIUS
+cdef int _DOCK_TURNS = constants.DOCK_TURNS
+cdef long _BASE_PRODUCTIVITY = constants.BASE_PRODUCTIVITY
+cdef double _SPAWN_RADIUS = constants.SPAWN_RADIUS
+cdef long _SHIP_COST = SHIP_COST
+cdef double _EVENT_TIME_PRECISION = EVENT_TIME_PRECISION
+cdef int _SPAWN_TRIES = SPAWN_TRIES
+
+# Docking statuses, see entity.DockingStatus
+cdef enum:
+    UNDOCKED = 0
+    DOCKING = 1
+    DOCKED = 2
+    UNDOCKING = 3
+
+# Event kinds, in the order simultaneous events are played
+cdef enum EventKind:
+    EVENT_COLLISION
+    EVENT_PLANET
+    EVENT_BORDER
+    EVENT_ATTACK
+
+
+cdef struct SimShip:
+    long id
+    long owner
+    double x, y, vx, vy
+    double health
+    int status
+    # Index of the planet of a docking / docked / undocking ship, -1 if none
+    int planet
+    # Rank of the ship in the docked ships of its planet
+    long dock_order
+    int progress
+    int cooldown
+    bint alive
+    # Did the ship fire this turn? Ships which fired or are aimed at this turn accumulate damage
+    bint fired
+    int targets
+    double damage
+
+
+cdef struct SimPlanet:
+    long id
+    double x, y, radius, health
+    long spots, production, remaining
+    # Player id of the owner, -1 if none
+    long owner
+    bint alive
+
+
+cdef struct Event:
+    double time
+    EventKind kind
+    # Ships (a, b), ship and planet (a, b), or ship (a)
+    int a, b
+
+
+cdef struct SortKey:
+    double x
+    int index
+
+
+cdef int _compare_events(const void *first, const void *second) noexcept nogil:
+    cdef const Event *e1 = <const Event *> first
+    cdef const Event *e2 = <const Event *> second
+    if e1.time != e2.time:
+        return -1 if e1.time < e2.time else 1
+    if e1.kind != e2.kind:
+        return -1 if e1.kind < e2.kind else 1
+    if e1.a != e2.a:
+        return -1 if e1.a < e2.a else 1
+    return (e1.b > e2.b) - (e1.b < e2.b)
+
+
+cdef int _compare_keys(const void *first, const void *second) noexcept nogil:
+    cdef const SortKey *k1 = <const SortKey *> first
+    cdef const SortKey *k2 = <const SortKey *> second
+    if k1.x != k2.x:
+        return -1 if k1.x < k2.x else 1
+    return k1.index - k2.index
+
+
+cdef double _contact_time(double dx, double dy, double wx, double wy, double radius) noexcept nogil:
+    """
+    First time in [0, 1] at which two circles, dx, dy apart and moving at wx, wy from each other, come within radius
+    :return: The time, -1 if they don't
+    """
+    cdef double c = dx * dx + dy * dy - radius * radius
+    cdef double a, b, discriminant, t
+    if c <= 0:
+        return 0
+    a = wx * wx + wy * wy
+    b = 2 * (dx * wx + dy * wy)
+    if a == 0 or b >= 0:
+        return -1
+    discriminant = b * b - 4 * a * c
+    if discriminant < 0:
+        return -1
+    t = (-b - sqrt(discriminant)) / (2 * a)
+    return t if t <= 1 else -1
+
+
+cdef class Simulator:
+    """
+    State of a game, played turn by turn with step().
+
+    :ivar width: Map width
+    :ivar height: Map height
+    :ivar turn: Number of turns played
+    :ivar players: Ids of the players
+    """
+    cdef SimShip *_ships
+    cdef int _ship_count
+    cdef int _ship_capacity
+    cdef SimPlanet *_planets
+    cdef int _planet_count
+    cdef Event *_events
+    cdef int _event_count
+    cdef int _event_capacity
+    cdef char *_buffer
+    cdef Py_ssize_t _buffer_size
+    cdef Py_ssize_t _buffer_capacity
+    cdef long _next_id
+    cdef long _next_order
+    cdef dict _ship_index
+    cdef readonly double width
+    cdef readonly double height
+    cdef readonly long turn
+    cdef readonly tuple players
+
+    def __cinit__(self):
+        self._ships = NULL
+        self._planets = NULL
+        self._events = NULL
+        self._buffer = NULL
+        self._ship_count = self._ship_capacity = 0
+        self._planet_count = 0
+        self._event_count = self._event_capacity = 0
+        self._buffer_size = self._buffer_capacity = 0
+
+    def __dealloc__(self):
+        free(self._ships)
+        free(self._planets)
+        free(self._events)
+        free(self._buffer)
+
+    def __init__(self, game_map):
+        """
+        :param Map game_map: The state to start from (a parsed map)
+        """
+        cdef SimShip *ship
+        cdef SimPlanet *planet
+        cdef int i
+        self.width = game_map.width
+        self.height = game_map.height
+        self.turn = 0
+        self.players = tuple(sorted(player.id for player in game_map.all_players()))
+
+        planets = sorted(game_map.all_planets(), key=lambda entity: entity.id)
+        self._planet_count = len(planets)
+        self._planets = <SimPlanet *> malloc(max(self._planet_count, 1) * sizeof(SimPlanet))
+        if self._planets == NULL:
+            raise MemoryError()
+        planet_index = {}
+        docked = {}
+        self._next_order = 0
+        for i, entity in enumerate(planets):
+            planet = &self._planets[i]
+            planet.id = entity.id
+            planet.x = entity.pos.x
+            planet.y = entity.pos.y
+            planet.radius = entity.pos.radius
+            planet.health = entity.health
+            planet.spots = entity.num_docking_spots
+            planet.production = entity.current_production
+            planet.remaining = entity.remaining_resources
+            planet.owner = entity.owner_id
+            planet.alive = True
+            planet_index[entity.id] = i
+            for ship_id in entity._docked_ship_ids:
+                docked[ship_id] = (i, self._next_order)
+                self._next_order += 1
+
+        ships = sorted(game_map._all_ships(), key=lambda entity: entity.id)
+        self._reserve_ships(len(ships))
+        self._next_id = 0
+        for entity in ships:
+            ship = &self._ships[self._ship_count]
+            self._ship_count += 1
+            ship.id = entity.id
+            ship.owner = entity.owner_id
+            ship.x = entity.pos.x
+            ship.y = entity.pos.y
+            ship.vx = ship.vy = 0
+            ship.health = entity.health
+            ship.status = entity.docking_status
+            ship.planet = -1
+            ship.dock_order = 0
+            if ship.status != UNDOCKED:
+                if entity.id in docked:
+                    ship.planet, ship.dock_order = docked[entity.id]
+                elif entity.planet is not None:
+                    ship.planet = planet_index.get(entity.planet.id, -1)
+                    ship.dock_order = self._next_order
+                    self._next_order += 1
+                if ship.planet < 0:
+                    ship.status = UNDOCKED
+            ship.progress = entity._docking_progress
+            ship.cooldown = entity._weapon_cooldown
+            ship.alive = True
+            ship.fired = False
+            ship.targets = 0
+            ship.damage = 0
+            self._next_id = max(self._next_id, entity.id + 1)
+        self._index_ships()
+
+    cdef void _reserve_ships(self, int count) except *:
+        cdef int capacity = max(self._ship_capacity, 64)
+        cdef SimShip *ships
+        if count <= self._ship_capacity:
+            return
+        while capacity < count:
+            capacity *= 2
+        ships = <SimShip *> realloc(self._ships, capacity * sizeof(SimShip))
+        if ships == NULL:
+            raise MemoryError()
+        self._ships = ships
+        self._ship_capacity = capacity
+
+    cdef void _add_event(self, double time, EventKind kind, int a, int b) except *:
+        cdef int capacity
+        cdef Event *events
+        if self._event_count == self._event_capacity:
+            capacity = max(256, 2 * self._event_capacity)
+            events = <Event *> realloc(self._events, capacity * sizeof(Event))
+            if events == NULL:
+                raise MemoryError()
+            self._events = events
+            self._event_capacity = capacity
+        self._events[self._event_count].time = time
+        self._events[self._event_count].kind = kind
+        self._events[self._event_count].a = a
+        self._events[self._event_count].b = b
+        self._event_count += 1
+
+    cdef void _index_ships(self):
+        cdef int i
+        self._ship_index = {self._ships[i].id: i for i in range(self._ship_count)}
+
+    def step(self, commands):
+        """
+        Play a turn
+
+        :param dict commands: The commands of each player, by player id (iterables of command strings, as sent to
+                              the engine)
+        :return: The map description of the next turn
+        :rtype: bytes
+        """
+        self._progress()
+        self._apply_commands(commands)
+        self._collect_events()
+        self._play_events()
+        self._move()
+        self._produce()
+        self._explode()
+        self._release_planets()
+        self._compact()
+        self.turn += 1
+        return self.map_string()
+
+    cdef void _progress(self):
+        """
+        Docking progress and weapon cool down
+        """
+        cdef SimShip *ship
+        cdef int i
+        for i in range(self._ship_count):
+            ship = &self._ships[i]
+            if ship.cooldown > 0:
+                ship.cooldown -= 1
+            ship.fired = False
+            if ship.status == DOCKING or ship.status == UNDOCKING:
+                ship.progress -= 1
+                if ship.progress <= 0:
+                    ship.progress = 0
+                    if ship.status == DOCKING:
+                        ship.status = DOCKED
+                    else:
+                        ship.status = UNDOCKED
+                        ship.planet = -1
+
+    cdef void _apply_commands(self, commands) except *:
+        cdef SimShip *ship
+        cdef SimPlanet *planet
+        cdef int index, planet_index, i
+        cdef double angle, magnitude
+        cdef list docks = []
+        for player_id, player_commands in commands.items():
+            for command in player_commands:
+                parts = command.split()
+                if len(parts) < 2:
+                    continue
+                index = self._ship_index.get(int(parts[1]), -1)
+                if index < 0 or self._ships[index].owner != player_id:
+                    continue
+                ship = &self._ships[index]
+                if parts[0] == 't' and len(parts) == 4 and ship.status == UNDOCKED:
+                    magnitude = min(max(float(parts[2]), 0), _MAX_SPEED)
+                    angle = float(parts[3]) * M_PI / 180.0
+                    ship.vx = magnitude * cos(angle)
+                    ship.vy = magnitude * sin(angle)
+                elif parts[0] == 'd' and len(parts) == 3 and ship.status == UNDOCKED:
+                    planet_index = self._planet_index(int(parts[2]))
+                    if planet_index >= 0:
+                        docks.append((index, planet_index))
+                elif parts[0] == 'u' and ship.status == DOCKED:
+                    ship.status = UNDOCKING
+                    ship.progress = _DOCK_TURNS
+
+        if not docks:
+            return
+        # A free planet docked to by several players stays free
+        owners = {}
+        for index, planet_index in docks:
+            owners.setdefault(planet_index, set()).add(self._ships[index].owner)
+        occupied = {}
+        for i in range(self._ship_count):
+            if self._ships[i].planet >= 0:
+                occupied[self._ships[i].planet] = occupied.get(self._ships[i].planet, 0) + 1
+        for index, planet_index in docks:
+            ship = &self._ships[index]
+            planet = &self._planets[planet_index]
+            if planet.owner < 0 and len(owners[planet_index]) > 1:
+                continue
+            if planet.owner >= 0 and planet.owner != ship.owner:
+                continue
+            if occupied.get(planet_index, 0) >= planet.spots:
+                continue
+            if sqrt((ship.x - planet.x) ** 2 + (ship.y - planet.y) ** 2) > planet.radius + _DOCK_RADIUS + _SHIP_RADIUS:
+                continue
+            occupied[planet_index] = occupied.get(planet_index, 0) + 1
+            planet.owner = ship.owner
+            ship.status = DOCKING
+            ship.progress = _DOCK_TURNS
+            ship.planet = planet_index
+            ship.dock_order = self._next_order
+            self._next_order += 1
+            ship.vx = ship.vy = 0
+
+    cdef int _planet_index(self, long planet_id):
+        cdef int i
+        for i in range(self._planet_count):
+            if self._planets[i].id == planet_id and self._planets[i].alive:
+                return i
+        return -1
+
+    cdef void _collect_events(self) except *:
+        """
+        Find the events of the turn. Ships further apart than two moves and the weapon radius can't meet: the pairs
+        are swept along the x axis.
+        """
+        cdef int n = self._ship_count
+        cdef SortKey *keys = <SortKey *> malloc(max(n, 1) * sizeof(SortKey))
+        cdef double reach = 2 * _SHIP_RADIUS + _WEAPON_RADIUS + 2 * _MAX_SPEED
+        cdef SimShip *a
+        cdef SimShip *b
+        cdef SimPlanet *planet
+        cdef int i, j, k
+        cdef double t, end
+
+        if keys == NULL:
+            raise MemoryError()
+        self._event_count = 0
+        try:
+            for i in range(n):
+                keys[i].x = self._ships[i].x
+                keys[i].index = i
+            qsort(keys, n, sizeof(SortKey), _compare_keys)
+
+            for i in range(n):
+                a = &self._ships[keys[i].index]
+                for j in range(i + 1, n):
+                    if keys[j].x - keys[i].x > reach:
+                        break
+                    b = &self._ships[keys[j].index]
+                    if (a.vx != b.vx or a.vy != b.vy):
+                        t = _contact_time(b.x - a.x, b.y - a.y, b.vx - a.vx, b.vy - a.vy, 2 * _SHIP_RADIUS)
+                        if t >= 0:
+                            self._add_event(t, EVENT_COLLISION, min(keys[i].index, keys[j].index),
+                                            max(keys[i].index, keys[j].index))
+                    if a.owner != b.owner:
+                        t = _contact_time(b.x - a.x, b.y - a.y, b.vx - a.vx, b.vy - a.vy,
+                                          2 * _SHIP_RADIUS + _WEAPON_RADIUS)
+                        if t >= 0:
+                            self._add_event(t, EVENT_ATTACK, min(keys[i].index, keys[j].index),
+                                            max(keys[i].index, keys[j].index))
+        finally:
+            free(keys)
+
+        for i in range(n):
+            a = &self._ships[i]
+            if a.vx == 0 and a.vy == 0:
+                continue
+            for k in range(self._planet_count):
+                planet = &self._planets[k]
+                if not planet.alive:
+                    continue
+                t = _contact_time(planet.x - a.x, planet.y - a.y, -a.vx, -a.vy, _SHIP_RADIUS + planet.radius)
+                if t >= 0:
+                    self._add_event(t, EVENT_PLANET, i, k)
+            # Leaving the map
+            t = 2
+            end = a.x + a.vx
+            if end < 0:
+                t = min(t, -a.x / a.vx)
+            elif end > self.width:
+                t = min(t, (self.width - a.x) / a.vx)
+            end = a.y + a.vy
+            if end < 0:
+                t = min(t, -a.y / a.vy)
+            elif end > self.height:
+                t = min(t, (self.height - a.y) / a.vy)
+            if t <= 1:
+                self._add_event(max(t, 0), EVENT_BORDER, i, -1)
+
+        qsort(self._events, self._event_count, sizeof(Event), _compare_events)
+
+    cdef void _destroy(self, SimShip *ship):
+        ship.alive = False
+        ship.health = 0
+
+    cdef bint _can_fire(self, SimShip *ship):
+        return ship.alive and ship.status == UNDOCKED and ship.cooldown == 0 and not ship.fired
+
+    cdef void _play_events(self):
+        cdef Event *event
+        cdef SimShip *a
+        cdef SimShip *b
+        cdef SimPlanet *planet
+        cdef int start = 0
+        cdef int end, k
+        cdef double tick
+
+        while start < self._event_count:
+            tick = round(self._events[start].time * _EVENT_TIME_PRECISION)
+            end = start
+            while end < self._event_count and round(self._events[end].time * _EVENT_TIME_PRECISION) == tick:
+                end += 1
+
+            # Collisions first
+            for k in range(start, end):
+                event = &self._events[k]
+                a = &self._ships[event.a]
+                if event.kind == EVENT_ATTACK or not a.alive:
+                    continue
+                if event.kind == EVENT_COLLISION:
+                    b = &self._ships[event.b]
+                    if b.alive:
+                        self._destroy(a)
+                        self._destroy(b)
+                elif event.kind == EVENT_PLANET:
+                    planet = &self._planets[event.b]
+                    planet.health -= a.health
+                    self._destroy(a)
+                else:
+                    self._destroy(a)
+
+            # Then the attacks: each ship splits its damage between the enemies it meets now
+            for k in range(start, end):
+                event = &self._events[k]
+                if event.kind != EVENT_ATTACK:
+                    continue
+                a = &self._ships[event.a]
+                b = &self._ships[event.b]
+                if not a.alive or not b.alive:
+                    continue
+                if self._can_fire(a):
+                    a.targets += 1
+                if self._can_fire(b):
+                    b.targets += 1
+            for k in range(start, end):
+                event = &self._events[k]
+                if event.kind != EVENT_ATTACK:
+                    continue
+                a = &self._ships[event.a]
+                b = &self._ships[event.b]
+                if a.targets > 0 and b.alive:
+                    b.damage += _WEAPON_DAMAGE / a.targets
+                if b.targets > 0 and a.alive:
+                    a.damage += _WEAPON_DAMAGE / b.targets
+            for k in range(start, end):
+                event = &self._events[k]
+                if event.kind != EVENT_ATTACK:
+                    continue
+                self._settle_attack(&self._ships[event.a])
+                self._settle_attack(&self._ships[event.b])
+            start = end
+
+    cdef void _settle_attack(self, SimShip *ship):
+        """
+        End the attacks of a time for a ship: it fired if it had targets, it takes the damage dealt to it
+        """
+        if ship.targets > 0:
+            ship.targets = 0
+            ship.fired = True
+            ship.cooldown = _WEAPON_COOLDOWN
+        if ship.damage > 0:
+            ship.health -= ship.damage
+            ship.damage = 0
+            if ship.health <= 0:
+                self._destroy(ship)
+
+    cdef void _move(self):
+        cdef SimShip *ship
+        cdef int i
+        for i in range(self._ship_count):
+            ship = &self._ships[i]
+            if ship.alive:
+                ship.x += ship.vx
+                ship.y += ship.vy
+            ship.vx = ship.vy = 0
+
+    cdef void _produce(self) except *:
+        cdef SimPlanet *planet
+        cdef int i, k
+        cdef long docked, production
+        for k in range(self._planet_count):
+            planet = &self._planets[k]
+            if not planet.alive or planet.owner < 0:
+                continue
+            docked = 0
+            for i in range(self._ship_count):
+                if self._ships[i].alive and self._ships[i].planet == k and self._ships[i].status == DOCKED:
+                    docked += 1
+            production = min(_BASE_PRODUCTIVITY * docked, planet.remaining)
+            planet.production += production
+            planet.remaining -= production
+            while planet.production >= _SHIP_COST and self._spawn(planet):
+                planet.production -= _SHIP_COST
+
+    cdef bint _spawn(self, SimPlanet *planet) except *:
+        """
+        Spawn a ship of the owner of the planet on the first free position around it
+        :return: False if every position is taken
+        """
+        cdef double base = atan2(self.height / 2 - planet.y, self.width / 2 - planet.x)
+        cdef double distance = planet.radius + _SPAWN_RADIUS
+        cdef double angle, x, y
+        cdef int k, i, step
+        cdef bint free_position
+        cdef SimShip *ship
+        for k in range(_SPAWN_TRIES):
+            # Alternate around the heading to the center
+            step = (k + 1) // 2 if k % 2 == 1 else -(k // 2)
+            angle = base + step * 2 * M_PI / _SPAWN_TRIES
+            x = planet.x + distance * cos(angle)
+            y = planet.y + distance * sin(angle)
+            if x < _SHIP_RADIUS or y < _SHIP_RADIUS or x > self.width - _SHIP_RADIUS \
+                    or y > self.height - _SHIP_RADIUS:
+                continue
+            free_position = True
+            for i in range(self._ship_count):
+                ship = &self._ships[i]
+                if ship.alive and (ship.x - x) ** 2 + (ship.y - y) ** 2 < (2 * _SHIP_RADIUS) ** 2:
+                    free_position = False
+                    break
+            if not free_position:
+                continue
+            self._reserve_ships(self._ship_count + 1)
+            ship = &self._ships[self._ship_count]
+            self._ship_count += 1
+            ship.id = self._next_id
+            self._next_id += 1
+            ship.owner = planet.owner
+            ship.x = x
+            ship.y = y
+            ship.vx = ship.vy = 0
+            ship.health = _BASE_SHIP_HEALTH
+            ship.status = UNDOCKED
+            ship.planet = -1
+            ship.dock_order = 0
+            ship.progress = 0
+            ship.cooldown = 0
+            ship.alive = True
+            ship.fired = False
+            ship.targets = 0
+            ship.damage = 0
+            return True
+        return False
+
+    cdef void _explode(self):
+        cdef SimPlanet *planet
+        cdef SimShip *ship
+        cdef int i, k
+        cdef double distance
+        for k in range(self._planet_count):
+            planet = &self._planets[k]
+            if not planet.alive or planet.health > 0:
+                continue
+            planet.alive = False
+            for i in range(self._ship_count):
+                ship = &self._ships[i]
+                if not ship.alive:
+                    continue
+                if ship.planet == k:
+                    self._destroy(ship)
+                    continue
+                distance = sqrt((ship.x - planet.x) ** 2 + (ship.y - planet.y) ** 2) - planet.radius
+                if distance < _EXPLOSION_RADIUS:
+                    ship.health -= _BASE_SHIP_HEALTH * (1 - max(distance, 0) / _EXPLOSION_RADIUS)
+                    if ship.health <= 0:
+                        self._destroy(ship)
+
+    cdef void _release_planets(self):
+        """
+        A planet without docked ships has no owner
+        """
+        cdef int i, k
+        cdef bint occupied
+        for k in range(self._planet_count):
+            if self._planets[k].owner < 0:
+                continue
+            occupied = False
+            for i in range(self._ship_count):
+                if self._ships[i].alive and self._ships[i].planet == k:
+                    occupied = True
+                    break
+            if not occupied:
+                self._planets[k].owner = -1
+
+    cdef void _compact(self):
+        """
+        Drop the destroyed ships, keeping the order of the others
+        """
+        cdef int i
+        cdef int count = 0
+        for i in range(self._ship_count):
+            if self._ships[i].alive:
+                if count != i:
+                    self._ships[count] = self._ships[i]
+                count += 1
+        self._ship_count = count
+        self._index_ships()
+
+    cdef void _write(self, const char *fragment, Py_ssize_t length) except *:
+        cdef Py_ssize_t capacity = max(self._buffer_capacity, 4096)
+        cdef char *buffer
+        if self._buffer_size + length + 1 > self._buffer_capacity:
+            while self._buffer_size + length + 1 > capacity:
+                capacity *= 2
+            buffer = <char *> realloc(self._buffer, capacity)
+            if buffer == NULL:
+                raise MemoryError()
+            self._buffer = buffer
+            self._buffer_capacity = capacity
+        for i in range(length):
+            self._buffer[self._buffer_size + i] = fragment[i]
+        self._buffer_size += length
+
+    def map_string(self):
+        """
+        :return: The map description of the current state, in the engine format
+        :rtype: bytes
+        """
+        cdef char fragment[256]
+        cdef int length, i, k
+        cdef SimShip *ship
+        cdef SimPlanet *planet
+        cdef long count
+        self._buffer_size = 0
+
+        length = snprintf(fragment, sizeof(fragment), b"%d", <int> len(self.players))
+        self._write(fragment, length)
+        for player_id in self.players:
+            count = 0
+            for i in range(self._ship_count):
+                count += self._ships[i].owner == player_id
+            length = snprintf(fragment, sizeof(fragment), b" %ld %ld", <long> player_id, count)
+            self._write(fragment, length)
+            for i in range(self._ship_count):
+                ship = &self._ships[i]
+                if ship.owner != player_id:
+                    continue
+                length = snprintf(fragment, sizeof(fragment), b" %ld %.4f %.4f %ld 0.0 0.0 %d %ld %d %d",
+                                  ship.id, ship.x, ship.y, <long> ceil(ship.health), ship.status,
+                                  self._planets[ship.planet].id if ship.planet >= 0 else 0, ship.progress,
+                                  ship.cooldown)
+                self._write(fragment, length)
+
+        count = 0
+        for k in range(self._planet_count):
+            count += self._planets[k].alive
+        length = snprintf(fragment, sizeof(fragment), b" %ld", count)
+        self._write(fragment, length)
+        for k in range(self._planet_count):
+            planet = &self._planets[k]
+            if not planet.alive:
+                continue
+            docked = sorted((self._ships[i].dock_order, self._ships[i].id) for i in range(self._ship_count)
+                            if self._ships[i].planet == k)
+            length = snprintf(fragment, sizeof(fragment), b" %ld %.4f %.4f %ld %.4f %ld %ld %ld %d %ld %d",
+                              planet.id, planet.x, planet.y, <long> ceil(planet.health), planet.radius, planet.spots,
+                              planet.production, planet.remaining, planet.owner >= 0,
+                              planet.owner if planet.owner >= 0 else 0, <int> len(docked))
+            self._write(fragment, length)
+            for _, ship_id in docked:
+                length = snprintf(fragment, sizeof(fragment), b" %ld", <long> ship_id)
+                self._write(fragment, length)
+        return self._buffer[:self._buffer_size]
+
+
+def simulate(game_map, commands):
+    """
+    Play one turn from the state of a map
+
+    :param Map game_map: The current state
+    :param dict commands: The commands of each player, by player id
+    :return: The map description of the next turn
+    :rtype: bytes
+    """
+    return Simulator(game_map).step(commands)
@@ -0,0 +1,146 @@
+import numpy as np
+
+
+class WorldSnapshot:
+    """
+    Columnar (struct of arrays) view of the state of a turn. Rows of the ship arrays follow Map._all_ships(),
+    rows of the planet arrays follow Map.all_planets(). The distance matrices are only computed when first used.
+
+    :ivar ships: The ships, in row order
+    :ivar ship_ids: Ship ids
+    :ivar ship_x: Ship x-coordinates
+    :ivar ship_y: Ship y-coordinates
+    :ivar ship_radius: Ship radii
+    :ivar ship_health: Ship health
+    :ivar ship_owner: Id of the owner of each ship
+    :ivar ship_docking_status: Docking status of each ship (DockingStatus value)
+    :ivar ship_planet: Id of the planet each ship is docked to, -1 if none
+    :ivar my_rows: Rows of the user's ships
+    :ivar foe_rows: Rows of the foe ships, in Map.get_foe_ships() order
+    :ivar planets: The planets, in row order
+    :ivar planet_ids: Planet ids
+    :ivar planet_x: Planet x-coordinates
+    :ivar planet_y: Planet y-coordinates
+    :ivar planet_radius: Planet radii
+    :ivar planet_health: Planet health
+    :ivar planet_owner: Id of the owner of each planet, -1 if none
+    :ivar planet_docking_spots: Number of docking spots of each planet
+    """
+
+    def __init__(self, game_map):
+        """
+        :param Map game_map: The map of the turn
+        """
+        self.ships = game_map._all_ships()
+        self.planets = game_map.all_planets()
+
+        ship_count = len(self.ships)
+        self.ship_ids = np.empty(ship_count, dtype=np.int64)
+        self.ship_x = np.empty(ship_count, dtype=np.float64)
+        self.ship_y = np.empty(ship_count, dtype=np.float64)
+        self.ship_radius = np.empty(ship_count, dtype=np.float64)
+        self.ship_health = np.empty(ship_count, dtype=np.float64)
+        self.ship_owner = np.empty(ship_count, dtype=np.int64)
+        self.ship_docking_status = np.empty(ship_count, dtype=np.int64)
+        self.ship_planet = np.empty(ship_count, dtype=np.int64)
+        for row, ship in enumerate(self.ships):
+            self.ship_ids[row] = ship.id
+            self.ship_x[row] = ship.pos.x
+            self.ship_y[row] = ship.pos.y
+            self.ship_radius[row] = ship.pos.radius
+            self.ship_health[row] = ship.health
+            self.ship_owner[row] = ship.owner_id
+            self.ship_docking_status[row] = ship.docking_status
+            self.ship_planet[row] = ship.planet.id if ship.planet is not None else -1
+
+        # Planets never move: their geometry comes from the tables computed at the start of the game
+        static = game_map.static_geometry
+        planet_rows = static.rows(self.planets)
+        self.planet_ids = static.planet_ids[planet_rows]
+        self.planet_x = static.planet_x[planet_rows]
+        self.planet_y = static.planet_y[planet_rows]
+        self.planet_radius = static.planet_radius[planet_rows]
+        self.planet_docking_spots = static.docking_spots[planet_rows]
+        planet_count = len(self.planets)
+        self.planet_health = np.empty(planet_count, dtype=np.float64)
+        self.planet_owner = np.empty(planet_count, dtype=np.int64)
+        for row, planet in enumerate(self.planets):
+            self.planet_health[row] = planet.health
+            self.planet_owner[row] = planet.owner_id
+
+        mine = self.ship_owner == game_map.my_id
+        self.my_rows = np.flatnonzero(mine)
+        self.foe_rows = np.flatnonzero(~mine)
+        self.foe_ships = [self.ships[row] for row in self.foe_rows]
+
+        self._ship_row = {ship.id: row for row, ship in enumerate(self.ships)}
+        self._my_row = {self.ships[row].id: i for i, row in enumerate(self.my_rows)}
+        self._planet_row = {planet.id: row for row, planet in enumerate(self.planets)}
+        self._my_foe_distances = None
+        self._ship_planet_distances = None
+
+    @staticmethod
+    def _distances(x1, y1, x2, y2):
+        # Same operations as navigation.calculate_distance_between, so the values are bit for bit identical
+        return np.sqrt((x1[:, None] - x2[None, :]) ** 2 + (y1[:, None] - y2[None, :]) ** 2)
+
+    @property
+    def my_foe_distances(self):
+        """
+        :return: Distances between the user's ships (rows) and the foe ships (columns)
+        :rtype: numpy.ndarray
+        """
+        if self._my_foe_distances is None:
+            self._my_foe_distances = self._distances(self.ship_x[self.my_rows], self.ship_y[self.my_rows],
+                                                     self.ship_x[self.foe_rows], self.ship_y[self.foe_rows])
+        return self._my_foe_distances
+
+    @property
+    def ship_planet_distances(self):
+        """
+        :return: Distances between all the ships (rows) and the planets (columns)
+        :rtype: numpy.ndarray
+        """
+        if self._ship_planet_distances is None:
+            self._ship_planet_distances = self._distances(self.ship_x, self.ship_y, self.planet_x, self.planet_y)
+        return self._ship_planet_distances
+
+    def ship_row(self, ship):
+        """
+        :param Ship ship: A ship of the turn
+        :return: The row of the ship in the ship arrays
+        :rtype: int
+        """
+        return self._ship_row[ship.id]
+
+    def planet_row(self, planet):
+        """
+        :param Planet planet: A planet of the turn
+        :return: The row of the planet in the planet arrays
+        :rtype: int
+        """
+        return self._planet_row[planet.id]
+
+    def foe_distances(self, ship):
+        """
+        :param Ship ship: One of the user's ships
+        :return: Distances between the ship and every foe ship, in foe_ships order
+        :rtype: numpy.ndarray
+        """
+        return self.my_foe_distances[self._my_row[ship.id]]
+
+    def planet_distances(self, ship):
+        """
+        :param Ship ship: A ship of the turn
+        :return: Distances between the ship and every planet, in planets order
+        :rtype: numpy.ndarray
+        """
+        return self.ship_planet_distances[self._ship_row[ship.id]]
+
+    def planet_foe_distances(self, planet):
+        """
+        :param Planet planet: A planet of the turn
+        :return: Distances between the planet and every foe ship, in foe_ships order
+        :rtype: numpy.ndarray
+        """
+        return self.ship_planet_distances[self.foe_rows, self._planet_row[planet.id]]
@@ -0,0 +1,63 @@
+cdef class SpatialGrid:
+    cdef readonly double width
+    cdef readonly double height
+    cdef readonly double cell_size
+    cdef readonly int cols
+    cdef readonly int rows
+    cdef readonly list entities
+
+    cdef int _size
+    cdef double *_x
+    cdef double *_y
+    cdef double *_r
+    cdef int *_cell_start
+    cdef int *_cell_items
+    cdef int *_stamp
+    cdef int _stamp_id
+
+    cdef int _col(self, double x)
+    cdef int _row(self, double y)
+    cdef void _release(self)
+    cdef int _next_stamp(self)
+
+    cpdef build(self, list entities)
+    cpdef list query_radius(self, double x, double y, double radius)
+    cpdef list query_segment(self, double x1, double y1, double x2, double y2, double fudge)
+
+
+cdef class GhostRegistry:
+    cdef readonly double width
+    cdef readonly double height
+    cdef readonly double cell_size
+    cdef readonly int cols
+    cdef readonly int rows
+    cdef readonly list ghosts
+    cdef readonly long checked
+    cdef readonly long skipped
+
+    cdef int _count
+    cdef int _capacity
+    cdef double *_start_x
+    cdef double *_start_y
+    cdef double *_ghost_x
+    cdef double *_ghost_y
+    cdef double *_ghost_r
+    cdef int *_stamp
+    cdef int _stamp_id
+    cdef int *_head
+    cdef int _slots
+    cdef int _slot_capacity
+    cdef int *_slot_ghost
+    cdef int *_slot_next
+
+    cdef int _col(self, double x)
+    cdef int _row(self, double y)
+    cdef void _grow(self) except *
+    cdef void _push_slot(self, int cell, int ghost) except *
+    cdef list _collect(self, int row0, int row1, int col0, int col1, double x1, double y1, double x2, double y2,
+                       double reach)
+
+    cpdef add(self, tuple ghost)
+    cpdef clear(self)
+    cpdef list query_segment(self, double x1, double y1, double x2, double y2, double reach)
+    cpdef list query_radius(self, double x, double y, double radius)
@@ -0,0 +1,558 @@
+from libc.stdlib cimport malloc, calloc, realloc, free
+from libc.math cimport sqrt, floor
+import heapq
+
+#: Side of a grid cell. Roughly one ship move plus the assassin avoid radius.
+DEFAULT_CELL_SIZE = 10.0
+#: Margin added to the pre-filters so that borderline cases are always handed to the exact tests
+QUERY_EPSILON = 1e-6
+
+
+cdef inline double _segment_distance2(double px, double py, double x1, double y1, double x2, double y2):
+    """
+    Squared distance between the point (px, py) and the segment [(x1, y1), (x2, y2)]
+    """
+    cdef double dx = x2 - x1
+    cdef double dy = y2 - y1
+    cdef double a = dx * dx + dy * dy
+    cdef double t = 0
+    if a > 0:
+        t = ((px - x1) * dx + (py - y1) * dy) / a
+        if t < 0:
+            t = 0
+        elif t > 1:
+            t = 1
+    dx = x1 + t * dx - px
+    dy = y1 + t * dy - py
+    return dx * dx + dy * dy
+
+
+cdef class SpatialGrid:
+    """
+    Uniform grid bucketing circles (ships, planets) over the map, rebuilt once per turn.
+
+    Each entity is stored in every cell its bounding box covers, so queries only have to look at the cells
+    around the query shape, whatever the radius of the entities.
+
+    :ivar width: Width of the indexed area
+    :ivar height: Height of the indexed area
+    :ivar cell_size: Side of a cell
+    :ivar entities: The indexed entities, in insertion order
+    """
+
+    def __cinit__(self, double width, double height, double cell_size=DEFAULT_CELL_SIZE):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.cols = max(1, <int> (width / cell_size) + 1)
+        self.rows = max(1, <int> (height / cell_size) + 1)
+        self.entities = []
+        self._size = 0
+        self._x = NULL
+        self._y = NULL
+        self._r = NULL
+        self._stamp = NULL
+        self._cell_items = NULL
+        self._cell_start = <int *> calloc(self.cols * self.rows + 1, sizeof(int))
+        if self._cell_start == NULL:
+            raise MemoryError()
+        self._stamp_id = 0
+
+    def __dealloc__(self):
+        self._release()
+        free(self._cell_start)
+
+    def __len__(self):
+        return self._size
+
+    def __reduce__(self):
+        # Pickle / deepcopy support: the cells are rebuilt from the entities
+        return _rebuild_grid, (self.width, self.height, self.cell_size, self.entities)
+
+    cdef void _release(self):
+        free(self._x)
+        free(self._y)
+        free(self._r)
+        free(self._stamp)
+        free(self._cell_items)
+        self._x = NULL
+        self._y = NULL
+        self._r = NULL
+        self._stamp = NULL
+        self._cell_items = NULL
+        self._size = 0
+
+    cdef int _col(self, double x):
+        cdef int col = <int> floor(x / self.cell_size)
+        if col < 0:
+            return 0
+        if col >= self.cols:
+            return self.cols - 1
+        return col
+
+    cdef int _row(self, double y):
+        cdef int row = <int> floor(y / self.cell_size)
+        if row < 0:
+            return 0
+        if row >= self.rows:
+            return self.rows - 1
+        return row
+
+    cdef int _next_stamp(self):
+        """
+        Return a fresh query stamp, used to report an entity spanning several cells only once
+        """
+        cdef int i
+        self._stamp_id += 1
+        if self._stamp_id == 0x7fffffff:
+            for i in range(self._size):
+                self._stamp[i] = 0
+            self._stamp_id = 1
+        return self._stamp_id
+
+    cpdef build(self, list entities):
+        """
+        (Re)build the grid from the given entities
+
+        :param list entities: Entities to index (needs a pos attribute with x, y, radius)
+        :return: nothing
+        """
+        cdef int n = len(entities)
+        cdef int ncells = self.cols * self.rows
+        cdef int i, c, r, col0, col1, row0, row1
+        cdef double x, y, radius
+        cdef int *fill
+
+        self._release()
+        self.entities = entities
+        self._stamp_id = 0
+        if n == 0:
+            for c in range(ncells + 1):
+                self._cell_start[c] = 0
+            return
+
+        self._x = <double *> malloc(n * sizeof(double))
+        self._y = <double *> malloc(n * sizeof(double))
+        self._r = <double *> malloc(n * sizeof(double))
+        self._stamp = <int *> calloc(n, sizeof(int))
+        fill = <int *> calloc(ncells, sizeof(int))
+        if self._x == NULL or self._y == NULL or self._r == NULL or self._stamp == NULL or fill == NULL:
+            free(fill)
+            self._release()
+            raise MemoryError()
+        self._size = n
+
+        for i in range(n):
+            pos = entities[i].pos
+            x = pos.x
+            y = pos.y
+            radius = pos.radius
+            self._x[i] = x
+            self._y[i] = y
+            self._r[i] = radius
+            for r in range(self._row(y - radius), self._row(y + radius) + 1):
+                for c in range(self._col(x - radius), self._col(x + radius) + 1):
+                    fill[r * self.cols + c] += 1
+
+        # Prefix sum of the cell occupancy
+        self._cell_start[0] = 0
+        for c in range(ncells):
+            self._cell_start[c + 1] = self._cell_start[c] + fill[c]
+            fill[c] = self._cell_start[c]
+
+        self._cell_items = <int *> malloc(max(1, self._cell_start[ncells]) * sizeof(int))
+        if self._cell_items == NULL:
+            free(fill)
+            self._release()
+            raise MemoryError()
+
+        for i in range(n):
+            x = self._x[i]
+            y = self._y[i]
+            radius = self._r[i]
+            row0 = self._row(y - radius)
+            row1 = self._row(y + radius)
+            col0 = self._col(x - radius)
+            col1 = self._col(x + radius)
+            for r in range(row0, row1 + 1):
+                for c in range(col0, col1 + 1):
+                    self._cell_items[fill[r * self.cols + c]] = i
+                    fill[r * self.cols + c] += 1
+        free(fill)
+
+    cpdef list query_radius(self, double x, double y, double radius):
+        """
+        Find the entities whose circle overlaps the disc of the given radius around (x, y)
+
+        :param double x: x-coordinate of the center
+        :param double y: y-coordinate of the center
+        :param double radius: radius of the disc
+        :return: the entities, in insertion order
+        :rtype: list
+        """
+        cdef int stamp = self._next_stamp()
+        cdef int r, c, k, i
+        cdef double dx, dy, reach
+        cdef list found = []
+
+        for r in range(self._row(y - radius), self._row(y + radius) + 1):
+            for c in range(self._col(x - radius), self._col(x + radius) + 1):
+                for k in range(self._cell_start[r * self.cols + c], self._cell_start[r * self.cols + c + 1]):
+                    i = self._cell_items[k]
+                    if self._stamp[i] == stamp:
+                        continue
+                    self._stamp[i] = stamp
+                    dx = self._x[i] - x
+                    dy = self._y[i] - y
+                    reach = radius + self._r[i] + QUERY_EPSILON
+                    if dx * dx + dy * dy <= reach * reach:
+                        found.append(i)
+        found.sort()
+        return [self.entities[i] for i in found]
+
+    cpdef list query_segment(self, double x1, double y1, double x2, double y2, double fudge):
+        """
+        Find the entities whose circle, inflated by fudge, may be crossed by the segment [(x1, y1), (x2, y2)].
+        This is a pre-filter: the caller still has to run the exact intersection test.
+
+        :param double x1: x-coordinate of the segment start
+        :param double y1: y-coordinate of the segment start
+        :param double x2: x-coordinate of the segment end
+        :param double y2: y-coordinate of the segment end
+        :param double fudge: additional distance to leave between the segment and the circles
+        :return: the candidate entities, in insertion order
+        :rtype: list
+        """
+        cdef int stamp = self._next_stamp()
+        cdef int r, c, k, i
+        cdef double reach
+        cdef double half = self.cell_size / 2
+        cdef double cell_reach = fudge + half * 1.4142135623730951 + QUERY_EPSILON
+        cdef list found = []
+
+        for r in range(self._row(min(y1, y2) - fudge), self._row(max(y1, y2) + fudge) + 1):
+            for c in range(self._col(min(x1, x2) - fudge), self._col(max(x1, x2) + fudge) + 1):
+                # Skip the cells of the bounding box which are far from the segment itself
+                if _segment_distance2(c * self.cell_size + half, r * self.cell_size + half,
+                                      x1, y1, x2, y2) > cell_reach * cell_reach:
+                    continue
+                for k in range(self._cell_start[r * self.cols + c], self._cell_start[r * self.cols + c + 1]):
+                    i = self._cell_items[k]
+                    if self._stamp[i] == stamp:
+                        continue
+                    self._stamp[i] = stamp
+                    reach = self._r[i] + fudge + QUERY_EPSILON
+                    if _segment_distance2(self._x[i], self._y[i], x1, y1, x2, y2) <= reach * reach:
+                        found.append(i)
+        found.sort()
+        return [self.entities[i] for i in found]
+
+    def nearest(self, double x, double y, double max_distance=-1):
+        """
+        Iterate over the entities by increasing distance between (x, y) and their center.
+        Entities at the same distance come in insertion order.
+
+        :param double x: x-coordinate of the query point
+        :param double y: y-coordinate of the query point
+        :param double max_distance: Stop after this distance (negative: no limit)
+        :return: generator of (distance, entity)
+        """
+        cdef int cx = self._col(x)
+        cdef int cy = self._row(y)
+        cdef int max_ring = max(self.cols, self.rows)
+        cdef int ring, r, c, k, i
+        cdef double bound, distance
+        cdef list heap = []
+        cdef set seen = set()
+
+        for ring in range(max_ring + 1):
+            for r in range(max(0, cy - ring), min(self.rows - 1, cy + ring) + 1):
+                for c in range(max(0, cx - ring), min(self.cols - 1, cx + ring) + 1):
+                    # Only the border of the square is new in this ring
+                    if r != cy - ring and r != cy + ring and c != cx - ring and c != cx + ring:
+                        continue
+                    for k in range(self._cell_start[r * self.cols + c], self._cell_start[r * self.cols + c + 1]):
+                        i = self._cell_items[k]
+                        if i in seen:
+                            continue
+                        seen.add(i)
+                        distance = sqrt(((x - self._x[i]) ** 2) + ((y - self._y[i]) ** 2))
+                        if max_distance < 0 or distance <= max_distance:
+                            heapq.heappush(heap, (distance, i))
+
+            # Nothing in the next rings can be closer than this
+            bound = ring * self.cell_size
+            while heap and heap[0][0] <= bound:
+                distance, i = heapq.heappop(heap)
+                yield distance, self.entities[i]
+            if 0 <= max_distance < bound:
+                return
+
+        while heap:
+            distance, i = heapq.heappop(heap)
+            yield distance, self.entities[i]
+
+
+def _rebuild_grid(width, height, cell_size, entities):
+    grid = SpatialGrid(width, height, cell_size)
+    grid.build(entities)
+    return grid
+
+
+cdef class GhostRegistry:
+    """
+    Store of the moves committed during the turn (start position, ghost = future position).
+    Each move is bucketed as it is added in the cells covered by its segment, inflated by the ghost radius,
+    so a navigation only looks at the ghosts near its own path.
+
+    :ivar ghosts: The (start, ghost) tuples, in insertion order
+    :ivar checked: Number of ghosts handed to the exact tests since the last reset_counters()
+    :ivar skipped: Number of ghosts skipped by the index since the last reset_counters()
+    """
+
+    def __cinit__(self, double width, double height, double cell_size=DEFAULT_CELL_SIZE):
+        cdef int i
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.cols = max(1, <int> (width / cell_size) + 1)
+        self.rows = max(1, <int> (height / cell_size) + 1)
+        self.ghosts = []
+        self.checked = 0
+        self.skipped = 0
+        self._count = 0
+        self._capacity = 0
+        self._start_x = NULL
+        self._start_y = NULL
+        self._ghost_x = NULL
+        self._ghost_y = NULL
+        self._ghost_r = NULL
+        self._stamp = NULL
+        self._stamp_id = 0
+        self._slots = 0
+        self._slot_capacity = 0
+        self._slot_ghost = NULL
+        self._slot_next = NULL
+        self._head = <int *> malloc(self.cols * self.rows * sizeof(int))
+        if self._head == NULL:
+            raise MemoryError()
+        for i in range(self.cols * self.rows):
+            self._head[i] = -1
+
+    def __dealloc__(self):
+        free(self._start_x)
+        free(self._start_y)
+        free(self._ghost_x)
+        free(self._ghost_y)
+        free(self._ghost_r)
+        free(self._stamp)
+        free(self._slot_ghost)
+        free(self._slot_next)
+        free(self._head)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return iter(self.ghosts)
+
+    def __reduce__(self):
+        return _rebuild_ghosts, (self.width, self.height, self.cell_size, self.ghosts)
+
+    cdef int _col(self, double x):
+        cdef int col = <int> floor(x / self.cell_size)
+        if col < 0:
+            return 0
+        if col >= self.cols:
+            return self.cols - 1
+        return col
+
+    cdef int _row(self, double y):
+        cdef int row = <int> floor(y / self.cell_size)
+        if row < 0:
+            return 0
+        if row >= self.rows:
+            return self.rows - 1
+        return row
+
+    cdef void _grow(self) except *:
+        cdef int capacity = max(64, 2 * self._capacity)
+        cdef double *start_x = <double *> realloc(self._start_x, capacity * sizeof(double))
+        if start_x != NULL:
+            self._start_x = start_x
+        cdef double *start_y = <double *> realloc(self._start_y, capacity * sizeof(double))
+        if start_y != NULL:
+            self._start_y = start_y
+        cdef double *ghost_x = <double *> realloc(self._ghost_x, capacity * sizeof(double))
+        if ghost_x != NULL:
+            self._ghost_x = ghost_x
+        cdef double *ghost_y = <double *> realloc(self._ghost_y, capacity * sizeof(double))
+        if ghost_y != NULL:
+            self._ghost_y = ghost_y
+        cdef double *ghost_r = <double *> realloc(self._ghost_r, capacity * sizeof(double))
+        if ghost_r != NULL:
+            self._ghost_r = ghost_r
+        cdef int *stamp = <int *> realloc(self._stamp, capacity * sizeof(int))
+        if stamp != NULL:
+            self._stamp = stamp
+        if start_x == NULL or start_y == NULL or ghost_x == NULL or ghost_y == NULL or ghost_r == NULL \
+                or stamp == NULL:
+            raise MemoryError()
+        self._capacity = capacity
+
+    cdef void _push_slot(self, int cell, int ghost) except *:
+        cdef int capacity
+        cdef int *slot_ghost
+        cdef int *slot_next
+        if self._slots == self._slot_capacity:
+            capacity = max(256, 2 * self._slot_capacity)
+            slot_ghost = <int *> realloc(self._slot_ghost, capacity * sizeof(int))
+            if slot_ghost != NULL:
+                self._slot_ghost = slot_ghost
+            slot_next = <int *> realloc(self._slot_next, capacity * sizeof(int))
+            if slot_next != NULL:
+                self._slot_next = slot_next
+            if slot_ghost == NULL or slot_next == NULL:
+                raise MemoryError()
+            self._slot_capacity = capacity
+        self._slot_ghost[self._slots] = ghost
+        self._slot_next[self._slots] = self._head[cell]
+        self._head[cell] = self._slots
+        self._slots += 1
+
+    cpdef add(self, tuple ghost):
+        """
+        Register a committed move
+
+        :param tuple ghost: (start, ghost): the current position of the ship and its future position (Circles)
+        :return: nothing
+        """
+        cdef int i = self._count
+        cdef int r, c
+        cdef double radius
+        start, future = ghost
+        if self._count == self._capacity:
+            self._grow()
+        self._start_x[i] = start.x
+        self._start_y[i] = start.y
+        self._ghost_x[i] = future.x
+        self._ghost_y[i] = future.y
+        self._ghost_r[i] = radius = future.radius
+        self._stamp[i] = 0
+        self._count += 1
+        self.ghosts.append(ghost)
+
+        for r in range(self._row(min(self._start_y[i], self._ghost_y[i]) - radius),
+                       self._row(max(self._start_y[i], self._ghost_y[i]) + radius) + 1):
+            for c in range(self._col(min(self._start_x[i], self._ghost_x[i]) - radius),
+                           self._col(max(self._start_x[i], self._ghost_x[i]) + radius) + 1):
+                self._push_slot(r * self.cols + c, i)
+
+    cpdef clear(self):
+        """
+        Forget all the ghosts (start of a new turn)
+
+        :return: nothing
+        """
+        cdef int i
+        for i in range(self.cols * self.rows):
+            self._head[i] = -1
+        self._count = 0
+        self._slots = 0
+        self._stamp_id = 0
+        self.ghosts = []
+
+    def reset_counters(self):
+        """
+        Reset the checked / skipped counters. clear() keeps them, so that they add up over the turns
+        """
+        self.checked = 0
+        self.skipped = 0
+
+    cdef list _collect(self, int row0, int row1, int col0, int col1, double x1, double y1, double x2, double y2,
+                       double reach):
+        """
+        The ghosts of the given cells whose move comes within reach + ghost radius of the segment [(x1, y1), (x2, y2)]
+        """
+        cdef int r, c, slot, i
+        cdef double limit
+        cdef list found = []
+
+        self._stamp_id += 1
+        if self._stamp_id == 0x7fffffff:
+            for i in range(self._count):
+                self._stamp[i] = 0
+            self._stamp_id = 1
+
+        for r in range(row0, row1 + 1):
+            for c in range(col0, col1 + 1):
+                slot = self._head[r * self.cols + c]
+                while slot >= 0:
+                    i = self._slot_ghost[slot]
+                    slot = self._slot_next[slot]
+                    if self._stamp[i] == self._stamp_id:
+                        continue
+                    self._stamp[i] = self._stamp_id
+                    limit = reach + self._ghost_r[i] + QUERY_EPSILON
+                    if _segments_distance2(self._start_x[i], self._start_y[i], self._ghost_x[i], self._ghost_y[i],
+                                           x1, y1, x2, y2) <= limit * limit:
+                        found.append(i)
+
+        self.checked += len(found)
+        self.skipped += self._count - len(found)
+        found.sort()
+        return [self.ghosts[i] for i in found]
+
+    cpdef list query_segment(self, double x1, double y1, double x2, double y2, double reach):
+        """
+        The ghosts which may interfere with a move along [(x1, y1), (x2, y2)]: their move comes within
+        reach + their radius of the segment. The caller still runs the exact tests.
+
+        :param double x1: x-coordinate of the segment start
+        :param double y1: y-coordinate of the segment start
+        :param double x2: x-coordinate of the segment end
+        :param double y2: y-coordinate of the segment end
+        :param double reach: distance to leave between the segment and the ghosts
+        :return: the (start, ghost) tuples, in insertion order
+        :rtype: list
+        """
+        return self._collect(self._row(min(y1, y2) - reach), self._row(max(y1, y2) + reach),
+                             self._col(min(x1, x2) - reach), self._col(max(x1, x2) + reach),
+                             x1, y1, x2, y2, reach)
+
+    cpdef list query_radius(self, double x, double y, double radius):
+        """
+        The ghosts whose move comes within radius + their radius of (x, y)
+
+        :param double x: x-coordinate of the center
+        :param double y: y-coordinate of the center
+        :param double radius: radius of the disc
+        :return: the (start, ghost) tuples, in insertion order
+        :rtype: list
+        """
+        return self._collect(self._row(y - radius), self._row(y + radius),
+                             self._col(x - radius), self._col(x + radius),
+                             x, y, x, y, radius)
+
+
+cdef inline double _segments_distance2(double ax, double ay, double bx, double by,
+                                       double cx, double cy, double dx, double dy):
+    """
+    Squared distance between the segments [a, b] and [c, d]
+    """
+    cdef double o1 = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    cdef double o2 = (bx - ax) * (dy - ay) - (by - ay) * (dx - ax)
+    cdef double o3 = (dx - cx) * (ay - cy) - (dy - cy) * (ax - cx)
+    cdef double o4 = (dx - cx) * (by - cy) - (dy - cy) * (bx - cx)
+    if ((o1 > 0 and o2 < 0) or (o1 < 0 and o2 > 0)) and ((o3 > 0 and o4 < 0) or (o3 < 0 and o4 > 0)):
+        # Proper crossing
+        return 0
+    return min(min(_segment_distance2(ax, ay, cx, cy, dx, dy), _segment_distance2(bx, by, cx, cy, dx, dy)),
+               min(_segment_distance2(cx, cy, ax, ay, bx, by), _segment_distance2(dx, dy, ax, ay, bx, by)))
+
+
+def _rebuild_ghosts(width, height, cell_size, ghosts):
+    registry = GhostRegistry(width, height, cell_size)
+    for ghost in ghosts:
+        registry.add(ghost)
+    return registry
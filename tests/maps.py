@@ -0,0 +1,56 @@
+"""
+Hand-written maps in the engine format, for the tests
+"""
+from hlt import game_map
+from hlt.entity import DockingStatus
+
+#: Size of the test maps
+WIDTH, HEIGHT = 240, 160
+
+
+def ship(ship_id, x, y, health=255, status=DockingStatus.UNDOCKED, planet=0, progress=0, cooldown=0):
+    """
+    :return: The description of a ship
+    :rtype: str
+    """
+    return "%d %r %r %d 0.0 0.0 %d %d %d %d" % (ship_id, float(x), float(y), health, status, planet, progress,
+                                                  cooldown)
+
+
+def planet(planet_id, x, y, radius, spots=3, health=1000, production=0, resources=1000, owner=None, docked=()):
+    """
+    :param owner: The owner id, None if the planet is free
+    :param docked: The ids of the ships docked to the planet
+    :return: The description of a planet
+    :rtype: str
+    """
+    return "%d %r %r %d %r %d %d %d %d %d %d%s" % (
+        planet_id, float(x), float(y), health, float(radius), spots, production, resources, owner is not None,
+        owner or 0, len(docked), "".join(" %d" % ship_id for ship_id in docked))
+
+
+def map_bytes(players, planets=()):
+    """
+    :param players: The ship descriptions of each player, by player id
+    :param planets: The planet descriptions
+    :return: The map description
+    :rtype: bytes
+    """
+    tokens = [str(len(players))]
+    for player_id in sorted(players):
+        ships = players[player_id]
+        tokens.append("%d %d%s" % (player_id, len(ships), "".join(" " + description for description in ships)))
+    tokens.append(str(len(planets)))
+    tokens.extend(planets)
+    return " ".join(tokens).encode('ascii')
+
+
+def parsed_map(players, planets=(), my_id=0, width=WIDTH, height=HEIGHT, **options):
+    """
+    :param options: Options of the Map (incremental, batch_navigation...)
+    :return: A map which parsed the description, as on the first turn of a game
+    :rtype: game_map.Map
+    """
+    current_map = game_map.Map(my_id, width, height, **options)
+    current_map._parse(map_bytes(players, planets))
+    return current_map
@@ -0,0 +1,172 @@
+"""
+The segment / circle kernel of hlt.collision against the starter kit's intersect_segment_circle, which it replaced.
+"""
+import math
+import random
+
+import numpy as np
+import pytest
+
+from hlt import collision, navigation
+from hlt.navigation import Circle
+
+
+def reference_intersect(start, end, circle, fudge=0.5):
+    """
+    The starter kit's intersect_segment_circle, on (x, y) and (x, y, radius) tuples
+    """
+    dx = end[0] - start[0]
+    dy = end[1] - start[1]
+
+    a = dx**2 + dy**2
+    b = -2 * (start[0]**2 - start[0]*end[0] - start[0]*circle[0] + end[0]*circle[0] +
+              start[1]**2 - start[1]*end[1] - start[1]*circle[1] + end[1]*circle[1])
+
+    if a == 0.0:
+        # Start and end are the same point
+        return math.sqrt((start[0] - circle[0])**2 + (start[1] - circle[1])**2) <= circle[2] + fudge
+
+    # Time along segment when closest to the circle (vertex of the quadratic)
+    t = min(-b / (2 * a), 1.0)
+    if t < 0:
+        return False
+
+    closest_x = start[0] + dx * t
+    closest_y = start[1] + dy * t
+    closest_distance = math.sqrt((closest_x - circle[0])**2 + (closest_y - circle[1])**2)
+
+    return closest_distance <= circle[2] + fudge
+
+
+class _Body:
+    def __init__(self, x, y, radius=0.0):
+        self.pos = Circle(x, y, radius)
+
+
+def kernel_results(start, end, circle, fudge):
+    """
+    :return: The answers of every entry point of the kernel
+    :rtype: list[bool]
+    """
+    entity_api = collision.intersect_segment_circle(_Body(*start), _Body(*end), _Body(*circle), fudge=fudge)
+    circle_api = navigation.intersect_segment_circle(Circle(*start), Circle(*end), Circle(*circle), fudge=fudge)
+    arrays = [np.array([value]) for value in (circle[0], circle[1], circle[2], fudge)]
+    mask = np.zeros(1, dtype=np.uint8)
+    collision.segment_hit_mask(start[0], start[1], end[0], end[1], *arrays, mask)
+    hit, _ = collision.segment_first_hit(start[0], start[1], end[0], end[1], *arrays)
+    return [bool(entity_api), bool(circle_api), bool(mask[0]), hit == 0]
+
+
+def check(start, end, circle, fudge):
+    expected = reference_intersect(start, end, circle, fudge)
+    assert kernel_results(start, end, circle, fudge) == [expected] * 4, (start, end, circle, fudge)
+    return expected
+
+
+def test_random_segments():
+    rnd = random.Random(0)
+    hits = 0
+    for _ in range(20000):
+        start = (rnd.uniform(0, 100), rnd.uniform(0, 100))
+        end = (start[0] + rnd.uniform(-15, 15), start[1] + rnd.uniform(-15, 15))
+        circle = (rnd.uniform(0, 100), rnd.uniform(0, 100), rnd.uniform(0.5, 16))
+        hits += check(start, end, circle, rnd.choice((0.5, 0.6, 7.6)))
+    # Both outcomes are covered
+    assert 0 < hits < 20000
+
+
+def test_at_the_limit():
+    # The fudge is set to the closest distance minus the radius, then moved by one ulp on each side
+    rnd = random.Random(1)
+    for _ in range(5000):
+        start = (rnd.uniform(0, 100), rnd.uniform(0, 100))
+        angle = rnd.uniform(0, 2 * math.pi)
+        length = rnd.uniform(0.5, 15)
+        end = (start[0] + length * math.cos(angle), start[1] + length * math.sin(angle))
+        circle = (rnd.uniform(0, 100), rnd.uniform(0, 100), rnd.uniform(0.5, 16))
+        dx, dy = end[0] - start[0], end[1] - start[1]
+        t = min(((circle[0] - start[0]) * dx + (circle[1] - start[1]) * dy) / (dx ** 2 + dy ** 2), 1.0)
+        if t < 0:
+            continue
+        distance = math.hypot(start[0] + dx * t - circle[0], start[1] + dy * t - circle[1])
+        fudge = distance - circle[2]
+        for value in (math.nextafter(fudge, -math.inf), fudge, math.nextafter(fudge, math.inf)):
+            check(start, end, circle, value)
+
+
+@pytest.mark.parametrize('start, end, expected', [
+    # Tangent: the segment passes exactly at radius + fudge
+    ((-5.0, 1.5), (5.0, 1.5), True),
+    ((-5.0, -1.5), (5.0, -1.5), True),
+    ((1.5, -5.0), (1.5, 5.0), True),
+    ((-5.0, math.nextafter(1.5, 2.0)), (5.0, math.nextafter(1.5, 2.0)), False),
+    # Within the fudge, outside of the circle
+    ((-5.0, 1.25), (5.0, 1.25), True),
+    # Endpoint on the circle, on the fudge boundary, beyond it
+    ((-5.0, 0.0), (-1.0, 0.0), True),
+    ((-5.0, 0.0), (-1.5, 0.0), True),
+    ((-5.0, 0.0), (-1.6, 0.0), False),
+    ((5.0, 5.0), (0.6, 0.8), True),
+    # Endpoint on the circle, leaving it: the vertex is behind the start, no hit
+    ((0.6, 0.8), (5.0, 5.0), False),
+    # Starting inside the circle and moving away: the vertex is behind the start, no hit
+    ((0.5, 0.0), (5.0, 0.0), False),
+    ((1.0, 0.0), (5.0, 0.0), False),
+    # Moving away from the circle
+    ((3.0, 0.0), (8.0, 0.0), False),
+])
+def test_boundary_segments(start, end, expected):
+    circle = (0.0, 0.0, 1.0)
+    assert check(start, end, circle, 0.5) == expected
+
+
+@pytest.mark.parametrize('point, expected', [
+    ((0.0, 0.0), True),
+    ((1.0, 0.0), True),
+    ((0.9, 1.2), True),
+    ((1.5, 0.0), True),
+    ((0.0, -1.5), True),
+    ((math.nextafter(1.5, 2.0), 0.0), False),
+    ((3.0, 4.0), False),
+])
+def test_zero_length_segments(point, expected):
+    assert check(point, point, (0.0, 0.0, 1.0), 0.5) == expected
+
+
+@pytest.mark.parametrize('fudge', [0.0, 0.5, 0.6, 7.6, -0.5, -1.0, -2.0])
+def test_fudge_margin(fudge):
+    # A horizontal segment passing at every height around radius + fudge
+    for height in np.linspace(-4.0, 4.0, 161):
+        check((-10.0, height), (10.0, height), (0.0, 0.0, 2.0), fudge)
+        check((0.0, height), (0.0, height), (0.0, 0.0, 2.0), fudge)
+
+
+def test_first_hit_counts_the_tested_circles():
+    x = np.array([0.0, 10.0, 20.0, 30.0])
+    y = np.zeros(4)
+    radius = np.ones(4)
+    fudge = np.full(4, 0.5)
+
+    # Along the line of circles: the first one is hit
+    assert collision.segment_first_hit(-5.0, 0.0, 35.0, 0.0, x, y, radius, fudge) == (0, 1)
+    # The skipped circles are neither hit nor counted
+    skip = np.array([1, 0, 0, 0], dtype=np.intc)
+    assert collision.segment_first_hit(-5.0, 0.0, 35.0, 0.0, x, y, radius, fudge, skip) == (1, 1)
+    skip = np.array([0, 1, 1, 0], dtype=np.intc)
+    assert collision.segment_first_hit(5.0, 0.0, 35.0, 0.0, x, y, radius, fudge, skip) == (3, 2)
+    # No hit: every circle not skipped is tested
+    assert collision.segment_first_hit(-5.0, 5.0, 35.0, 5.0, x, y, radius, fudge) == (-1, 4)
+    assert collision.segment_first_hit(-5.0, 5.0, 35.0, 5.0, x, y, radius, fudge, skip) == (-1, 2)
+    assert collision.segment_first_hit(-5.0, 5.0, 35.0, 5.0, x[:0], y[:0], radius[:0], fudge[:0]) == (-1, 0)
+
+
+def test_hit_mask():
+    x = np.array([0.0, 10.0, 20.0, 30.0])
+    y = np.array([0.0, 1.4, 1.6, -1.5])
+    radius = np.ones(4)
+    fudge = np.full(4, 0.5)
+    mask = np.zeros(4, dtype=np.uint8)
+    assert collision.segment_hit_mask(-5.0, 0.0, 35.0, 0.0, x, y, radius, fudge, mask) == 3
+    assert mask.tolist() == [1, 1, 0, 1]
+    with pytest.raises(ValueError):
+        collision.segment_hit_mask(-5.0, 0.0, 35.0, 0.0, x, y, radius, fudge[:3], mask)
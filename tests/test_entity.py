@@ -0,0 +1,69 @@
+"""
+The entity extension types, and the navigation rules which read their docking status: the status became an int,
+and the moves must stay those of the Enum days.
+"""
+import pytest
+
+from hlt import navigation
+from hlt.entity import DockingStatus, Entity, Planet, Position, Ship
+
+from maps import parsed_map, planet, ship
+
+
+def test_docking_status_is_an_int():
+    game_map = parsed_map({0: [ship(0, 10, 10), ship(1, 30.5, 20, status=DockingStatus.DOCKED, planet=0)],
+                           1: [ship(2, 100, 100, status=DockingStatus.UNDOCKING)]},
+                          [planet(0, 30, 30, 10, owner=0, docked=(1,))])
+    undocked, docked = game_map.get_me().get_ship(0), game_map.get_me().get_ship(1)
+    undocking = game_map.get_player(1).get_ship(2)
+
+    assert Ship.DockingStatus is DockingStatus
+    assert isinstance(docked.docking_status, int)
+    assert undocked.docking_status == Ship.DockingStatus.UNDOCKED == 0
+    assert docked.docking_status == Ship.DockingStatus.DOCKED
+    assert docked.docking_status in (Ship.DockingStatus.DOCKED, Ship.DockingStatus.DOCKING)
+    assert undocking.docking_status == Ship.DockingStatus.UNDOCKING
+    assert undocked.planet is None
+    assert docked.planet is game_map.get_planet(0)
+    assert docked.owner is game_map.get_me()
+    assert docked.owner_id == 0
+    assert game_map.get_planet(0).all_docked_ships() == [docked]
+
+
+def test_entity_is_abstract():
+    assert Entity._link.__isabstractmethod__
+    assert not getattr(Ship._link, '__isabstractmethod__', False)
+    assert not getattr(Planet._link, '__isabstractmethod__', False)
+    with pytest.raises(NotImplementedError):
+        Position(1, 2)._link({}, {})
+
+
+@pytest.mark.parametrize('owner', [0, 1])
+@pytest.mark.parametrize('status', [DockingStatus.UNDOCKED, DockingStatus.DOCKED])
+def test_far_ships_stay_obstacles(owner, status):
+    # The ship on the path is more than NAVIGATION_SHIP_DISTANCE away: it blocks whatever its status
+    other = ship(1, 130, 80, status=status)
+    players = {0: [ship(0, 20, 80)], 1: [ship(2, 200, 150)]}
+    players[owner].append(other)
+    game_map = parsed_map(players)
+    me = game_map.get_me().get_ship(0)
+    target = Position(140, 80)
+    assert navigation.calculate_distance_between(me.pos, game_map._ships[1].pos) > navigation.NAVIGATION_SHIP_DISTANCE
+    assert navigation.obstacles_between(me.pos, target.pos, game_map)
+    assert not navigation.obstacles_between(me.pos, target.pos, game_map, ignore_ships=True)
+
+
+@pytest.mark.parametrize('status', [DockingStatus.UNDOCKED, DockingStatus.DOCKED])
+def test_assassin_keeps_the_ship_fudge(status):
+    # A foe 3 away from the path: out of the fudge of a ship, within ASSASSIN_AVOID_RADIUS of it
+    players = {0: [ship(0, 20, 80)], 1: [ship(1, 24, 83, status=status)]}
+    target = Position(60, 80)
+    for batch_navigation in (False, True):
+        commands = []
+        for assassin in (False, True):
+            game_map = parsed_map(players, batch_navigation=batch_navigation)
+            me = game_map.get_me().get_ship(0)
+            assert not navigation.obstacles_between(me.pos, target.pos, game_map, assassin=assassin)
+            command = me.navigate(target, game_map, 7, assassin=assassin)
+            commands.append(game_map.resolve_navigation({me.id: command})[me.id])
+        assert commands == ["t 0 7 0"] * 2
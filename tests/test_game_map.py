@@ -0,0 +1,98 @@
+"""
+The docking slots reserved by Map.plan_assignments: a planned ship gives its slot back on every path. The fallback
+commands of the ships the scheduler skips.
+"""
+from hlt.entity import DockingStatus
+from hlt.roles import BOMB, FIGHT, NONE, SETTLE
+from hlt.scheduler import fallback_command, urgency
+
+from maps import parsed_map, planet, ship
+
+
+def planned_map():
+    """
+    Two ships of mine and a planet with one docking spot. Ship 0 is closer to the planet, and to the foe:
+    the plan gives it the slot, assign_ship_short makes it a fighter.
+    """
+    game_map = parsed_map({0: [ship(0, 100, 80), ship(1, 30, 80)], 1: [ship(2, 150, 80)]},
+                          [planet(0, 80, 40, 5, spots=1)])
+    game_map.plan_assignments()
+    assert game_map.settle_plan == {0: 0}
+    return game_map
+
+
+def test_planned_slot_is_reserved():
+    game_map = planned_map()
+    me = game_map.get_me()
+    game_map.assign_ship(me.get_ship(1), game_map)
+    assert game_map.roles.role(1) != SETTLE
+    game_map.assign_ship(me.get_ship(0), game_map)
+    assert game_map.roles.role(0) == SETTLE
+    assert game_map.roles.planet(0) == 0
+    assert game_map.settle_plan == {}
+
+
+def test_planned_fighter_releases_its_slot():
+    game_map = planned_map()
+    me = game_map.get_me()
+    game_map.assign_ship_short(me.get_ship(0), game_map)
+    assert game_map.roles.role(0) == FIGHT
+    assert game_map.settle_plan == {}
+    game_map.assign_ship(me.get_ship(1), game_map)
+    assert game_map.roles.role(1) == SETTLE
+    assert game_map.roles.planet(1) == 0
+
+
+def test_fallback_releases_the_slot():
+    game_map = planned_map()
+    me = game_map.get_me()
+    fallback_command(me.get_ship(0), game_map)
+    assert game_map.roles.role(0) == NONE
+    assert game_map.settle_plan == {}
+    game_map.assign_ship(me.get_ship(1), game_map)
+    assert game_map.roles.role(1) == SETTLE
+
+
+def test_fallback_targets_the_planned_planet():
+    # A lone ship without role: the planet planned for it stays its target
+    far = parsed_map({0: [ship(0, 30, 80)], 1: [ship(1, 200, 150)]}, [planet(0, 80, 40, 5)])
+    far.plan_assignments()
+    assert far.settle_plan == {0: 0}
+    command = fallback_command(far.get_me().get_ship(0), far)
+    assert command is not None and command.startswith("t 0 ")
+    assert far.settle_plan == {}
+
+    close = parsed_map({0: [ship(0, 80, 48)], 1: [ship(1, 200, 150)]}, [planet(0, 80, 40, 5)])
+    close.plan_assignments()
+    assert close.settle_plan == {0: 0}
+    assert fallback_command(close.get_me().get_ship(0), close) == "d 0 0"
+
+
+def test_bomber_fallback_does_not_dock():
+    # A bomber in docking range of the foe planet it dives at
+    game_map = parsed_map({0: [ship(0, 80, 48)], 1: [ship(1, 86.6, 40, status=DockingStatus.DOCKED, planet=0)]},
+                          [planet(0, 80, 40, 5, owner=1, docked=(1,))])
+    game_map.roles.assign(0, BOMB, 0)
+    me = game_map.get_me().get_ship(0)
+    assert me.can_dock(game_map.get_planet(0))
+    assert urgency(me, game_map) != (0, 0.0)
+    command = fallback_command(me, game_map)
+    assert command is not None and command.startswith("t 0 ")
+
+
+def test_fallback_does_not_dock_to_a_full_planet():
+    game_map = parsed_map({0: [ship(0, 80, 48), ship(2, 86.6, 40, status=DockingStatus.DOCKED, planet=0)],
+                           1: [ship(1, 200, 150)]},
+                          [planet(0, 80, 40, 5, spots=1, owner=0, docked=(2,))])
+    game_map.roles.assign(0, SETTLE, 0)
+    me = game_map.get_me().get_ship(0)
+    assert urgency(me, game_map) != (0, 0.0)
+    assert fallback_command(me, game_map) != "d 0 0"
+
+
+def test_release_without_plan():
+    game_map = planned_map()
+    assert game_map.release_settle_plan(game_map.get_me().get_ship(1)) is None
+    assert game_map.release_settle_plan(game_map.get_me().get_ship(0)) is game_map.get_planet(0)
+    assert game_map.release_settle_plan(game_map.get_me().get_ship(0)) is None
+    assert game_map.settle_plan == {}
@@ -0,0 +1,23 @@
+"""
+The influence map: the threat and support grids are only built when read.
+"""
+from hlt import constants
+from hlt.entity import DockingStatus, Position
+
+from maps import parsed_map, ship
+
+
+def test_grids_are_lazy():
+    game_map = parsed_map({0: [ship(0, 20, 20), ship(1, 22, 20)],
+                           1: [ship(2, 100, 100), ship(3, 150, 100, status=DockingStatus.DOCKED)]})
+    influence = game_map.influence()
+    assert influence.foes_near(Position(100, 95).pos, 6) == 1
+    assert influence.foes_near(Position(150, 95).pos, 6, undocked_only=True) == 0
+    assert influence._threat is None and influence._support is None
+
+    # Docked foes don't threaten
+    assert influence.threat_at(Position(100, 100).pos) == constants.WEAPON_DAMAGE
+    assert influence.threat_at(Position(150, 100).pos) == 0
+    assert influence.support_at(Position(21, 20).pos) == 2 * constants.WEAPON_DAMAGE
+    assert influence.support_at(Position(100, 100).pos) == 0
+    assert influence.threat is influence.threat
@@ -0,0 +1,326 @@
+"""
+The rules of hlt.simulator, one turn at a time, and the consistency of the simulator with recorded games.
+
+Recorded games are checked on their quiet turns (no ship lost, no damage): the commands of every ship are read back
+from its move (thrust magnitude and angle are integers), or from its change of docking status, played by the
+simulator from the recorded map, and the result must be the next recorded map. Traces recorded by the engine
+(HALITE_RECORD, see benchmarks/replay.py) dropped in tests/traces are checked the same way.
+"""
+import glob
+import math
+import os
+
+import pytest
+
+from hlt import constants, game_map
+from hlt.entity import DockingStatus
+from hlt.simulator import Simulator, SHIP_COST
+
+from maps import WIDTH, HEIGHT, map_bytes, parsed_map, planet, ship
+
+#: Engine traces checked by test_engine_traces
+TRACES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'traces', '*.trace')))
+#: The engine writes the coordinates with 4 decimals
+POSITION_TOLERANCE = 1e-3
+
+
+def read_map(description, width=WIDTH, height=HEIGHT):
+    current_map = game_map.Map(0, width, height, incremental=False)
+    current_map._parse(description)
+    return current_map
+
+
+def play(simulator, commands=None, turns=1):
+    """
+    :return: The map after the given number of turns, the commands being played on the first one
+    :rtype: game_map.Map
+    """
+    description = simulator.step(commands or {})
+    for _ in range(turns - 1):
+        description = simulator.step({})
+    return read_map(description, simulator.width, simulator.height)
+
+
+def test_thrust():
+    simulator = Simulator(parsed_map({0: [ship(0, 10, 10), ship(1, 50, 50)], 1: [ship(2, 200, 150)]}))
+    state = play(simulator, {0: ["t 0 7 0", "t 1 3 90"]})
+    assert (state._ships[0].pos.x, state._ships[0].pos.y) == (17, 10)
+    assert state._ships[1].pos.x == pytest.approx(50)
+    assert state._ships[1].pos.y == pytest.approx(53)
+    # The velocity lasts one turn, the speed is capped, the commands of the other players' ships are ignored
+    state = play(simulator, {0: ["t 0 12 180"], 1: ["t 1 7 0"]})
+    assert (state._ships[0].pos.x, state._ships[0].pos.y) == (10, 10)
+    assert state._ships[1].pos.y == pytest.approx(53)
+    assert simulator.turn == 2
+
+
+def test_leaving_the_map():
+    simulator = Simulator(parsed_map({0: [ship(0, 3, 80), ship(1, 20, 20)], 1: [ship(2, 200, 150)]}))
+    state = play(simulator, {0: ["t 0 7 180"]})
+    assert 0 not in state._ships
+    assert 1 in state._ships
+
+
+def test_collision():
+    simulator = Simulator(parsed_map({0: [ship(0, 10, 80), ship(1, 20, 80), ship(3, 50, 50)],
+                                      1: [ship(2, 200, 150)]}))
+    state = play(simulator, {0: ["t 0 5 0", "t 1 5 180"]})
+    assert sorted(state._ships) == [2, 3]
+
+
+def test_docking_progress():
+    planets = [planet(0, 50, 50, 5, spots=2, resources=100)]
+    simulator = Simulator(parsed_map({0: [ship(0, 50, 57), ship(1, 50, 70)], 1: [ship(2, 200, 150)]}, planets))
+    state = play(simulator, {0: ["d 0 0", "d 1 0"]})
+    # Ship 1 is too far from the surface: its command is ignored
+    docking, far = state._ships[0], state._ships[1]
+    assert docking.docking_status == DockingStatus.DOCKING
+    assert docking._docking_progress == constants.DOCK_TURNS
+    assert far.docking_status == DockingStatus.UNDOCKED
+    assert state.get_planet(0).owner_id == 0
+    assert state.get_planet(0)._docked_ship_ids == [0]
+
+    for progress in range(constants.DOCK_TURNS - 1, 0, -1):
+        state = play(simulator)
+        assert state._ships[0].docking_status == DockingStatus.DOCKING
+        assert state._ships[0]._docking_progress == progress
+        assert state.get_planet(0).current_production == 0
+    state = play(simulator)
+    assert state._ships[0].docking_status == DockingStatus.DOCKED
+    assert state._ships[0]._docking_progress == 0
+    # Docked ships produce from the remaining resources
+    assert state.get_planet(0).current_production == constants.BASE_PRODUCTIVITY
+    assert state.get_planet(0).remaining_resources == 100 - constants.BASE_PRODUCTIVITY
+
+
+def test_undocking():
+    planets = [planet(0, 50, 50, 5, owner=0, docked=(0,))]
+    simulator = Simulator(parsed_map({0: [ship(0, 50, 55.6, status=DockingStatus.DOCKED, planet=0)],
+                                      1: [ship(1, 200, 150)]}, planets))
+    state = play(simulator, {0: ["u 0"]})
+    assert state._ships[0].docking_status == DockingStatus.UNDOCKING
+    assert state._ships[0]._docking_progress == constants.DOCK_TURNS
+    assert state.get_planet(0).owner_id == 0
+    state = play(simulator, turns=constants.DOCK_TURNS)
+    assert state._ships[0].docking_status == DockingStatus.UNDOCKED
+    assert state._ships[0].planet is None
+    # A planet without docked ships has no owner
+    assert state.get_planet(0).owner_id == -1
+    assert state.get_planet(0)._docked_ship_ids == []
+
+
+def test_dock_conflict():
+    # Two players docking to a free planet in the same turn: nobody gets it
+    planets = [planet(0, 50, 50, 5)]
+    simulator = Simulator(parsed_map({0: [ship(0, 50, 57)], 1: [ship(1, 50, 43)]}, planets))
+    state = play(simulator, {0: ["d 0 0"], 1: ["d 1 0"]})
+    assert state._ships[0].docking_status == state._ships[1].docking_status == DockingStatus.UNDOCKED
+    assert state.get_planet(0).owner_id == -1
+
+
+def test_weapon_damage_and_cooldown():
+    simulator = Simulator(parsed_map({0: [ship(0, 50, 50)], 1: [ship(1, 54, 50)]}))
+    state = play(simulator)
+    for ship_id in (0, 1):
+        assert state._ships[ship_id].health == constants.BASE_SHIP_HEALTH - constants.WEAPON_DAMAGE
+        assert state._ships[ship_id]._weapon_cooldown == constants.WEAPON_COOLDOWN
+    # The weapons cooled down at the start of the turn: they fire again
+    state = play(simulator)
+    for ship_id in (0, 1):
+        assert state._ships[ship_id].health == constants.BASE_SHIP_HEALTH - 2 * constants.WEAPON_DAMAGE
+
+
+def test_weapon_damage_is_split():
+    # Ship 0 meets two enemies: its damage is split between them, it takes the full damage of both
+    simulator = Simulator(parsed_map({0: [ship(0, 50, 50)], 1: [ship(1, 54, 50), ship(2, 46, 50)]}))
+    state = play(simulator)
+    assert state._ships[0].health == constants.BASE_SHIP_HEALTH - 2 * constants.WEAPON_DAMAGE
+    for ship_id in (1, 2):
+        assert state._ships[ship_id].health == constants.BASE_SHIP_HEALTH - constants.WEAPON_DAMAGE / 2
+
+
+def test_docked_ships_dont_fire():
+    planets = [planet(0, 50, 50, 5, owner=1, docked=(1,))]
+    simulator = Simulator(parsed_map({0: [ship(0, 50, 59)],
+                                      1: [ship(1, 50, 55.6, status=DockingStatus.DOCKED, planet=0)]}, planets))
+    state = play(simulator)
+    assert state._ships[0].health == constants.BASE_SHIP_HEALTH
+    assert state._ships[1].health == constants.BASE_SHIP_HEALTH - constants.WEAPON_DAMAGE
+
+
+def test_out_of_range():
+    distance = 2 * constants.SHIP_RADIUS + constants.WEAPON_RADIUS + 0.01
+    simulator = Simulator(parsed_map({0: [ship(0, 50, 50)], 1: [ship(1, 50 + distance, 50)]}))
+    state = play(simulator)
+    assert state._ships[0].health == state._ships[1].health == constants.BASE_SHIP_HEALTH
+
+
+def test_explosion():
+    # Ship 0 crashes into planet 0, which has less health left than the ship: the planet explodes
+    planets = [planet(0, 50, 50, 3, health=100, owner=1, docked=(1,)), planet(1, 150, 100, 5)]
+    simulator = Simulator(parsed_map({0: [ship(0, 50, 45)],
+                                      1: [ship(1, 50, 53.6, status=DockingStatus.DOCKED, planet=0),
+                                          ship(2, 42, 50), ship(3, 30, 50)]}, planets))
+    state = play(simulator, {0: ["t 0 7 90"]})
+    assert state.get_planet(0) is None
+    assert state.get_planet(1) is not None
+    # The crashing ship and the docked ship are destroyed
+    assert sorted(state._ships) == [2, 3]
+    # Ship 2 is 5 away from the surface: half of the damage. Ship 3 is out of the explosion radius
+    assert state._ships[2].health == math.ceil(constants.BASE_SHIP_HEALTH * (1 - 5 / constants.EXPLOSION_RADIUS))
+    assert state._ships[3].health == constants.BASE_SHIP_HEALTH
+
+
+def test_planet_hit():
+    planets = [planet(0, 50, 50, 3, health=1000)]
+    simulator = Simulator(parsed_map({0: [ship(0, 50, 45, health=200)], 1: [ship(1, 200, 150)]}, planets))
+    state = play(simulator, {0: ["t 0 7 90"]})
+    assert 0 not in state._ships
+    assert state.get_planet(0).health == 800
+
+
+def test_spawn():
+    planets = [planet(0, 50, 50, 5, production=SHIP_COST - 2, resources=500, owner=0, docked=(3,))]
+    simulator = Simulator(parsed_map({0: [ship(3, 50, 55.6, status=DockingStatus.DOCKED, planet=0)],
+                                      1: [ship(7, 200, 150)]}, planets))
+    state = play(simulator)
+    spawned = state.get_me().get_ship(8)
+    assert spawned is not None
+    assert spawned.owner_id == 0
+    assert spawned.health == constants.BASE_SHIP_HEALTH
+    assert spawned.docking_status == DockingStatus.UNDOCKED
+    # SPAWN_RADIUS away from the surface, towards the center of the map
+    angle = math.atan2(HEIGHT / 2 - 50, WIDTH / 2 - 50)
+    distance = 5 + constants.SPAWN_RADIUS
+    assert spawned.pos.x == pytest.approx(50 + distance * math.cos(angle), abs=POSITION_TOLERANCE)
+    assert spawned.pos.y == pytest.approx(50 + distance * math.sin(angle), abs=POSITION_TOLERANCE)
+    assert state.get_planet(0).current_production == SHIP_COST - 2 + constants.BASE_PRODUCTIVITY - SHIP_COST
+    assert state.get_planet(0).remaining_resources == 500 - constants.BASE_PRODUCTIVITY
+
+
+def test_spawn_avoids_the_ships():
+    # The position towards the center is taken: the next heading is used
+    angle = math.atan2(HEIGHT / 2 - 50, WIDTH / 2 - 50)
+    taken = (50 + 7 * math.cos(angle), 50 + 7 * math.sin(angle))
+    planets = [planet(0, 50, 50, 5, production=SHIP_COST, owner=0, docked=(0,))]
+    simulator = Simulator(parsed_map({0: [ship(0, 50, 55.6, status=DockingStatus.DOCKED, planet=0),
+                                          ship(1, *taken, status=DockingStatus.DOCKED, planet=0)],
+                                      1: [ship(2, 200, 150)]}, planets))
+    state = play(simulator)
+    spawned = state.get_me().get_ship(3)
+    assert math.hypot(spawned.pos.x - taken[0], spawned.pos.y - taken[1]) >= 2 * constants.SHIP_RADIUS
+    assert math.hypot(spawned.pos.x - 50, spawned.pos.y - 50) == pytest.approx(7, abs=POSITION_TOLERANCE)
+
+
+def infer_commands(previous, following):
+    """
+    The commands which lead from a map to the next one, on a quiet turn: a thrust for each undocked ship which
+    moved, a dock or undock for each change of docking status
+
+    :param game_map.Map previous: A map
+    :param game_map.Map following: The map of the next turn
+    :return: The commands by player id
+    :rtype: dict[int, list[str]]
+    """
+    commands = {}
+    for player in previous.all_players():
+        player_commands = commands.setdefault(player.id, [])
+        for before in player.all_ships():
+            after = following._ships[before.id]
+            if before.docking_status == DockingStatus.UNDOCKED and after.docking_status == DockingStatus.DOCKING:
+                player_commands.append("d {} {}".format(before.id, after.planet.id))
+            elif before.docking_status == DockingStatus.DOCKED and after.docking_status == DockingStatus.UNDOCKING:
+                player_commands.append("u {}".format(before.id))
+            elif before.docking_status == DockingStatus.UNDOCKED:
+                dx, dy = after.pos.x - before.pos.x, after.pos.y - before.pos.y
+                speed = round(math.hypot(dx, dy))
+                if speed > 0:
+                    angle = round(math.degrees(math.atan2(dy, dx))) % 360
+                    player_commands.append("t {} {} {}".format(before.id, speed, angle))
+    return commands
+
+
+def quiet(previous, following):
+    """
+    :return: Did the turn go by without any ship lost or damaged?
+    :rtype: bool
+    """
+    return all(ship_id in following._ships and following._ships[ship_id].health == before.health
+               for ship_id, before in previous._ships.items())
+
+
+def assert_same_state(expected, actual):
+    assert sorted(actual._ships) == sorted(expected._ships)
+    for ship_id, recorded in expected._ships.items():
+        other = actual._ships[ship_id]
+        assert other.owner_id == recorded.owner_id
+        assert other.pos.x == pytest.approx(recorded.pos.x, abs=POSITION_TOLERANCE), ship_id
+        assert other.pos.y == pytest.approx(recorded.pos.y, abs=POSITION_TOLERANCE), ship_id
+        assert (other.health, other.docking_status, other._docking_progress, other._weapon_cooldown) == \
+            (recorded.health, recorded.docking_status, recorded._docking_progress, recorded._weapon_cooldown), ship_id
+    assert sorted(other.id for other in actual.all_planets()) == sorted(other.id for other in expected.all_planets())
+    for recorded in expected.all_planets():
+        other = actual.get_planet(recorded.id)
+        assert (other.owner_id, other.health, other.current_production, other.remaining_resources,
+                other._docked_ship_ids) == \
+            (recorded.owner_id, recorded.health, recorded.current_production, recorded.remaining_resources,
+             recorded._docked_ship_ids), recorded.id
+
+
+def check_trace(maps, width, height):
+    """
+    Play every quiet turn of a game with the simulator, from the recorded map and with the commands read back from
+    the next one, and compare the result with the next recorded map
+
+    :param list[bytes] maps: The map of each turn
+    :return: The number of turns checked
+    :rtype: int
+    """
+    checked = 0
+    for previous_bytes, following_bytes in zip(maps, maps[1:]):
+        previous = read_map(previous_bytes, width, height)
+        following = read_map(following_bytes, width, height)
+        if not quiet(previous, following):
+            continue
+        simulated = read_map(Simulator(previous).step(infer_commands(previous, following)), width, height)
+        assert_same_state(following, simulated)
+        checked += 1
+    return checked
+
+
+def test_opening():
+    # One ship of player 0 flies to planet 0 and docks, as the engine plays it: the other ships stay still
+    planets = [planet(0, 55, 30, 4, spots=2, resources=200), planet(1, 180, 120, 6)]
+    others = {1: [ship(1, 200, 140)], 2: [ship(2, 20, 140), ship(3, 24, 140)]}
+    path = [(20, 30), (27, 30), (34, 30), (41, 30), (48, 30), (48, 30)]
+    maps = []
+    for x, y in path:
+        maps.append(map_bytes({**others, 0: [ship(0, x, y)]}, planets))
+    # Dock (command of the last turn) then DOCK_TURNS turns of progress
+    for progress in range(constants.DOCK_TURNS, -1, -1):
+        status = DockingStatus.DOCKING if progress else DockingStatus.DOCKED
+        production = 0 if progress else constants.BASE_PRODUCTIVITY
+        maps.append(map_bytes({**others, 0: [ship(0, 48, 30, status=status, planet=0, progress=progress)]},
+                              [planet(0, 55, 30, 4, spots=2, production=production, resources=200 - production,
+                                      owner=0, docked=(0,)),
+                               planets[1]]))
+    assert check_trace(maps, WIDTH, HEIGHT) == len(maps) - 1
+
+
+def test_check_trace_catches_a_wrong_rule():
+    maps = [map_bytes({0: [ship(0, 20, 30)], 1: [ship(1, 200, 140)]}),
+            map_bytes({0: [ship(0, 27, 30)], 1: [ship(1, 200, 140)]}),
+            # A wrong record: the undocked ship of player 1 gained docking progress
+            map_bytes({0: [ship(0, 27, 30)], 1: [ship(1, 200, 140, progress=3)]})]
+    with pytest.raises(AssertionError):
+        check_trace(maps, WIDTH, HEIGHT)
+
+
+@pytest.mark.skipif(not TRACES, reason="no engine trace in tests/traces")
+@pytest.mark.parametrize('path', TRACES)
+def test_engine_traces(path):
+    with open(path, 'rb') as trace:
+        lines = trace.read().split(b'\n')
+    width, height = (int(value) for value in lines[1].split())
+    maps = [line for line in lines[2:] if line.strip()]
+    assert check_trace(maps, width, height) > 0